@@ -0,0 +1,99 @@
+#!/usr/bin/env python
+# *-* coding: utf-8 *-*
+"""Measure the effect of precomputing the angular frequencies and their
+logarithms once per model object
+
+The uncached variants recompute omega = 2 pi f and log omega on every call,
+as done before the frequency-dependent terms were stored in
+:class:`sip_models.cc_common.cc_base`.
+
+Two paths are measured:
+
+* intermediates: the shared intermediate terms of the kernels, computed into
+  a workspace. With a precomputed log omega, (omega tau)^c needs only P
+  logarithms instead of N. This saves about 15 % for short spectra and up
+  to about 40 % (1.6x) for spectra of 20000 frequencies or more.
+* calls: a response, a partial derivative, and a Jacobian without
+  workspaces. Here the allocations and the remaining arithmetic dominate.
+  The measured ratios lie between about 0.9x and 1.2x and vary between
+  runs, i.e., there is no reliable speedup of these calls.
+
+Run as:
+
+    python benchmarks/bench_frequency_cache.py
+"""
+import timeit
+
+import numpy as np
+
+import sip_models.res.cc as cc
+import sip_models.res.cc_kernels as cc_kernels
+import sip_models.workspace as sip_workspace
+
+
+def uncached_calls(f, pars):
+    omega = 2 * np.pi * np.atleast_1d(f)
+    cc_kernels.response(omega, pars)
+    cc_kernels.dre_dc(omega, pars)
+    cc_kernels.Jacobian_re_im(omega, pars)
+
+
+def cached_calls(obj, pars):
+    cc_kernels.response(obj.omega, pars, obj.log_omega)
+    cc_kernels.dre_dc(obj.omega, pars, obj.log_omega)
+    cc_kernels.Jacobian_re_im(obj.omega, pars, log_omega=obj.log_omega)
+
+
+def uncached_intermediates(f, m, tau, c, workspace):
+    omega = 2 * np.pi * np.atleast_1d(f)
+    cc_kernels._intermediates(omega, m, tau, c, workspace=workspace)
+
+
+def cached_intermediates(obj, m, tau, c, workspace):
+    cc_kernels._intermediates(
+        obj.omega, m, tau, c, obj.log_omega, workspace=workspace)
+
+
+def compare(uncached, cached, number):
+    """Return the best times per call of both variants, alternating between
+    them to reduce the influence of fluctuating machine load"""
+    t_uncached = []
+    t_cached = []
+    for repeat in range(10):
+        t_uncached.append(timeit.timeit(uncached, number=number) / number)
+        t_cached.append(timeit.timeit(cached, number=number) / number)
+    return min(t_uncached), min(t_cached)
+
+
+def main():
+    pars = [100, 0.1, 0.04, 0.8]
+    m, tau, c = np.array([0.1]), np.array([0.04]), np.array([0.8])
+    print('{0:<14} {1:>7} {2:>14} {3:>14} {4:>8}'.format(
+        'path', 'N', 'uncached', 'cached', 'speedup'))
+    for nr_f in (20, 200, 2000, 20000, 200000):
+        f = np.logspace(-3, 4, nr_f)
+        obj = cc.cc(f)
+        assert np.allclose(
+            cc_kernels.Jacobian_re_im(2 * np.pi * f, pars),
+            obj.Jacobian_re_im(pars)
+        )
+        number = max(10, int(200000 / nr_f))
+        workspaces = (sip_workspace.workspace(), sip_workspace.workspace())
+        timings = (
+            ('intermediates', compare(
+                lambda: uncached_intermediates(f, m, tau, c, workspaces[0]),
+                lambda: cached_intermediates(obj, m, tau, c, workspaces[1]),
+                number)),
+            ('calls', compare(
+                lambda: uncached_calls(f, pars),
+                lambda: cached_calls(obj, pars),
+                number)),
+        )
+        for name, (t_uncached, t_cached) in timings:
+            print('{0:<14} {1:>7} {2:>12.1f}us {3:>12.1f}us {4:>7.2f}x'.format(
+                name, nr_f, t_uncached * 1e6, t_cached * 1e6,
+                t_uncached / t_cached))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,182 @@
+#!/usr/bin/env python
+# *-* coding: utf-8 *-*
+"""Compare the fused Jacobian of the resistivity Cole-Cole model with the
+previous approach that assembles the Jacobian from the eight individual
+partial-derivative methods
+
+The reference is a copy of the implementation that preceded the fused
+Jacobian: each of the eight partial derivatives sets up the parameters and
+the (N x P) common terms again, and evaluates its own expression with powers
+of omega and tau. Calling the current dre_*/dim_* methods instead would
+measure the optimized kernels, which share most of their work with the fused
+Jacobian.
+
+Measured speedups are about 3-6x for 20 frequencies, 6-9x for 100
+frequencies, and 9-85x for 1000 to 10000 frequencies, where the single-term
+model gains most. The timings of the fused Jacobian vary between runs.
+
+Run as:
+
+    python benchmarks/bench_jacobian.py
+"""
+import timeit
+
+import numpy as np
+
+import sip_models.res.cc as cc
+import sip_models.res.cc_kernels as cc_kernels
+
+
+class baseline_terms(object):
+    """Common terms as set up by each partial derivative of the previous
+    implementation"""
+    def __init__(self, f, pars):
+        nr_f = f.size
+        rho0, m, tau, c = cc_kernels.sort_parameters(pars)
+        newsize = (nr_f, len(m))
+        omega = np.atleast_2d(2 * np.pi * f).T
+        self.w = np.resize(omega, (len(m), nr_f)).T
+        self.rho0 = rho0
+        self.m = np.resize(m, newsize)
+        self.tau = np.resize(tau, newsize)
+        self.c = np.resize(c, newsize)
+        self.otc = (self.w * self.tau) ** self.c
+        self.otc2 = (self.w * self.tau) ** (2 * self.c)
+        self.ang = self.c * np.pi / 2.0  # rad
+        self.denom = 1 + 2 * self.otc * np.cos(self.ang) + self.otc2
+
+
+def dre_drho0(f, pars):
+    s = baseline_terms(f, pars)
+    numerator = s.m * s.otc * (np.cos(s.ang) + s.otc)
+    term = numerator / s.denom
+    specs = np.sum(term, axis=1)
+    return 1 - specs
+
+
+def dre_dm(f, pars):
+    s = baseline_terms(f, pars)
+    numerator = -s.otc * (np.cos(s.ang) + s.otc)
+    result = numerator / s.denom
+    result *= s.rho0
+    return result
+
+
+def dre_dtau(f, pars):
+    s = baseline_terms(f, pars)
+    nom1 = - s.m * s.c * s.w ** s.c * s.tau ** (s.c - 1) * \
+        np.cos(s.ang) - s.m * s.w ** (2 * s.c) * \
+        2 * s.c * s.tau ** (2 * s.c - 1)
+    term1 = nom1 / s.denom
+    nom2 = s.m * s.otc * (np.cos(s.ang) + s.otc) * \
+        (2 * s.w ** s.c * s.c * s.tau ** (s.c - 1) *
+         np.cos(s.ang) + 2 * s.c * s.w ** (2 * s.c) *
+         s.tau ** (2 * s.c - 1))
+    term2 = nom2 / s.denom ** 2
+    result = term1 + term2
+    result *= s.rho0
+    return result
+
+
+def dre_dc(f, pars):
+    s = baseline_terms(f, pars)
+    nom1 = - s.m * np.log(s.w * s.tau) * s.otc * np.cos(s.ang) + \
+        s.m * s.otc * (np.pi / 2.0) * np.sin(s.ang) - \
+        2 * s.m * np.log(s.w * s.tau) * s.otc2
+    term1 = nom1 / s.denom
+    nom2 = (s.m * s.otc * (np.cos(s.ang) + s.otc)) * \
+        (2 * np.log(s.w * s.tau) * s.otc * np.cos(s.ang) -
+         2 * s.otc * (np.pi / 2.0) * np.sin(s.ang) +
+         2 * np.log(s.w * s.tau) * s.otc2)
+    term2 = nom2 / s.denom ** 2
+    result = term1 + term2
+    result *= s.rho0
+    return result
+
+
+def dim_drho0(f, pars):
+    s = baseline_terms(f, pars)
+    return np.sum(- s.m * s.otc * np.sin(s.ang) / s.denom, axis=1)
+
+
+def dim_dm(f, pars):
+    s = baseline_terms(f, pars)
+    numerator = -s.otc * np.sin(s.ang)
+    result = numerator / s.denom
+    result *= s.rho0
+    return result
+
+
+def dim_dtau(f, pars):
+    s = baseline_terms(f, pars)
+    nom1 = - s.m * np.sin(s.ang) * s.w ** s.c * s.c * s.tau ** (s.c - 1)
+    term1 = nom1 / s.denom
+    nom2 = (s.m * s.otc * np.sin(s.ang)) * \
+        (2 * s.w ** s.c * s.c * s.tau ** (s.c - 1) *
+         np.cos(s.ang) + 2 * s.c * s.w ** (2 * s.c) *
+         s.tau ** (2 * s.c - 1))
+    term2 = nom2 / s.denom ** 2
+    result = term1 + term2
+    result *= s.rho0
+    return result
+
+
+def dim_dc(f, pars):
+    s = baseline_terms(f, pars)
+    nom1a = - s.m * np.log(s.w * s.tau) * s.otc * np.sin(s.ang)
+    nom1b = - s.m * s.otc * (np.pi / 2.0) * np.cos(s.ang)
+    term1 = (nom1a + nom1b) / s.denom
+    nom2 = (s.m * s.otc * np.sin(s.ang)) * \
+        (2 * np.log(s.w * s.tau) * s.otc * np.cos(s.ang) -
+         2 * s.otc * (np.pi / 2.0) * np.sin(s.ang) +
+         2 * np.log(s.w * s.tau) * s.otc2)
+    term2 = nom2 / s.denom ** 2
+    result = term1 + term2
+    result *= s.rho0
+    return result
+
+
+def jacobian_eight_calls(f, pars):
+    """Assemble the Jacobian from the eight partial derivatives of the
+    previous implementation"""
+    partials = [
+        dre_drho0(f, pars)[:, np.newaxis],
+        dre_dm(f, pars),
+        dre_dtau(f, pars),
+        dre_dc(f, pars),
+        dim_drho0(f, pars)[:, np.newaxis],
+        dim_dm(f, pars),
+        dim_dtau(f, pars),
+        dim_dc(f, pars),
+    ]
+    return np.concatenate(partials, axis=1)
+
+
+def main():
+    parsets = {
+        1: [100, 0.1, 0.04, 0.8],
+        3: [100, 0.1, 0.05, 0.05, 1, 0.01, 0.0001, 0.6, 0.5, 0.8],
+    }
+    print('{0:>6} {1:>6} {2:>14} {3:>14} {4:>8}'.format(
+        'N', 'terms', 'eight calls', 'fused', 'speedup'))
+    for nr_f in (20, 100, 1000, 10000):
+        f = np.logspace(-3, 4, nr_f)
+        obj = cc.cc(f)
+        for nr_terms, pars in sorted(parsets.items()):
+            J_ref = jacobian_eight_calls(f, pars)
+            assert np.allclose(J_ref, obj.Jacobian_re_im(pars))
+
+            number = max(10, int(20000 / nr_f))
+            t_eight = min(timeit.repeat(
+                lambda: jacobian_eight_calls(f, pars),
+                number=number, repeat=5)) / number
+            t_fused = min(timeit.repeat(
+                lambda: obj.Jacobian_re_im(pars),
+                number=number, repeat=5)) / number
+            print('{0:>6} {1:>6} {2:>12.1f}us {3:>12.1f}us {4:>7.1f}x'.format(
+                nr_f, nr_terms, t_eight * 1e6, t_fused * 1e6,
+                t_eight / t_fused))
+
+
+if __name__ == '__main__':
+    main()
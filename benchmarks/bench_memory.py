@@ -0,0 +1,79 @@
+#!/usr/bin/env python
+# *-* coding: utf-8 *-*
+"""Measure the peak memory of the batched responses and Jacobians of the
+resistivity Cole-Cole model relative to the size of their outputs
+
+The naive variant evaluates all terms at once on tiled (S, N, P) copies of
+the parameters, as done by the previous parameter handling with np.resize.
+The peak memory of the broadcasting implementation stays at a constant
+multiple of the output size, independent of the number of terms P.
+
+Run as:
+
+    python benchmarks/bench_memory.py
+"""
+import tracemalloc
+
+import numpy as np
+
+import sip_models.res.cc as cc
+
+
+def naive_response_batch(f, parameters):
+    """All terms evaluated at once on tiled (S, N, P) copies"""
+    rho0, m, tau, c = cc.cc_kernels.sort_parameters_batch(parameters)
+    nr_spectra, nr_terms = m.shape
+    newsize = (nr_spectra, f.size, nr_terms)
+    w = np.broadcast_to(2 * np.pi * f[:, np.newaxis], newsize).copy()
+    m, tau, c = [
+        np.broadcast_to(x[:, np.newaxis, :], newsize).copy()
+        for x in (m, tau, c)
+    ]
+    terms = m * (1 - (1 / (1 + (1j * w * tau) ** c)))
+    return rho0[:, np.newaxis] * (1 - np.sum(terms, axis=2))
+
+
+def peak_memory(function, *args, **kwargs):
+    """Return the result of the function and the peak memory in bytes which
+    was allocated during its execution"""
+    tracemalloc.start()
+    result = function(*args, **kwargs)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return result, peak
+
+
+def main():
+    f = np.logspace(-3, 4, 100)
+    obj = cc.cc(f)
+    print('{0:>6} {1:>6} {2:>10} {3:>14} {4:>14} {5:>14}'.format(
+        'S', 'terms', 'output', 'naive resp.', 'response', 'Jacobian'))
+    for nr_spectra in (100, 1000):
+        for nr_terms in (1, 3, 10):
+            parameters = np.hstack((
+                np.full((nr_spectra, 1), 100.0),
+                np.full((nr_spectra, nr_terms), 0.05),
+                np.tile(np.logspace(-4, 0, nr_terms), (nr_spectra, 1)),
+                np.full((nr_spectra, nr_terms), 0.5),
+            ))
+            reference, peak_naive = peak_memory(
+                naive_response_batch, f, parameters)
+            rcomplex, peak_response = peak_memory(
+                obj.response_batch, parameters)
+            assert np.allclose(reference, rcomplex)
+            J, peak_jacobian = peak_memory(
+                obj.Jacobian_re_im_batch, parameters, stacked=True)
+
+            # peak memory as multiples of the output sizes
+            print(
+                '{0:>6} {1:>6} {2:>8.1f}MB {3:>13.1f}x {4:>13.1f}x '
+                '{5:>13.1f}x'.format(
+                    nr_spectra, nr_terms, rcomplex.nbytes / 1e6,
+                    peak_naive / rcomplex.nbytes,
+                    peak_response / rcomplex.nbytes,
+                    peak_jacobian / J.nbytes,
+                ))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,370 @@
+#!/usr/bin/env python
+# *-* coding: utf-8 *-*
+"""Benchmark suite for the hot paths of the Cole-Cole models
+
+Covered are the forward responses and Jacobians of the resistivity model,
+the partial derivatives of the conductivity model, the batch functions, and
+the construction and conversion of :class:`sip_models.sip_response` objects,
+across spectrum lengths, numbers of terms and batch sizes.
+
+The results are stored as JSON. In the comparison mode, the timings of two
+result files are compared, and benchmarks which became slower than a given
+threshold are flagged. The exit status is 1 if any slowdown was flagged, so
+the comparison can be used in scripts.
+
+Run as:
+
+    # run all benchmarks and store the results
+    python benchmarks/bench_suite.py run -o baseline.json
+
+    # run only some benchmarks, with fewer repetitions
+    python benchmarks/bench_suite.py run -o new.json -k jacobian --quick
+
+    # compare against a baseline, flag slowdowns of more than 20 %
+    python benchmarks/bench_suite.py compare baseline.json new.json \\
+        --threshold 0.2
+
+    # run and compare in one step
+    python benchmarks/bench_suite.py run -o new.json --baseline baseline.json
+"""
+import argparse
+import datetime
+import functools
+import json
+import platform
+import sys
+import timeit
+
+import numpy as np
+
+import sip_models
+import sip_models.res.cc as cc_res
+import sip_models.cond.cc as cc_cond
+import sip_models.sip_response as sip_response
+
+SPECTRUM_LENGTHS = (20, 200, 2000)
+TERM_COUNTS = (1, 3)
+BATCH_SIZES = (10, 100, 1000)
+BATCH_LENGTH = 50
+
+
+def _parameters(p0, nr_terms):
+    """Return linear parameters with nr_terms terms"""
+    return np.hstack((
+        [p0],
+        np.full(nr_terms, 0.1 / nr_terms),
+        np.logspace(-3, 1, nr_terms),
+        np.linspace(0.5, 0.8, nr_terms),
+    ))
+
+
+def _parameters_batch(p0, nr_terms, nr_spectra):
+    """Return (S, 1 + 3P) linear parameters with slightly varying p0"""
+    parameters = np.tile(_parameters(p0, nr_terms), (nr_spectra, 1))
+    parameters[:, 0] *= np.linspace(1, 2, nr_spectra)
+    return parameters
+
+
+def _frequencies(nr_f):
+    return np.logspace(-3, 4, nr_f)
+
+
+def bench_res_response(nr_f, nr_terms):
+    obj = cc_res.cc(_frequencies(nr_f))
+    pars = _parameters(100, nr_terms)
+    return lambda: obj.response(pars)
+
+
+def bench_res_jacobian(nr_f, nr_terms):
+    obj = cc_res.cc(_frequencies(nr_f))
+    pars = _parameters(100, nr_terms)
+    return lambda: obj.Jacobian_re_im(pars)
+
+
+def bench_res_jacobian_workspace(nr_f, nr_terms):
+    obj = cc_res.cc(_frequencies(nr_f))
+    pars = _parameters(100, nr_terms)
+    workspace = obj.create_workspace()
+    out = np.empty((2 * nr_f, pars.size))
+    return lambda: obj.Jacobian_re_im(
+        pars, stacked=True, out=out, workspace=workspace)
+
+
+def bench_cond_partials(nr_f, nr_terms):
+    obj = cc_cond.cc(_frequencies(nr_f))
+    pars = _parameters(0.01, nr_terms)
+    partials = [
+        getattr(obj, 'd{0}_d{1}'.format(part, parameter))
+        for part in ('re', 'im')
+        for parameter in ('sigmai', 'm', 'tau', 'c')
+    ]
+
+    def run():
+        for partial in partials:
+            partial(pars)
+    return run
+
+
+def bench_cond_jacobian(nr_f, nr_terms):
+    obj = cc_cond.cc(_frequencies(nr_f))
+    pars = _parameters(0.01, nr_terms)
+    return lambda: obj.Jacobian_re_im(pars)
+
+
+def bench_res_response_batch(nr_spectra, nr_terms):
+    obj = cc_res.cc(_frequencies(BATCH_LENGTH))
+    parameters = _parameters_batch(100, nr_terms, nr_spectra)
+    return lambda: obj.response_batch(parameters)
+
+
+def bench_res_jacobian_batch(nr_spectra, nr_terms):
+    obj = cc_res.cc(_frequencies(BATCH_LENGTH))
+    parameters = _parameters_batch(100, nr_terms, nr_spectra)
+    return lambda: obj.Jacobian_re_im_batch(parameters)
+
+
+def bench_sip_response_construction(nr_f):
+    f = _frequencies(nr_f)
+    rcomplex = cc_res.cc(f).response(_parameters(100, 1)).rcomplex
+    return lambda: sip_response.sip_response(f, rcomplex=rcomplex)
+
+
+def bench_sip_response_conversion(nr_f):
+    f = _frequencies(nr_f)
+    rcomplex = cc_res.cc(f).response(_parameters(100, 1)).rcomplex
+
+    def run():
+        response = sip_response.sip_response(f, rcomplex=rcomplex)
+        response.rmag_rpha
+        response.cre_cim
+        response.cmag_cpha
+    return run
+
+
+def benchmarks():
+    """Return the list of all benchmarks
+
+    Returns
+    -------
+    benchmarks: list of tuples
+        (name, parameters, setup function). The setup function returns the
+        function to time.
+    """
+    suite = []
+    for nr_f in SPECTRUM_LENGTHS:
+        for nr_terms in TERM_COUNTS:
+            parameters = {'N': nr_f, 'P': nr_terms}
+            for name, setup in (
+                    ('res.response', bench_res_response),
+                    ('res.jacobian', bench_res_jacobian),
+                    ('res.jacobian_workspace', bench_res_jacobian_workspace),
+                    ('cond.partials', bench_cond_partials),
+                    ('cond.jacobian', bench_cond_jacobian)):
+                suite.append((
+                    name, parameters,
+                    functools.partial(setup, nr_f, nr_terms)))
+    for nr_spectra in BATCH_SIZES:
+        for nr_terms in TERM_COUNTS:
+            parameters = {'S': nr_spectra, 'P': nr_terms, 'N': BATCH_LENGTH}
+            for name, setup in (
+                    ('res.response_batch', bench_res_response_batch),
+                    ('res.jacobian_batch', bench_res_jacobian_batch)):
+                suite.append((
+                    name, parameters,
+                    functools.partial(setup, nr_spectra, nr_terms)))
+    for nr_f in SPECTRUM_LENGTHS:
+        parameters = {'N': nr_f}
+        for name, setup in (
+                ('sip_response.construction',
+                 bench_sip_response_construction),
+                ('sip_response.conversion', bench_sip_response_conversion)):
+            suite.append((name, parameters, functools.partial(setup, nr_f)))
+    return suite
+
+
+def _key(name, parameters):
+    """Return the unique key of a benchmark, e.g., res.response[N=20,P=1]"""
+    return '{0}[{1}]'.format(name, ','.join(
+        '{0}={1}'.format(key, parameters[key]) for key in sorted(parameters)
+    ))
+
+
+def time_function(function, repeat=5, min_time=0.05):
+    """Time a function with timeit
+
+    The number of calls per repetition is chosen so that one repetition
+    takes at least min_time seconds. The minimum over all repetitions is
+    the least disturbed by other processes.
+
+    Returns
+    -------
+    timing: dict
+        'best', 'median': time per call [s]; 'number': calls per
+        repetition; 'repeat': number of repetitions
+    """
+    timer = timeit.Timer(function)
+    number = 1
+    while True:
+        if timer.timeit(number) >= min_time:
+            break
+        number *= 2
+    times = np.array(timer.repeat(repeat=repeat, number=number)) / number
+    return {
+        'best': float(times.min()),
+        'median': float(np.median(times)),
+        'number': number,
+        'repeat': repeat,
+    }
+
+
+def run(keyword=None, quick=False, verbose=True):
+    """Run the benchmarks
+
+    Parameters
+    ----------
+    keyword: str, optional
+        Only run benchmarks whose key contains this string
+    quick: bool, optional
+        Use fewer and shorter repetitions
+    verbose: bool, optional
+        Print the timings while running
+
+    Returns
+    -------
+    results: dict
+        'metadata': information about the environment;
+        'benchmarks': dict of the timings (see :func:`time_function`),
+        together with the benchmark name and parameters, by key
+    """
+    settings = {'repeat': 3, 'min_time': 0.01} if quick else {}
+    results = {
+        'metadata': {
+            'date': datetime.datetime.now().isoformat(),
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'platform': platform.platform(),
+            'sip_models': getattr(sip_models, '__version__', None),
+            'quick': quick,
+        },
+        'benchmarks': {},
+    }
+    for name, parameters, setup in benchmarks():
+        key = _key(name, parameters)
+        if keyword is not None and keyword not in key:
+            continue
+        timing = time_function(setup(), **settings)
+        timing['name'] = name
+        timing['parameters'] = parameters
+        results['benchmarks'][key] = timing
+        if verbose:
+            print('{0:<50} {1:>12.1f}us'.format(key, timing['best'] * 1e6))
+    return results
+
+
+def compare(baseline, results, threshold=0.1):
+    """Compare the best timings of two result sets
+
+    Parameters
+    ----------
+    baseline: dict
+        baseline results, see :func:`run`
+    results: dict
+        new results
+    threshold: float, optional
+        relative slowdown above which a benchmark is flagged
+
+    Returns
+    -------
+    comparison: list of tuples
+        (key, baseline time, new time, ratio, flagged) of all benchmarks
+        present in both result sets
+    """
+    comparison = []
+    for key, timing in results['benchmarks'].items():
+        if key not in baseline['benchmarks']:
+            continue
+        t_baseline = baseline['benchmarks'][key]['best']
+        ratio = timing['best'] / t_baseline
+        comparison.append(
+            (key, t_baseline, timing['best'], ratio, ratio > 1 + threshold)
+        )
+    return comparison
+
+
+def print_comparison(comparison):
+    """Print a comparison table and return the number of flagged
+    slowdowns"""
+    print('{0:<50} {1:>12} {2:>12} {3:>8}'.format(
+        'benchmark', 'baseline', 'new', 'ratio'))
+    for key, t_baseline, t_new, ratio, flagged in comparison:
+        print('{0:<50} {1:>10.1f}us {2:>10.1f}us {3:>7.2f}x{4}'.format(
+            key, t_baseline * 1e6, t_new * 1e6, ratio,
+            '  SLOWER' if flagged else ''))
+    nr_flagged = sum(item[4] for item in comparison)
+    print('{0} of {1} benchmarks slower than the threshold'.format(
+        nr_flagged, len(comparison)))
+    return nr_flagged
+
+
+def _load(filename):
+    with open(filename, 'r') as fid:
+        return json.load(fid)
+
+
+def _save(results, filename):
+    with open(filename, 'w') as fid:
+        json.dump(results, fid, indent=2, sort_keys=True)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description='Benchmark suite of sip_models')
+    subparsers = parser.add_subparsers(dest='command')
+
+    parser_run = subparsers.add_parser('run', help='run the benchmarks')
+    parser_run.add_argument(
+        '-o', '--output', help='JSON file to store the results in')
+    parser_run.add_argument(
+        '-k', '--keyword',
+        help='only run benchmarks whose name contains this string')
+    parser_run.add_argument(
+        '--quick', action='store_true', help='fewer, shorter repetitions')
+    parser_run.add_argument(
+        '--baseline', help='compare the results against this JSON file')
+    parser_run.add_argument(
+        '--threshold', type=float, default=0.1,
+        help='relative slowdown to flag (default: 0.1)')
+
+    parser_compare = subparsers.add_parser(
+        'compare', help='compare two result files')
+    parser_compare.add_argument('baseline', help='baseline JSON file')
+    parser_compare.add_argument('results', help='new JSON file')
+    parser_compare.add_argument(
+        '--threshold', type=float, default=0.1,
+        help='relative slowdown to flag (default: 0.1)')
+
+    args = parser.parse_args(argv)
+    if args.command == 'run':
+        results = run(keyword=args.keyword, quick=args.quick)
+        if args.output is not None:
+            _save(results, args.output)
+        baseline = args.baseline
+        if baseline is not None:
+            baseline = _load(baseline)
+    elif args.command == 'compare':
+        baseline = _load(args.baseline)
+        results = _load(args.results)
+    else:
+        parser.print_help()
+        return 2
+
+    if baseline is not None:
+        nr_flagged = print_comparison(
+            compare(baseline, results, args.threshold))
+        if nr_flagged > 0:
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,1101 @@
+# *-* coding: utf-8 *-*
+r""" Code shared by the resistivity (:mod:`sip_models.res.cc`) and the
+conductivity (:mod:`sip_models.cond.cc`) formulations of the Cole-Cole model
+
+Both formulations can be written as
+
+.. math::
+
+    Z(\omega) = Z_0 \left(1 - \sum_k m_k T_k(\omega)\right)
+
+with :math:`Z_0 = \rho_0` and :math:`T_k = 1 - K_k` for the resistivity,
+and :math:`Z_0 = \sigma_\infty` and :math:`T_k = K_k` for the conductivity,
+where :math:`K_k = \frac{1}{1 + (j \omega \tau_k)^{c_k}}` is the Cole-Cole
+kernel. The parameter sorting, the intermediate terms, the responses, the
+Jacobians, and the model base class :class:`cc_base` are therefore
+implemented once in this module. The kernel module of each formulation
+(:mod:`sip_models.res.cc_kernels`, :mod:`sip_models.cond.cc_kernels`)
+defines the per-term function and its sign, and is passed to the functions
+of this module as the argument kernels:
+
+* P0_NAME: name of the first parameter, 'rho0' or 'sigmai'
+* SIGN: 1 for :math:`T_k = 1 - K_k`, -1 for :math:`T_k = K_k`, i.e., the
+  derivatives of :math:`T_k` with respect to :math:`\tau_k` and :math:`c_k`
+  are -SIGN times those of :math:`K_k`
+* _complex_term(jotc): transform :math:`(j \omega \tau)^c` in place into
+  :math:`T`
+* _re_term(otc, cos_ang, denom, out), _im_term(otc, sin_ang, denom, out):
+  write the real and imaginary parts of :math:`T` into out
+
+The kernel modules expose the functions of this module with their own
+parameter names, so that the instrumentation can tell the formulations
+apart.
+"""
+import collections
+import threading
+
+import numpy as np
+
+import sip_models.cc_incremental as cc_incremental
+import sip_models.kernel_helpers as kernel_helpers
+import sip_models.sip_response as sip_response
+import sip_models.workspace as sip_workspace
+
+
+def sort_parameters(kernels, parameters):
+    """Sort out the various possible parameter inputs
+
+    We have multiple input formats:
+
+    1) a list, tuple, or numpy.ndarray, containing the linear parameters
+    in the following order:
+    * for single term: p0, m1, tau1, c1
+    * for multiple terms: p0, m1, m2, ..., tau1, tau2, ..., c1, c2, ...
+
+    2) a dictionary with the entries p0 ("rho0" or "sigmai", see
+    kernels.P0_NAME), "m", "tau", "c"
+
+    2b) if the dictionary entries for "m", "tau", and "c" are lists,
+    tuples, or one-dimensional arrays, the entries correspond to mulitple
+    polarisazion terms
+
+    Returns
+    -------
+    p0: float
+        rho0 or sigmai
+    m: :class:`numpy.ndarray`
+        chargeabilities (size P)
+    tau: :class:`numpy.ndarray`
+        relaxation times (size P)
+    c: :class:`numpy.ndarray`
+        c values (size P)
+    """
+    if isinstance(parameters, (list, tuple, np.ndarray)):
+        pars = np.atleast_1d(np.asarray(parameters, dtype=float))
+        nr_pars = int((pars.shape[0] - 1) / 3)
+
+        p0 = pars[0]
+        m = pars[1:nr_pars + 1]
+        tau = pars[nr_pars + 1: 2 * nr_pars + 1]
+        c = pars[2 * nr_pars + 1:]
+
+    elif isinstance(parameters, dict):
+        p0 = parameters[kernels.P0_NAME]
+        m, tau, c = [
+            np.atleast_1d(np.asarray(parameters[key], dtype=float))
+            for key in ('m', 'tau', 'c')
+        ]
+        if max(x.ndim for x in (m, tau, c)) > 1:
+            raise Exception(
+                'm, tau, and c must be scalars or one-dimensional, use '
+                'sort_parameters_batch for multiple spectra')
+    else:
+        print(parameters)
+        raise Exception('Input format not recognized')
+
+    return p0, m, tau, c
+
+
+def sort_parameters_batch(kernels, parameters):
+    """Sort a batch of S parameter sets into arrays
+
+    We have multiple input formats:
+
+    1) a 2D numpy.ndarray (or nested list) of shape (S, 1 + 3 * P), each
+    row containing the linear parameters of one spectrum in the order
+    p0, m1, m2, ..., tau1, tau2, ..., c1, c2, ...
+
+    2) a dictionary with the entries p0 ("rho0" or "sigmai", see
+    kernels.P0_NAME), "m", "tau", "c". p0 is of size S, the other entries
+    are of shape (S, P), or of size S for single-term models. Scalars are
+    broadcast to all spectra.
+
+    Returns
+    -------
+    p0: :class:`numpy.ndarray`
+        size S
+    m: :class:`numpy.ndarray`
+        shape (S, P)
+    tau: :class:`numpy.ndarray`
+        shape (S, P)
+    c: :class:`numpy.ndarray`
+        shape (S, P)
+    """
+    if isinstance(parameters, (list, tuple, np.ndarray)):
+        pars = np.atleast_2d(np.asarray(parameters, dtype=float))
+        nr_pars = int((pars.shape[1] - 1) / 3)
+
+        p0 = pars[:, 0]
+        m = pars[:, 1:nr_pars + 1]
+        tau = pars[:, nr_pars + 1: 2 * nr_pars + 1]
+        c = pars[:, 2 * nr_pars + 1:]
+    elif isinstance(parameters, dict):
+        p0 = np.asarray(
+            parameters[kernels.P0_NAME], dtype=float).reshape(-1)
+        m, tau, c = [
+            np.asarray(parameters[key], dtype=float) for key in
+            ('m', 'tau', 'c')
+        ]
+        # single-term models may provide one value per spectrum
+        m, tau, c = [x.reshape(-1, 1) if x.ndim < 2 else x
+                     for x in (m, tau, c)]
+        m, tau, c = np.broadcast_arrays(m, tau, c)
+        nr_spectra = max(p0.size, m.shape[0])
+        p0 = np.broadcast_to(p0, (nr_spectra, ))
+        m, tau, c = [
+            np.broadcast_to(x, (nr_spectra, x.shape[1]))
+            for x in (m, tau, c)
+        ]
+    else:
+        print(parameters)
+        raise Exception('Input format not recognized')
+
+    return p0, m, tau, c
+
+
+def intermediates(omega, m, tau, c, log_omega=None, cached=None,
+                  workspace=None):
+    r"""Compute the terms shared by the response and its derivatives
+
+    Parameters
+    ----------
+    omega: :class:`numpy.ndarray`
+        angular frequencies (size N)
+    m, tau, c: :class:`numpy.ndarray`
+        parameters of the P terms, either of shape (P), or of shape (S, P)
+        for S spectra
+    log_omega: :class:`numpy.ndarray`, optional
+        precomputed natural logarithms of the angular frequencies (size N)
+    cached: tuple, optional
+        intermediates computed earlier for the same frequencies and
+        parameters, which are returned unchanged
+    workspace: :class:`sip_models.workspace.workspace`, optional
+        If provided, the full-size arrays are written into its buffers
+
+    All returned arrays are broadcast from zero-copy views of the inputs, and
+    their shapes are given for parameters of shape (P). For parameters of
+    shape (S, P), the full-size arrays are of shape (S, N, P).
+
+    Returns
+    -------
+    w: :class:`numpy.ndarray`
+        (N x 1) view of the angular frequencies, which broadcasts against
+        the (P) parameter arrays
+    log_wtau: :class:`numpy.ndarray`
+        (N x P): :math:`ln(\omega \tau)`
+    otc: :class:`numpy.ndarray`
+        (N x P): :math:`(\omega \tau)^c`
+    otc2: :class:`numpy.ndarray`
+        (N x P): :math:`(\omega \tau)^{2 c}`
+    ang: :class:`numpy.ndarray`
+        (1 x P): :math:`\frac{c \pi}{2}`
+    denom: :class:`numpy.ndarray`
+        (N x P): :math:`1 + 2 (\omega \tau)^c cos(\frac{c \pi}{2}) +
+        (\omega \tau)^{2 c}`
+    """
+    if cached is not None:
+        return cached
+    w = np.asarray(omega)[:, np.newaxis]
+    if log_omega is None:
+        log_omega = np.log(omega)
+    # parameters broadcast along a new frequency axis: (..., 1, P)
+    tau = np.asarray(tau)[..., np.newaxis, :]
+    c = np.asarray(c)[..., np.newaxis, :]
+    shape = tau.shape[:-2] + (w.shape[0], tau.shape[-1])
+    # (omega tau)^c is evaluated from the logarithms, so that only P
+    # logarithms have to be computed for precomputed frequencies
+    log_wtau = np.add(
+        np.asarray(log_omega)[:, np.newaxis], np.log(tau),
+        out=sip_workspace.buffer(workspace, 'log_wtau', shape))
+    otc = np.multiply(
+        c, log_wtau, out=sip_workspace.buffer(workspace, 'otc', shape))
+    np.exp(otc, out=otc)
+    otc2 = np.multiply(
+        otc, otc, out=sip_workspace.buffer(workspace, 'otc2', shape))
+    ang = c * np.pi / 2.0  # rad
+    denom = np.multiply(
+        otc, 2 * np.cos(ang),
+        out=sip_workspace.buffer(workspace, 'denom', shape))
+    denom += 1
+    denom += otc2
+    return w, log_wtau, otc, otc2, ang, denom
+
+
+def response(kernels, omega, pars, log_omega=None, intermediates=None,
+             out=None, workspace=None):
+    """Complex response :math:`Z_0 (1 - \\sum_k m_k T_k)` of the Cole-Cole
+    model
+
+    Parameters
+    ----------
+    kernels: module
+        kernel module of the formulation
+    omega: :class:`numpy.ndarray`
+        angular frequencies (size N)
+    pars: list or tuple or numpy.ndarray or dict
+        Cole-Cole model parameters: p0, m, tau, c (all linear)
+    log_omega: :class:`numpy.ndarray`, optional
+        precomputed natural logarithms of the angular frequencies (size N).
+        Computed from omega if not provided.
+    intermediates: tuple, optional
+        cached result of :func:`intermediates` for these frequencies and
+        parameters
+    out: :class:`numpy.ndarray`, optional
+        complex array of size N. If provided, the response is written into
+        this array.
+    workspace: :class:`sip_models.workspace.workspace`, optional
+        If provided, the (N x P) terms are computed in its buffers, so that
+        no arrays are allocated
+
+    Returns
+    -------
+    response: :class:`numpy.ndarray`
+        complex resistivities or conductivities (size N)
+    """
+    p0, m, tau, c = kernels.sort_parameters(pars)
+    omega = np.atleast_1d(omega)
+    jotc = sip_workspace.buffer(
+        workspace, 'jotc', (omega.size, m.size), complex)
+    # (j omega tau)^c = (omega tau)^c exp(j c pi / 2)
+    if intermediates is not None:
+        otc, ang = intermediates[2], intermediates[4]
+        np.multiply(otc, np.exp(1j * ang), out=jotc)
+    else:
+        if log_omega is None:
+            log_omega = np.log(omega)
+        np.add(
+            np.asarray(log_omega)[:, np.newaxis], np.log(tau),
+            out=jotc.real)
+        jotc.real *= c
+        jotc.imag = c * np.pi / 2.0
+        np.exp(jotc, out=jotc)
+    # m T
+    kernels._complex_term(jotc)
+    jotc *= m
+    # sum up terms
+    result = sip_workspace.output(out, (omega.size, ), complex)
+    np.sum(jotc, axis=1, out=result)
+    # p0 (1 - sum)
+    np.subtract(1, result, out=result)
+    result *= p0
+    return result
+
+
+def terms(kernels, omega, tau, c, log_omega=None, out=None,
+          workspace=None):
+    r"""Complex per-term functions :math:`T_k` of the Cole-Cole model
+
+    Parameters
+    ----------
+    kernels: module
+        kernel module of the formulation
+    omega: :class:`numpy.ndarray`
+        angular frequencies (size N)
+    tau, c: :class:`numpy.ndarray`
+        parameters of the P terms
+    log_omega: :class:`numpy.ndarray`, optional
+        precomputed natural logarithms of the angular frequencies (size N)
+    out: :class:`numpy.ndarray`, optional
+        complex (N x P) output array
+    workspace: :class:`sip_models.workspace.workspace`, optional
+        Workspace for the intermediate terms
+
+    Returns
+    -------
+    terms: :class:`numpy.ndarray`
+        complex (N x P) array
+    """
+    tau = np.atleast_1d(np.asarray(tau, dtype=float))
+    c = np.atleast_1d(np.asarray(c, dtype=float))
+    w, log_wtau, otc, otc2, ang, denom = kernels._intermediates(
+        omega, None, tau, c, log_omega, workspace=workspace)
+    result = sip_workspace.output(out, otc.shape, complex)
+    kernels._re_term(otc, np.cos(ang), denom, result.real)
+    kernels._im_term(otc, np.sin(ang), denom, result.imag)
+    return result
+
+
+def response_batch(kernels, omega, parameters, log_omega=None):
+    """Complex responses of the Cole-Cole model for S parameter sets,
+    computed in one vectorized pass
+
+    Parameters
+    ----------
+    kernels: module
+        kernel module of the formulation
+    omega: :class:`numpy.ndarray`
+        angular frequencies (size N)
+    parameters: numpy.ndarray or dict
+        Cole-Cole model parameters of S spectra (all linear), either as
+        an (S, 1 + 3 * P) array, or as a dict with array-valued entries.
+        See :func:`sort_parameters_batch`
+    log_omega: :class:`numpy.ndarray`, optional
+        precomputed natural logarithms of the angular frequencies (size N).
+        Computed from omega if not provided.
+
+    Returns
+    -------
+    response: :class:`numpy.ndarray`
+        (S, N) array with the complex resistivities or conductivities
+    """
+    p0, m, tau, c = kernels.sort_parameters_batch(parameters)
+    omega = np.atleast_1d(omega)
+    if log_omega is None:
+        log_omega = np.log(omega)
+    log_omega = np.asarray(log_omega)[np.newaxis, :]
+
+    # accumulate the terms one by one, and operate in place, to keep the
+    # memory footprint at the size of the output
+    shape = (p0.size, omega.size)
+    specs = np.zeros(shape, dtype=complex)
+    jotc = np.empty(shape, dtype=complex)
+    for term in range(m.shape[1]):
+        c_term = c[:, term, np.newaxis]
+        # (j omega tau)^c = exp(c ln(omega tau) + j c pi / 2)
+        jotc.real = log_omega + np.log(tau[:, term, np.newaxis])
+        jotc.real *= c_term
+        jotc.imag = c_term * np.pi / 2.0
+        np.exp(jotc, out=jotc)
+        # m T
+        kernels._complex_term(jotc)
+        jotc *= m[:, term, np.newaxis]
+        specs += jotc
+    del jotc
+
+    # p0 (1 - sum)
+    result = np.subtract(1, specs, out=specs)
+    result *= p0[:, np.newaxis]
+    return result
+
+
+def fill_jacobian(kernels, J_re, J_im, omega, p0, m, tau, c,
+                  log_omega=None, log10=False, intermediates=None,
+                  workspace=None):
+    r"""Write the partial derivatives of the real and imaginary parts into
+    the views J_re and J_im
+
+    Parameters of shape (P), with a scalar p0, fill views of shape
+    (N, 1 + 3P). Parameters of shape (S, P), with p0 of size S, fill
+    views of shape (S, N, 1 + 3P). The intermediate terms are broadcast
+    from zero-copy views of the parameters and are computed in place, so
+    that the peak memory scales with the size of the output. If a workspace
+    is provided, they are written into its buffers, and no arrays are
+    allocated.
+
+    The derivatives with respect to tau and c derive from the complex
+    derivative :math:`G = z K^2` of the Cole-Cole kernel :math:`K = \frac{1}{1
+    + z}`, :math:`z = (j \omega \tau)^c`, using :math:`\frac{\partial
+    K}{\partial \tau} = - \frac{c}{\tau} G` and :math:`\frac{\partial
+    K}{\partial c} = - ln(j \omega \tau) G`. The real and imaginary parts
+    of G, P and -Q, are evaluated with real arithmetic, which is faster than
+    NumPy's complex arithmetic for long spectra, and are shared by the
+    derivatives of both parts. A complex Jacobian can be filled by passing
+    its .real and .imag views.
+
+    For log10 parameters (see :func:`Jacobian_re_im`), the chain-rule
+    factors are folded into the prefactors of the parameter blocks, so that
+    no additional pass over the Jacobian is required.
+    """
+    nr_terms = m.shape[-1]
+    w, log_wtau, otc, otc2, ang, denom = kernels._intermediates(
+        omega, m, tau, c, log_omega, intermediates, workspace)
+    # parameters broadcast along the frequency axis: (..., 1, P)
+    m, tau, c = [np.asarray(x)[..., np.newaxis, :] for x in (m, tau, c)]
+    p0 = np.asarray(p0, dtype=float)[..., np.newaxis, np.newaxis]
+    cos_ang = np.cos(ang)
+    sin_ang = np.sin(ang)
+    log10 = np.broadcast_to(
+        np.asarray(log10, dtype=bool), (1 + 3 * nr_terms, ))
+    s_p0, s_m, s_tau, s_c = kernel_helpers.log10_scaling(
+        log10, p0, m, tau, c)
+
+    m_slice = slice(1, nr_terms + 1)
+    tau_slice = slice(nr_terms + 1, 2 * nr_terms + 1)
+    c_slice = slice(2 * nr_terms + 1, 1 + 3 * nr_terms)
+    term = sip_workspace.buffer(workspace, 'term', otc.shape)
+
+    # p0 and m: 1 - sum(m T), - p0 T
+    kernels._re_term(otc, cos_ang, denom, term)
+    np.multiply(-p0 * s_m, term, out=J_re[..., m_slice])
+    term *= m
+    J_re_p0 = J_re[..., 0]
+    np.sum(term, axis=-1, out=J_re_p0)
+    np.subtract(1, J_re_p0, out=J_re_p0)
+    J_re_p0 *= s_p0[..., 0]
+
+    kernels._im_term(otc, sin_ang, denom, term)
+    np.multiply(-p0 * s_m, term, out=J_im[..., m_slice])
+    term *= m
+    J_im_p0 = J_im[..., 0]
+    np.sum(term, axis=-1, out=J_im_p0)
+    J_im_p0 *= -s_p0[..., 0]
+
+    P = kernel_helpers.P_term(
+        otc, otc2, cos_ang, denom,
+        sip_workspace.buffer(workspace, 'P', otc.shape))
+    Q = kernel_helpers.Q_term(otc, otc2, sin_ang, denom, term)
+    del otc, otc2, denom
+
+    # the derivatives of T are -SIGN times those of K
+    p0_m = -kernels.SIGN * p0 * m
+    # tau
+    prefactor = p0_m * c / tau * s_tau
+    np.multiply(prefactor, P, out=J_re[..., tau_slice])
+    np.multiply(prefactor, Q, out=J_im[..., tau_slice])
+    # c
+    J_re_c = J_re[..., c_slice]
+    np.multiply(log_wtau, P, out=J_re_c)
+    J_im_c = J_im[..., c_slice]
+    np.multiply(log_wtau, Q, out=J_im_c)
+    P *= np.pi / 2.0
+    Q *= np.pi / 2.0
+    J_re_c -= Q
+    J_re_c *= p0_m * s_c
+    J_im_c += P
+    J_im_c *= p0_m * s_c
+
+
+def Jacobian_re_im(kernels, omega, pars, stacked=False, out=None,
+                   log10=False, log_omega=None, intermediates=None,
+                   workspace=None):
+    r"""Jacobian of real and imaginary parts with respect to the linear
+    parameters :math:`Z_0, m_i, \tau_i, c_i`
+
+    All partial derivatives are computed in one pass from the shared
+    intermediate terms. With :math:`r = (\omega \tau)^c`,
+    :math:`\theta = \frac{c \pi}{2}` and :math:`D = 1 + 2 r cos(\theta)
+    + r^2`, the derivatives with respect to :math:`\tau` and :math:`c`
+    reduce to
+
+    :math:`P = r \frac{cos(\theta) (1 + r^2) + 2 r}{D^2}, Q = r
+    \frac{sin(\theta) (1 - r^2)}{D^2}`
+
+    :math:`\frac{\partial Z'}{\partial \tau} = - s Z_0 m
+    \frac{c}{\tau} P, \frac{\partial Z''}{\partial \tau} = - s
+    Z_0 m \frac{c}{\tau} Q`
+
+    :math:`\frac{\partial Z'}{\partial c} = - s Z_0 m \left(
+    ln(\omega \tau) P - \frac{\pi}{2} Q\right), \frac{\partial
+    Z''}{\partial c} = - s Z_0 m \left(ln(\omega \tau) Q +
+    \frac{\pi}{2} P\right)`
+
+    with the sign s of the formulation (kernels.SIGN).
+
+    >>> import sip_models.res.cc_kernels as cc_kernels
+    >>> import numpy as np
+    >>> omega = 2 * np.pi * np.logspace(-3, 3, 20)
+    >>> pars = [100, 0.1, 0.04, 0.8]
+    >>> J = cc_kernels.Jacobian_re_im(omega, pars)
+    >>> J.shape
+    (20, 8)
+    >>> J = cc_kernels.Jacobian_re_im(omega, pars, stacked=True)
+    >>> J.shape
+    (40, 4)
+
+    Parameters
+    ----------
+    kernels: module
+        kernel module of the formulation
+    omega: :class:`numpy.ndarray`
+        angular frequencies (size N)
+    pars: list or tuple or numpy.ndarray or dict
+        Cole-Cole model parameters: p0, m, tau, c (all linear)
+    stacked: bool, optional
+        If False (default), return a (N, 2 * (1 + 3P)) array with the
+        derivatives of the real parts in the first 1 + 3P columns, and
+        those of the imaginary parts in the last 1 + 3P columns. If True,
+        return a (2N, 1 + 3P) array with the derivatives of the real parts
+        in the first N rows, and those of the imaginary parts in the last
+        N rows.
+    out: :class:`numpy.ndarray`, optional
+        C-contiguous float array of the output shape. If provided, the
+        Jacobian is written into this array.
+    log10: bool or array-like of bools, optional
+        Return derivatives with respect to the log10 of the parameters,
+        either for all parameters (True), or for those parameters selected
+        by a boolean array of size 1 + 3P. The parameters themselves are
+        always provided linearly.
+    log_omega: :class:`numpy.ndarray`, optional
+        precomputed natural logarithms of the angular frequencies (size N).
+        Computed from omega if not provided.
+    intermediates: tuple, optional
+        cached result of :func:`intermediates` for these frequencies and
+        parameters
+    workspace: :class:`sip_models.workspace.workspace`, optional
+        If provided, the intermediate terms are computed in its buffers.
+        Together with out, no arrays are allocated.
+
+    Returns
+    -------
+    J: :class:`numpy.ndarray`
+        The Jacobian, ordered p0, m1, m2, ..., tau1, tau2, ..., c1, c2,
+        ...
+    """
+    p0, m, tau, c = kernels.sort_parameters(pars)
+    J, J_re, J_im = kernel_helpers.jacobian_output(
+        (), omega.size, m.size, stacked, out)
+    kernels._fill_jacobian(
+        J_re, J_im, omega, p0, m, tau, c, log_omega, log10=log10,
+        intermediates=intermediates, workspace=workspace)
+    return J
+
+
+def Jacobian_log10_re_im(kernels, omega, pars, stacked=False, out=None,
+                         log_omega=None, intermediates=None, workspace=None):
+    """Jacobian of real and imaginary parts with respect to the log10 of all
+    parameters, as required by log-parameterized inversions
+
+    The parameters are provided linearly. The chain-rule factors are applied
+    within the single pass of :func:`Jacobian_re_im`, instead of calling the
+    dre_dlog10*/dim_dlog10* functions one by one.
+
+    >>> import sip_models.res.cc_kernels as cc_kernels
+    >>> import numpy as np
+    >>> omega = 2 * np.pi * np.logspace(-3, 3, 20)
+    >>> pars = [100, 0.1, 0.04, 0.8]
+    >>> J_log10 = cc_kernels.Jacobian_log10_re_im(omega, pars, stacked=True)
+    >>> J = cc_kernels.Jacobian_re_im(omega, pars, stacked=True)
+    >>> np.allclose(J_log10, J * np.log(10) * np.array(pars))
+    True
+
+    Parameters
+    ----------
+    kernels: module
+        kernel module of the formulation
+    omega: :class:`numpy.ndarray`
+        angular frequencies (size N)
+    pars: list or tuple or numpy.ndarray or dict
+        Cole-Cole model parameters: p0, m, tau, c (all linear)
+    stacked, out, log_omega, intermediates, workspace: optional
+        See :func:`Jacobian_re_im`
+
+    Returns
+    -------
+    J: :class:`numpy.ndarray`
+        The Jacobian with respect to log10(p0), log10(m1), ...,
+        log10(tau1), ..., log10(c1), ...
+    """
+    return kernels.Jacobian_re_im(
+        omega, pars, stacked=stacked, out=out, log10=True,
+        log_omega=log_omega, intermediates=intermediates,
+        workspace=workspace)
+
+
+def Jacobian_complex(kernels, omega, pars, out=None, log10=False,
+                     log_omega=None, intermediates=None):
+    r"""Jacobian of the complex response with respect to the parameters,
+    i.e., the complex partial derivatives. The real and imaginary parts
+    equal the derivatives returned by the dre_*/dim_* functions.
+
+    >>> import sip_models.res.cc_kernels as cc_kernels
+    >>> import numpy as np
+    >>> omega = 2 * np.pi * np.logspace(-3, 3, 20)
+    >>> pars = [100, 0.1, 0.04, 0.8]
+    >>> J = cc_kernels.Jacobian_complex(omega, pars)
+    >>> J.shape, J.dtype
+    ((20, 4), dtype('complex128'))
+    >>> np.allclose(J[:, 3], cc_kernels.dim_dc(omega, pars)[:, 0] * 1j +
+    ...             cc_kernels.dre_dc(omega, pars)[:, 0])
+    True
+
+    Parameters
+    ----------
+    kernels: module
+        kernel module of the formulation
+    omega: :class:`numpy.ndarray`
+        angular frequencies (size N)
+    pars: list or tuple or numpy.ndarray or dict
+        Cole-Cole model parameters: p0, m, tau, c (all linear)
+    out: :class:`numpy.ndarray`, optional
+        complex (N, 1 + 3P) array. If provided, the Jacobian is written into
+        this array.
+    log10, log_omega, intermediates: optional
+        See :func:`Jacobian_re_im`
+
+    Returns
+    -------
+    J: :class:`numpy.ndarray`
+        complex (N, 1 + 3P) array, ordered p0, m1, m2, ..., tau1, tau2,
+        ..., c1, c2, ...
+    """
+    p0, m, tau, c = kernels.sort_parameters(pars)
+    shape = (omega.size, 1 + 3 * m.size)
+    if out is None:
+        J = np.empty(shape, dtype=complex)
+    else:
+        if out.shape != shape or out.dtype != complex:
+            raise Exception(
+                'out must be a complex array of shape {}'.format(shape)
+            )
+        J = out
+    kernels._fill_jacobian(
+        J.real, J.imag, omega, p0, m, tau, c, log_omega, log10=log10,
+        intermediates=intermediates)
+    return J
+
+
+def Jacobian_logmag_pha(kernels, omega, pars, stacked=False, out=None,
+                        log10=False, log_omega=None, intermediates=None):
+    r"""Jacobian of the natural logarithm of the magnitude and of the phase
+    [mrad] with respect to the parameters
+
+    The fused real/imaginary Jacobian is transformed in place by the chain
+    rule. With :math:`Z = a + j b`:
+
+    :math:`\frac{\partial ln|Z|}{\partial p} = \frac{a
+    \frac{\partial a}{\partial p} + b \frac{\partial b}{\partial
+    p}}{a^2 + b^2}, \frac{\partial \phi}{\partial p} = 1000 \frac{a
+    \frac{\partial b}{\partial p} - b \frac{\partial a}{\partial
+    p}}{a^2 + b^2}`
+
+    >>> import sip_models.res.cc_kernels as cc_kernels
+    >>> import numpy as np
+    >>> omega = 2 * np.pi * np.logspace(-3, 3, 20)
+    >>> pars = [100, 0.1, 0.04, 0.8]
+    >>> J = cc_kernels.Jacobian_logmag_pha(omega, pars)
+    >>> J.shape
+    (20, 8)
+
+    Parameters
+    ----------
+    kernels: module
+        kernel module of the formulation
+    omega: :class:`numpy.ndarray`
+        angular frequencies (size N)
+    pars: list or tuple or numpy.ndarray or dict
+        Cole-Cole model parameters: p0, m, tau, c (all linear)
+    stacked, out, log10, log_omega, intermediates: optional
+        See :func:`Jacobian_re_im`. The derivatives of the log-magnitudes
+        take the place of the derivatives of the real parts, and those of
+        the phases the place of the imaginary parts.
+
+    Returns
+    -------
+    J: :class:`numpy.ndarray`
+        The Jacobian, ordered p0, m1, m2, ..., tau1, tau2, ..., c1, c2,
+        ...
+    """
+    p0, m, tau, c = kernels.sort_parameters(pars)
+    J, J_re, J_im = kernel_helpers.jacobian_output(
+        (), omega.size, m.size, stacked, out)
+    kernels._fill_jacobian(
+        J_re, J_im, omega, p0, m, tau, c, log_omega, log10=log10,
+        intermediates=intermediates)
+    response_complex = kernels.response(
+        omega, pars, log_omega, intermediates)
+    kernel_helpers.to_logmag_pha(response_complex, J_re, J_im)
+    return J
+
+
+def Jacobian_re_im_batch(kernels, omega, parameters, stacked=False,
+                         out=None, log10=False, log_omega=None):
+    """Jacobians of real and imaginary parts of S spectra, computed in one
+    vectorized pass by broadcasting over (S, N, P)
+
+    >>> import sip_models.res.cc_kernels as cc_kernels
+    >>> import numpy as np
+    >>> omega = 2 * np.pi * np.logspace(-3, 3, 20)
+    >>> pars = [[100, 0.1, 0.04, 0.8], [1000, 0.1, 0.1, 0.2]]
+    >>> J = cc_kernels.Jacobian_re_im_batch(omega, pars, stacked=True)
+    >>> J.shape
+    (2, 40, 4)
+
+    Parameters
+    ----------
+    kernels: module
+        kernel module of the formulation
+    omega: :class:`numpy.ndarray`
+        angular frequencies (size N)
+    parameters: numpy.ndarray or dict
+        Cole-Cole model parameters of S spectra (all linear), either as
+        an (S, 1 + 3 * P) array, or as a dict with array-valued entries.
+        See :func:`sort_parameters_batch`
+    stacked: bool, optional
+        Layout of the Jacobian of each spectrum, see :func:`Jacobian_re_im`
+    out: :class:`numpy.ndarray`, optional
+        C-contiguous float array of the output shape. If provided, the
+        Jacobians are written into this array.
+    log10: bool or array-like of bools, optional
+        See :func:`Jacobian_re_im`
+    log_omega: :class:`numpy.ndarray`, optional
+        precomputed natural logarithms of the angular frequencies (size N).
+        Computed from omega if not provided.
+
+    Returns
+    -------
+    J: :class:`numpy.ndarray`
+        (S, N, 2 * (1 + 3P)) or, if stacked, (S, 2N, 1 + 3P) array with the
+        Jacobians of the S spectra
+    """
+    p0, m, tau, c = kernels.sort_parameters_batch(parameters)
+    J, J_re, J_im = kernel_helpers.jacobian_output(
+        p0.shape, omega.size, m.shape[-1], stacked, out)
+    kernels._fill_jacobian(
+        J_re, J_im, omega, p0, m, tau, c, log_omega, log10=log10)
+    return J
+
+
+class cc_base(object):
+    """ Base class for Cole-Cole objects (both resistivity and conductivity)
+
+    The computations are delegated to the stateless functions of the kernel
+    module of the formulation (class attribute _kernels), so one object can
+    be used concurrently from multiple threads. The class attribute
+    _complex_key, 'rcomplex' or 'ccomplex', selects the representation with
+    which the returned :class:`sip_models.sip_response.sip_response` objects
+    are initialized.
+    """
+    _kernels = None
+    _complex_key = None
+
+    def __init__(self, frequencies, cache_size=0):
+        """
+        Parameters
+        ----------
+        frequencies: :class:`numpy.ndarray`
+            Frequencies [Hz]
+        cache_size: int, optional
+            If larger than zero, the intermediate terms of the last
+            cache_size parameter sets are kept (least recently used
+            eviction), so that repeated evaluations of responses and
+            derivatives for the same parameters reuse them. Disabled by
+            default.
+        """
+        self.cache_size = cache_size
+        self._cache = collections.OrderedDict()
+        self._cache_lock = threading.Lock()
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.f = frequencies
+
+    @property
+    def f(self):
+        """Frequencies [Hz]"""
+        return self._f
+
+    @f.setter
+    def f(self, frequencies):
+        """Set the frequencies and precompute the frequency-dependent terms,
+        which are reused by all responses and derivatives
+        """
+        self._f = frequencies
+        omega = 2 * np.pi * np.atleast_1d(frequencies).astype(float)
+        log_omega = np.log(omega)
+        # the cached arrays are shared by all calls and must not be modified
+        omega.setflags(write=False)
+        log_omega.setflags(write=False)
+        self.omega = omega
+        self.log_omega = log_omega
+        # (N x 1) view which broadcasts against (P) parameter arrays
+        self._w = omega[:, np.newaxis]
+        # cached intermediates belong to the previous frequencies
+        self._grid_key = hash(omega.tobytes())
+        self.clear_cache()
+
+    def clear_cache(self):
+        """Remove all cached intermediates and reset the hit/miss counters"""
+        with self._cache_lock:
+            self._cache.clear()
+            self.cache_hits = 0
+            self.cache_misses = 0
+
+    def create_workspace(self):
+        """Return a new workspace for the intermediate terms
+
+        Passing the same workspace, together with preallocated output arrays
+        (out=), to repeated calls of :meth:`response`, the dre_*/dim_*
+        methods, and :meth:`Jacobian_re_im` avoids all allocations of
+        frequency-sized arrays, e.g., in the iterations of a fit. A
+        workspace must not be shared between threads.
+
+        Returns
+        -------
+        workspace: :class:`sip_models.workspace.workspace`
+            empty workspace, its buffers are allocated on first use
+        """
+        return sip_workspace.workspace()
+
+    def _get_intermediates(self, parameters):
+        """Return the intermediate terms of the given parameters from the
+        cache, computing and storing them if required
+
+        The cache key is built from the frequency grid and the parameters m,
+        tau, and c, i.e., parameter sets which only differ in the first
+        parameter share their intermediates.
+
+        Returns
+        -------
+        intermediates: tuple or None
+            See :func:`intermediates`. None if the cache is disabled.
+        """
+        if self.cache_size <= 0:
+            return None
+
+        _, m, tau, c = self._sort_parameters(parameters)
+        key = (self._grid_key, np.concatenate((m, tau, c)).tobytes())
+        with self._cache_lock:
+            if key in self._cache:
+                self._cache.move_to_end(key)
+                self.cache_hits += 1
+                return self._cache[key]
+            self.cache_misses += 1
+
+        intermediates = self._kernels._intermediates(
+            self.omega, m, tau, c, self.log_omega)
+        # the cached arrays are shared by all calls and must not be modified
+        for item in intermediates:
+            item.setflags(write=False)
+
+        with self._cache_lock:
+            self._cache[key] = intermediates
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return intermediates
+
+    def _sort_parameters(self, parameters):
+        """See :func:`sort_parameters`"""
+        return self._kernels.sort_parameters(parameters)
+
+    def _sort_parameters_batch(self, parameters):
+        """See :func:`sort_parameters_batch`"""
+        return self._kernels.sort_parameters_batch(parameters)
+
+    def response(self, parameters, out=None, workspace=None):
+        r"""Complex response of the Cole-Cole model
+
+        Parameters
+        ----------
+        parameters: list or tuple or numpy.ndarray or dict
+            Cole-Cole model parameters: rho0 or sigmai, m, tau, c (all
+            linear)
+        out: :class:`numpy.ndarray`, optional
+            complex array of size N, into which the complex resistivities or
+            conductivities are written
+        workspace: :class:`sip_models.workspace.workspace`, optional
+            Workspace for the intermediate terms, see
+            :meth:`create_workspace`
+
+        Returns
+        -------
+        response: :class:`sip_models.sip_response.sip_response`
+            model response object
+        """
+        response_complex = self._kernels.response(
+            self.omega, parameters, self.log_omega,
+            self._get_intermediates(parameters), out, workspace)
+        return sip_response.sip_response(
+            self.f, **{self._complex_key: response_complex})
+
+    def response_batch(self, parameters):
+        r"""Complex responses of the Cole-Cole model for S parameter sets,
+        computed in one vectorized pass
+
+        >>> import sip_models.res.cc as cc
+        >>> import numpy as np
+        >>> f = np.logspace(-3, 3, 20)
+        >>> pars = [[100, 0.1, 0.04, 0.8], [1000, 0.1, 0.1, 0.2]]
+        >>> obj = cc.cc(f)
+        >>> rcomplex = obj.response_batch(pars)
+        >>> rcomplex.shape
+        (2, 20)
+
+        Parameters
+        ----------
+        parameters: numpy.ndarray or dict
+            Cole-Cole model parameters of S spectra (all linear), either as
+            an (S, 1 + 3 * P) array, or as a dict with array-valued entries.
+            See :func:`sort_parameters_batch`
+
+        Returns
+        -------
+        response: :class:`numpy.ndarray`
+            (S, N) array with the complex resistivities or conductivities
+        """
+        return self._kernels.response_batch(
+            self.omega, parameters, self.log_omega)
+
+    def Jacobian_re_im(self, pars, stacked=False, out=None, log10=False,
+                       workspace=None):
+        r"""Jacobian of real and imaginary parts with respect to the linear
+        parameters, computed in one pass
+
+        See :func:`Jacobian_re_im`
+
+        >>> import sip_models.res.cc as cc
+        >>> import numpy as np
+        >>> f = np.logspace(-3, 3, 20)
+        >>> pars = [100, 0.1, 0.04, 0.8]
+        >>> obj = cc.cc(f)
+        >>> J = obj.Jacobian_re_im(pars)
+        >>> J.shape
+        (20, 8)
+        >>> J = obj.Jacobian_re_im(pars, stacked=True)
+        >>> J.shape
+        (40, 4)
+
+        Parameters
+        ----------
+        pars: list or tuple or numpy.ndarray or dict
+            Cole-Cole model parameters: rho0 or sigmai, m, tau, c (all
+            linear)
+        stacked: bool, optional
+            If False (default), return a (N, 2 * (1 + 3P)) array with the
+            derivatives of the real parts in the first 1 + 3P columns, and
+            those of the imaginary parts in the last 1 + 3P columns. If True,
+            return a (2N, 1 + 3P) array with the derivatives of the real parts
+            in the first N rows, and those of the imaginary parts in the last
+            N rows.
+        out: :class:`numpy.ndarray`, optional
+            C-contiguous float array of the output shape. If provided, the
+            Jacobian is written into this array.
+        log10: bool or array-like of bools, optional
+            Return derivatives with respect to the log10 of the parameters,
+            either for all parameters (True), or for those parameters
+            selected by a boolean array of size 1 + 3P. The parameters
+            themselves are always provided linearly.
+        workspace: :class:`sip_models.workspace.workspace`, optional
+            Workspace for the intermediate terms, see
+            :meth:`create_workspace`. Together with out, no arrays are
+            allocated.
+
+        Returns
+        -------
+        J: :class:`numpy.ndarray`
+            The Jacobian, ordered p0, m1, m2, ..., tau1, tau2, ..., c1, c2,
+            ...
+        """
+        return self._kernels.Jacobian_re_im(
+            self.omega, pars, stacked=stacked, out=out, log10=log10,
+            log_omega=self.log_omega,
+            intermediates=self._get_intermediates(pars),
+            workspace=workspace)
+
+    def Jacobian_log10_re_im(self, pars, stacked=False, out=None,
+                             workspace=None):
+        """Jacobian of real and imaginary parts with respect to the log10 of
+        all parameters, computed in one pass
+
+        Parameters
+        ----------
+        pars: list or tuple or numpy.ndarray or dict
+            Cole-Cole model parameters: rho0 or sigmai, m, tau, c (all
+            linear)
+        stacked, out, workspace: optional
+            See :meth:`Jacobian_re_im`
+
+        Returns
+        -------
+        J: :class:`numpy.ndarray`
+            The Jacobian with respect to log10(p0), log10(m1), ...,
+            log10(tau1), ..., log10(c1), ...
+        """
+        return self.Jacobian_re_im(
+            pars, stacked=stacked, out=out, log10=True, workspace=workspace)
+
+    def Jacobian_complex(self, pars, out=None, log10=False):
+        """Jacobian of the complex response with respect to the parameters,
+        computed once from the complex Cole-Cole kernel
+
+        See :func:`Jacobian_complex`
+
+        Parameters
+        ----------
+        pars: list or tuple or numpy.ndarray or dict
+            Cole-Cole model parameters: rho0 or sigmai, m, tau, c (all
+            linear)
+        out: :class:`numpy.ndarray`, optional
+            complex (N, 1 + 3P) array to write the Jacobian into
+        log10: bool or array-like of bools, optional
+            See :meth:`Jacobian_re_im`
+
+        Returns
+        -------
+        J: :class:`numpy.ndarray`
+            complex (N, 1 + 3P) array
+        """
+        return self._kernels.Jacobian_complex(
+            self.omega, pars, out=out, log10=log10, log_omega=self.log_omega,
+            intermediates=self._get_intermediates(pars))
+
+    def Jacobian_logmag_pha(self, pars, stacked=False, out=None,
+                            log10=False):
+        """Jacobian of the natural logarithm of the magnitude and of the phase
+        [mrad] with respect to the parameters, computed analytically in one
+        pass
+
+        See :func:`Jacobian_logmag_pha`
+
+        Parameters
+        ----------
+        pars: list or tuple or numpy.ndarray or dict
+            Cole-Cole model parameters: rho0 or sigmai, m, tau, c (all
+            linear)
+        stacked, out, log10: optional
+            See :meth:`Jacobian_re_im`
+
+        Returns
+        -------
+        J: :class:`numpy.ndarray`
+            The Jacobian, with the derivatives of the log-magnitudes in
+            place of those of the real parts, and the derivatives of the
+            phases in place of those of the imaginary parts
+        """
+        return self._kernels.Jacobian_logmag_pha(
+            self.omega, pars, stacked=stacked, out=out, log10=log10,
+            log_omega=self.log_omega,
+            intermediates=self._get_intermediates(pars))
+
+    def Jacobian_re_im_batch(self, parameters, stacked=False, out=None,
+                             log10=False):
+        """Jacobians of real and imaginary parts of S spectra, computed in one
+        vectorized pass
+
+        See :func:`Jacobian_re_im_batch`
+
+        >>> import sip_models.res.cc as cc
+        >>> import numpy as np
+        >>> f = np.logspace(-3, 3, 20)
+        >>> pars = [[100, 0.1, 0.04, 0.8], [1000, 0.1, 0.1, 0.2]]
+        >>> obj = cc.cc(f)
+        >>> J = obj.Jacobian_re_im_batch(pars)
+        >>> J.shape
+        (2, 20, 8)
+
+        Parameters
+        ----------
+        parameters: numpy.ndarray or dict
+            Cole-Cole model parameters of S spectra (all linear), either as
+            an (S, 1 + 3 * P) array, or as a dict with array-valued entries.
+        stacked: bool, optional
+            Layout of the Jacobian of each spectrum, see
+            :meth:`Jacobian_re_im`
+        out: :class:`numpy.ndarray`, optional
+            C-contiguous float array of the output shape. If provided, the
+            Jacobians are written into this array.
+        log10: bool or array-like of bools, optional
+            See :meth:`Jacobian_re_im`
+
+        Returns
+        -------
+        J: :class:`numpy.ndarray`
+            (S, N, 2 * (1 + 3P)) or, if stacked, (S, 2N, 1 + 3P) array
+        """
+        return self._kernels.Jacobian_re_im_batch(
+            self.omega, parameters, stacked=stacked, out=out, log10=log10,
+            log_omega=self.log_omega)
+
+    def incremental(self):
+        """Return an object for incremental evaluations of this model, which
+        recomputes only the terms whose parameters changed since its last
+        call
+
+        See :class:`sip_models.cc_incremental.cc_incremental`
+
+        Returns
+        -------
+        incremental: :class:`sip_models.cc_incremental.cc_incremental`
+            object with the methods response, response_complex, and
+            Jacobian_re_im
+        """
+        return cc_incremental.cc_incremental(
+            self, self._kernels, self._complex_key)
@@ -0,0 +1,197 @@
+# *-* coding: utf-8 *-*
+r""" Incremental evaluation of multi-term Cole-Cole models (both resistivity
+and conductivity)
+
+Line searches and coordinate updates of multi-term fits often change only
+the m, tau, and c values of one term. Both formulations can be written as
+
+.. math::
+
+    Z(\omega) = Z_0 \left(1 - \sum_k m_k T_k(\omega)\right)
+
+with per-term functions :math:`T_k` that only depend on :math:`\tau_k` and
+:math:`c_k`. The derivatives with respect to :math:`m_k, \tau_k, c_k` only
+depend on the parameters of term k and are proportional to :math:`Z_0`. An
+:class:`cc_incremental` object therefore keeps the functions :math:`T_k` and
+the Jacobian columns of each term for :math:`Z_0 = 1`, and recomputes them
+only for the terms whose parameters changed since the last evaluation.
+
+Example:
+
+    import sip_models.res.cc as cc
+    obj = cc.cc(frequencies)
+    inc = obj.incremental()
+    inc.Jacobian_re_im([100, 0.1, 0.2, 0.04, 0.001, 0.4, 0.8])
+    # only the second term is recomputed
+    inc.Jacobian_re_im([100, 0.1, 0.25, 0.04, 0.002, 0.4, 0.8])
+"""
+import numpy as np
+
+import sip_models.kernel_helpers as kernel_helpers
+import sip_models.sip_response as sip_response
+
+
+class cc_incremental(object):
+    """Evaluate responses and Jacobians of a Cole-Cole model, recomputing
+    only the terms whose parameters changed since the last call
+
+    The object holds the state of the last evaluation and must not be shared
+    between threads. Create one object per thread with
+    :meth:`sip_models.res.cc.cc.incremental` or
+    :meth:`sip_models.cond.cc.cc.incremental`.
+    """
+    def __init__(self, model, kernels, complex_key):
+        """
+        Parameters
+        ----------
+        model: :class:`sip_models.res.cc.cc` or :class:`sip_models.cond.cc.cc`
+            model object which provides the frequencies
+        kernels: module
+            :mod:`sip_models.res.cc_kernels` or
+            :mod:`sip_models.cond.cc_kernels`
+        complex_key: str
+            'rcomplex' or 'ccomplex', the representation used to initialize
+            the returned :class:`sip_models.sip_response.sip_response`
+            objects
+        """
+        self.model = model
+        self._kernels = kernels
+        self._complex_key = complex_key
+        # total number of term evaluations
+        self.term_updates = 0
+        self.reset()
+
+    def reset(self):
+        """Forget the stored terms, so that the next call recomputes all
+        terms"""
+        self._m = None
+        self._tau = None
+        self._c = None
+        # (N x P): per-term functions T_k
+        self._terms = None
+        # (2N x 3P): stacked Jacobian columns of m, tau, c for Z0 = 1
+        self._J_terms = None
+        # terms whose Jacobian columns are outdated
+        self._J_outdated = None
+
+    def _term_parameters(self, terms):
+        """Return the parameters of the selected terms for Z0 = 1"""
+        return np.hstack(
+            ([1.0], self._m[terms], self._tau[terms], self._c[terms]))
+
+    def _update(self, pars):
+        """Recompute the functions T_k of all terms whose parameters differ
+        from the last call. Their Jacobian columns are marked as outdated.
+
+        Returns
+        -------
+        p0: float
+            rho0 or sigmai
+        m, tau, c: :class:`numpy.ndarray`
+            parameters of the P terms
+        """
+        p0, m, tau, c = self._kernels.sort_parameters(pars)
+        m, tau, c = [np.array(x, dtype=float) for x in (m, tau, c)]
+        nr_terms = m.size
+        nr_f = self.model.omega.size
+
+        if self._m is None or self._m.size != nr_terms:
+            self._terms = np.empty((nr_f, nr_terms), dtype=complex)
+            self._J_terms = np.empty((2 * nr_f, 3 * nr_terms))
+            self._J_outdated = np.ones(nr_terms, dtype=bool)
+            changed = np.ones(nr_terms, dtype=bool)
+        else:
+            changed = (m != self._m) | (tau != self._tau) | (c != self._c)
+        self._m, self._tau, self._c = m, tau, c
+
+        if np.any(changed):
+            self._terms[:, changed] = self._kernels.terms(
+                self.model.omega, tau[changed], c[changed],
+                self.model.log_omega)
+            self._J_outdated |= changed
+            self.term_updates += np.count_nonzero(changed)
+        return p0, m, tau, c
+
+    def _update_jacobian(self):
+        """Recompute the outdated Jacobian columns of the terms"""
+        if not np.any(self._J_outdated):
+            return
+        nr_terms = self._m.size
+        outdated = np.flatnonzero(self._J_outdated)
+        J_terms = self._kernels.Jacobian_re_im(
+            self.model.omega, self._term_parameters(outdated), stacked=True,
+            log_omega=self.model.log_omega)
+        # scatter the m, tau, c columns of the outdated terms
+        for block in range(3):
+            self._J_terms[:, block * nr_terms + outdated] = J_terms[
+                :, 1 + block * outdated.size:1 + (block + 1) * outdated.size]
+        self._J_outdated[:] = False
+
+    def response_complex(self, pars):
+        """Complex response of the model
+
+        Parameters
+        ----------
+        pars: list or tuple or numpy.ndarray or dict
+            Cole-Cole model parameters (all linear), see the
+            sort_parameters function of the kernels module
+
+        Returns
+        -------
+        response: :class:`numpy.ndarray`
+            complex response (size N)
+        """
+        p0, m, _, _ = self._update(pars)
+        return p0 * (1 - np.dot(self._terms, m))
+
+    def response(self, pars):
+        """Complex response of the model, wrapped in a
+        :class:`sip_models.sip_response.sip_response` object
+
+        Parameters
+        ----------
+        pars: list or tuple or numpy.ndarray or dict
+            Cole-Cole model parameters (all linear)
+        """
+        return sip_response.sip_response(
+            self.model.f, **{self._complex_key: self.response_complex(pars)}
+        )
+
+    def Jacobian_re_im(self, pars, stacked=False, out=None, log10=False):
+        """Jacobian of the real and imaginary parts with respect to the
+        parameters, recomputing only the columns of changed terms
+
+        Parameters
+        ----------
+        pars: list or tuple or numpy.ndarray or dict
+            Cole-Cole model parameters (all linear)
+        stacked, out, log10: optional
+            See the Jacobian_re_im function of the kernels module
+
+        Returns
+        -------
+        J: :class:`numpy.ndarray`
+            The Jacobian, ordered p0, m1, m2, ..., tau1, tau2, ..., c1, c2,
+            ...
+        """
+        p0, m, tau, c = self._update(pars)
+        self._update_jacobian()
+        nr_f = self.model.omega.size
+        J, J_re, J_im = kernel_helpers.jacobian_output(
+            (), nr_f, m.size, stacked, out)
+
+        # dZ/dp0 = 1 - sum m_k T_k
+        specs = np.dot(self._terms, m)
+        J_re[:, 0] = 1 - specs.real
+        J_im[:, 0] = -specs.imag
+        np.multiply(self._J_terms[0:nr_f], p0, out=J_re[:, 1:])
+        np.multiply(self._J_terms[nr_f:], p0, out=J_im[:, 1:])
+
+        log10 = np.broadcast_to(
+            np.asarray(log10, dtype=bool), (J_re.shape[1], ))
+        if np.any(log10):
+            linear = np.hstack(([p0], m, tau, c))
+            scaling = np.where(log10, np.log(10) * linear, 1.0)
+            J_re *= scaling
+            J_im *= scaling
+        return J
@@ -7,49 +7,27 @@ in spectral induced polarization. Geophys J Int, 195(1):352-356.
 doi: 10.1093/gji/ggt251
 """
 import numpy as np
-import sip_models.sip_response as sip_response
+import sip_models.cc_common as cc_common
+import sip_models.instrumentation as instrumentation
+import sip_models.cond.cc_kernels as cc_kernels
 
 
-def _make_list(number_or_list):
-    # return the object enclosed in a list if its not a tuple or list
-    if isinstance(number_or_list, (tuple, list)):
-        return number_or_list
-    else:
-        return [number_or_list, ]
+class cc_base(cc_common.cc_base):
+    """ Base class for Cole-Cole objects (conductivity formulation)
 
-
-class cc_base(object):
-    """
-    Base class for Cole-Cole objects (conductivity)
+    The computations are delegated to the stateless functions in
+    :mod:`sip_models.cond.cc_kernels`, so one object can be used concurrently
+    from multiple threads.
     """
-    def __init__(self, frequencies):
-        self.f = frequencies
-
-    def _sort_parameters(self, parameters):
-        # type 1
-        if isinstance(parameters, (list, tuple, np.ndarray)):
-            pars = np.atleast_1d(parameters)
-            nr_pars = int((pars.shape[0] - 1) / 3)
-
-            sigmai = pars[0]
-            m = pars[1:nr_pars + 1]
-            tau = pars[nr_pars + 1: 2 * nr_pars + 1]
-            c = pars[2 * nr_pars + 1:]
-
-        elif isinstance(parameters, dict):
-            sigmai = parameters['sigmai']
-            m = _make_list(parameters['m'])
-            tau = _make_list(parameters['tau'])
-            c = _make_list(parameters['c'])
-        else:
-            print(parameters)
-            raise Exception('Input format not recognized')
-
-        return sigmai, m, tau, c
+    _kernels = cc_kernels
+    _complex_key = 'ccomplex'
 
     def _set_parameters(self, parameters):
-        """Sort out the various possible parameter inputs and return a config
-        object (dict)
+        """Sort out the various possible parameter inputs and store the
+        parameters and common terms in the object
+
+        Note that the methods of :class:`cc` do not use this function, but
+        the stateless functions in :mod:`sip_models.cond.cc_kernels`.
 
         We have multiple input formats:
 
@@ -65,19 +43,18 @@ class cc_base(object):
         entries correspond to mulitple polarisazion terms
 
         """
-        nr_f = self.f.size
+        nr_f = self.omega.size
 
         # sort out parameters
         sigmai, m, tau, c = self._sort_parameters(parameters)
 
         newsize = (nr_f, len(m))
-        # sigmai_resized = np.resize(sigmai, newsize)
-        m_resized = np.resize(m, newsize)
-        tau_resized = np.resize(tau, newsize)
-        c_resized = np.resize(c, newsize)
+        # read-only views instead of tiled copies
+        m_resized = np.broadcast_to(m, newsize)
+        tau_resized = np.broadcast_to(tau, newsize)
+        c_resized = np.broadcast_to(c, newsize)
 
-        omega = np.atleast_2d(2 * np.pi * self.f).T
-        self.w = np.resize(omega, (len(m), nr_f)).T
+        self.w = np.broadcast_to(self._w, newsize)
         self.sigmai = sigmai
         self.m = m_resized
         self.tau = tau_resized
@@ -96,219 +73,133 @@ class cc_base(object):
 
 class cc(cc_base):
 
-    def response(self, parameters):
-        r"""Return the forward response in base dimensions
-        :math:`\hat{\sigma }(\omega ) = \sigma _\infty \left(1 - \sum_i \frac
-        {m_i}{1 + (j \omega \tau_i)^c_i}\right)`
-
-        Parameters
-        ----------
-        pars:
-
-        Returns
-        -------
-        response: Nx2 array, first axis denotes frequencies, seconds real and
-                  imaginary parts
+    def dre_dsigmai(self, pars, out=None, workspace=None):
+        r"""
+        :math:`\frac{\partial \hat{\sigma}'(\omega)}{\partial \sigma_\infty}
+        = 1 - \sum_i m_i \frac{1 + (\omega \tau)^c cos(\frac{c \pi}{2})}{1 + 2
+        (\omega \tau)^c cos(\frac{c \pi}{2}) + (\omega \tau)^{2 c}}`
         """
-        # get a config object
-        self._set_parameters(parameters)
-        terms = self.m / (1 + (1j * self.w * self.tau) ** self.c)
-        # sum up terms
-        specs = np.sum(terms, axis=1)
-        ccomplex = self.sigmai * (1 - specs)
+        return cc_kernels.dre_dsigmai(
+            self.omega, pars, self.log_omega, self._get_intermediates(pars),
+            out, workspace)
 
-        response = sip_response.sip_response(self.f, ccomplex=ccomplex)
+    def dre_dlog10sigmai(self, pars, out=None, workspace=None):
+        """See :func:`sip_models.cond.cc_kernels.dre_dlog10sigmai`"""
+        return cc_kernels.dre_dlog10sigmai(
+            self.omega, pars, self.log_omega, self._get_intermediates(pars),
+            out, workspace)
 
-        return response
-
-    def dre_dsigmai(self, pars):
+    def dre_dm(self, pars, out=None, workspace=None):
         r"""
-        :math:Add formula
+        :math:`\frac{\partial \hat{\sigma}'(\omega)}{\partial m} = -
+        \sigma_\infty \frac{1 + (\omega \tau)^c cos(\frac{c \pi}{2})}{1 + 2
+        (\omega \tau)^c cos(\frac{c \pi}{2}) + (\omega \tau)^{2 c}}`
         """
-        self._set_parameters(pars)
-        terms = self.m * self.num / self.denom
-        specs = np.sum(terms, axis=1)
-        result = 1 - specs
-
-        return result
+        return cc_kernels.dre_dm(
+            self.omega, pars, self.log_omega, self._get_intermediates(pars),
+            out, workspace)
 
-    def dre_dlog10sigmai(self, pars):
-        # first call the linear response to set the parameters
-        linear_response = self.dre_dsigmai(pars)
-        result = np.log(10) * self.sigmai * linear_response
-        return result
+    def dre_dlog10m(self, pars, out=None, workspace=None):
+        """See :func:`sip_models.cond.cc_kernels.dre_dlog10m`"""
+        return cc_kernels.dre_dlog10m(
+            self.omega, pars, self.log_omega, self._get_intermediates(pars),
+            out, workspace)
 
-    def dre_dm(self, pars):
+    def dre_dtau(self, pars, out=None, workspace=None):
         r"""
-        :math:Add formula
+        :math:`\frac{\partial \hat{\sigma}'(\omega)}{\partial \tau} =
+        \sigma_\infty m \frac{c}{\tau} (\omega \tau)^c \frac{cos(\frac{c
+        \pi}{2}) (1 + (\omega \tau)^{2 c}) + 2 (\omega \tau)^c}{\left[1 + 2
+        (\omega \tau)^c cos(\frac{c \pi}{2}) + (\omega \tau)^{2 c}\right]^2}`
         """
-        self._set_parameters(pars)
-        terms = self.num / self.denom
-        result = - self.sigmai * terms
-
-        return result
+        return cc_kernels.dre_dtau(
+            self.omega, pars, self.log_omega, self._get_intermediates(pars),
+            out, workspace)
 
-    def dre_dlog10m(self, pars):
-        # first call the linear response to set the parameters
-        lin_response = self.dre_dm(pars)
-        result = np.log(10) * self.m * lin_response
-        return result
+    def dre_dlog10tau(self, pars, out=None, workspace=None):
+        """See :func:`sip_models.cond.cc_kernels.dre_dlog10tau`"""
+        return cc_kernels.dre_dlog10tau(
+            self.omega, pars, self.log_omega, self._get_intermediates(pars),
+            out, workspace)
 
-    def dre_dtau(self, pars):
+    def dre_dc(self, pars, out=None, workspace=None):
         r"""
-        :math:Add formula
+        :math:`\frac{\partial \hat{\sigma}'(\omega)}{\partial c} =
+        \sigma_\infty m (\omega \tau)^c \frac{ln(\omega \tau) \left[
+        cos(\frac{c \pi}{2}) (1 + (\omega \tau)^{2 c}) + 2 (\omega \tau)^c
+        \right] - \frac{\pi}{2} sin(\frac{c \pi}{2}) (1 - (\omega \tau)^{2
+        c})}{\left[1 + 2 (\omega \tau)^c cos(\frac{c \pi}{2}) + (\omega
+        \tau)^{2 c}\right]^2}`
         """
-        self._set_parameters(pars)
-        # term 1
-        num1 = self.c * self.w * self.otc1 * np.cos(self.ang)
-        term1 = num1/self.denom
-
-        # term 2
-        num2a = self.otc * np.cos(self.ang)
-        num2b = 1 + num2a
-        denom2 = self.denom ** 2
-        term2 = num2b / denom2
-
-        # term 3
-        term3 = 2 * self.c * self.w * self.otc1 * np.cos(self.ang) + self.otc2
-
-        result = self.sigmai * self.m * (term1 + term2 * term3)
+        return cc_kernels.dre_dc(
+            self.omega, pars, self.log_omega, self._get_intermediates(pars),
+            out, workspace)
 
-        return result
-
-    def dre_dlog10tau(self, pars):
-        # first call the linear response to set the parameters
-        lin_response = self.dre_dtau(pars)
-        result = np.log(10) * self.tau * lin_response
-        return result
-
-    def dre_dc(self, pars):
+    def dim_dsigmai(self, pars, out=None, workspace=None):
         r"""
-        :math:Add formula
+        :math:`\frac{\partial \hat{\sigma}''(\omega)}{\partial \sigma_\infty}
+        = \sum_i m_i \frac{(\omega \tau)^c sin(\frac{c \pi}{2})}{1 + 2 (\omega
+        \tau)^c cos(\frac{c \pi}{2}) + (\omega \tau)^{2 c}}`
         """
-        self._set_parameters(pars)
-        # term 1
-        num1a = np.log(self.w * self.tau) * self.otc * np.sin(self.ang)
-        num1b = self.otc * np.cos(self.ang) * np.pi / 2.0
-        term1 = (num1a + num1b) / self.denom
-
-        # term 2
-        num2 = self.otc * np.sin(self.c / np.pi) * 2
-        denom2 = self.denom ** 2
-        term2 = num2 / denom2
+        return cc_kernels.dim_dsigmai(
+            self.omega, pars, self.log_omega, self._get_intermediates(pars),
+            out, workspace)
 
-        # term 3
-        num3a = 2 * np.log(self.w * self.tau) * self.otc * np.cos(self.ang)
-        num3b = 2 * ((self.w * self.tau) ** 2) * np.pi / 2.0 * np.sin(self.ang)
-        num3c = 2 * np.log(self.w * self.tau) * self.otc2
-        term3 = num3a - num3b + num3c
+    def dim_dlog10sigmai(self, pars, out=None, workspace=None):
+        """See :func:`sip_models.cond.cc_kernels.dim_dlog10sigmai`"""
+        return cc_kernels.dim_dlog10sigmai(
+            self.omega, pars, self.log_omega, self._get_intermediates(pars),
+            out, workspace)
 
-        result = self.sigmai * self.m * (term1 + term2 * term3)
-
-        return result
-
-    def dim_dsigmai(self, pars):
+    def dim_dm(self, pars, out=None, workspace=None):
         r"""
-        :math:Add formula
+        :math:`\frac{\partial \hat{\sigma}''(\omega)}{\partial m} =
+        \sigma_\infty \frac{(\omega \tau)^c sin(\frac{c \pi}{2})}{1 + 2
+        (\omega \tau)^c cos(\frac{c \pi}{2}) + (\omega \tau)^{2 c}}`
         """
-        self._set_parameters(pars)
-        result = np.sum(- self.m * self.otc * np.sin(self.ang) / self.denom,
-                        axis=1)
-
-        return result
+        return cc_kernels.dim_dm(
+            self.omega, pars, self.log_omega, self._get_intermediates(pars),
+            out, workspace)
 
-    def dim_dlog10sigmai(self, pars):
-        # first call the linear response to set the parameters
-        lin_response = self.dim_dsigmai(pars)
-        result = np.log(10) * self.sigmai * lin_response
-        return result
+    def dim_dlog10m(self, pars, out=None, workspace=None):
+        """See :func:`sip_models.cond.cc_kernels.dim_dlog10m`"""
+        return cc_kernels.dim_dlog10m(
+            self.omega, pars, self.log_omega, self._get_intermediates(pars),
+            out, workspace)
 
-    def dim_dm(self, pars):
+    def dim_dtau(self, pars, out=None, workspace=None):
         r"""
-        :math:Add formula
+        :math:`\frac{\partial \hat{\sigma}''(\omega)}{\partial \tau} =
+        \sigma_\infty m \frac{c}{\tau} (\omega \tau)^c \frac{sin(\frac{c
+        \pi}{2}) (1 - (\omega \tau)^{2 c})}{\left[1 + 2 (\omega \tau)^c
+        cos(\frac{c \pi}{2}) + (\omega \tau)^{2 c}\right]^2}`
         """
-        self._set_parameters(pars)
-        num1 = self.otc * np.sin(self.ang)
-        result = -self.sigmai * num1 / self.denom
+        return cc_kernels.dim_dtau(
+            self.omega, pars, self.log_omega, self._get_intermediates(pars),
+            out, workspace)
 
-        return result
+    def dim_dlog10tau(self, pars, out=None, workspace=None):
+        """See :func:`sip_models.cond.cc_kernels.dim_dlog10tau`"""
+        return cc_kernels.dim_dlog10tau(
+            self.omega, pars, self.log_omega, self._get_intermediates(pars),
+            out, workspace)
 
-    def dim_dlog10m(self, pars):
-        # first call the linear response to set the parameters
-        lin_response = self.dim_dm(pars)
-        result = np.log(10) * self.m * lin_response
-        return result
-
-    def dim_dtau(self, pars):
-        r"""
-        :math:Add formula
-        """
-        self._set_parameters(pars)
-        # term 1
-        num1 = -self.m * (self.w ** self.c) * self.c\
-            * (self.tau ** (self.c - 1)) * np.sin(self.ang)
-        term1 = self.sigmai * num1 / self.denom
-
-        # term 2
-        num2a = -self.m * self.otc * np.sin(self.ang)
-        num2b = 2 * (self.w ** 2.0) * self.c * (self.tau ** (self.c - 1)) *\
-            np.cos(self.ang)
-        num2c = 2 * self.c * (self.w ** (self.c * 2)) *\
-            (self.tau ** (2 * self.c - 1))
-        term2 = self.sigma0 * num2a * (num2b + num2c) / (self.denom ** 2)
-
-        result = term1 + term2
-
-        return result
-
-    def dim_dlog10tau(self, pars):
-        # first call the linear response to set the parameters
-        lin_resp = self.dim_dtau(pars)
-        result = np.log(10) * self.tau * lin_resp
-        return result
-
-    def dim_dc(self, pars):
+    def dim_dc(self, pars, out=None, workspace=None):
         r"""
-        :math:Add formula
+        :math:`\frac{\partial \hat{\sigma}''(\omega)}{\partial c} =
+        \sigma_\infty m (\omega \tau)^c \frac{ln(\omega \tau) sin(\frac{c
+        \pi}{2}) (1 - (\omega \tau)^{2 c}) + \frac{\pi}{2} \left[
+        cos(\frac{c \pi}{2}) (1 + (\omega \tau)^{2 c}) + 2 (\omega \tau)^c
+        \right]}{\left[1 + 2 (\omega \tau)^c cos(\frac{c \pi}{2}) + (\omega
+        \tau)^{2 c}\right]^2}`
         """
-        self._set_parameters(pars)
-        # term 1
-        num1a = self.m * np.sin(self.ang) * np.log(self.w * self.tau)\
-            * self.otc
-        num1b = self.m * self.otc * np.pi / 2 * np.cos(np.pi / 2)
-        term1 = self.sigma0 * (-num1a - num1b) / self.denom
-
-        # term 2
-        num2a = -self.m * self.otc * np.cos(self.ang)
-        num2b = -2 * np.log(self.w * self.tau) * self.otc * np.cos(self.ang)
-        num2c = 2 * self.otc * np.pi / 2 * np.cos(self.ang)
-        num2d = 2 * np.log(self.w * self.tau) * self.otc2
-        numerator = num2a * (num2b + num2c) + num2d
-        term2 = self.sigma0 * numerator / (self.denom ** 2)
-
-        result = term1 + term2
-
-        return result
-
-    def test_derivatives(self):
-        parameters = {
-            'sigmai': 0.01,
-            'm': 0.1,
-            'tau': 0.04,
-            'c': 0.8
-        }
-        # parameters = {
-        #     'sigmai': 0.01,
-        #     'm': (0.15, 0.2),
-        #     'tau': (0.4, 0.004),
-        #     'c': (0.5, 0.8),
-        # }
-        print(self.dre_dsigmai(parameters))
-        print(self.dre_dm(parameters))
-        print(self.dre_dtau(parameters))
-        print(self.dre_dc(parameters))
-
-        print(self.dim_dsigmai(parameters))
-        print(self.dim_dm(parameters))
-        print(self.dim_dtau(parameters))
-        print(self.dim_dc(parameters))
+        return cc_kernels.dim_dc(
+            self.omega, pars, self.log_omega, self._get_intermediates(pars),
+            out, workspace)
+
+
+instrumentation.register(
+    cc_base, ['_get_intermediates', '_set_parameters'], 'cond.cc')
+instrumentation.register(
+    cc, instrumentation.public_functions(cc) +
+    instrumentation.public_functions(cc_common.cc_base), 'cond.cc')
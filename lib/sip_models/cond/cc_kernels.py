@@ -0,0 +1,404 @@
+# *-* coding: utf-8 *-*
+r""" Stateless kernel functions of the Cole-Cole model after Tarasov and
+Titov, 2013
+
+:math:`\hat{\sigma }(\omega ) = \sigma _\infty \left(1 - \sum_i \frac
+{m_i}{1 + (j \omega \tau_i)^c_i}\right)`
+
+All functions compute the response or its partial derivatives from the
+angular frequencies :math:`\omega = 2 \pi f` and the parameters only, and do
+not store any state. They can therefore be called concurrently, e.g., from a
+thread pool. The methods of :class:`sip_models.cond.cc.cc` delegate to these
+functions.
+
+Parameters can be provided in the formats described in
+:func:`sort_parameters`.
+
+This module defines the per-term function of the formulation, its sign, and
+the dre_*/dim_* derivatives. The parameter sorting, the responses, and the
+Jacobians are shared with the resistivity formulation and implemented in
+:mod:`sip_models.cc_common`.
+
+The response, the dre_*/dim_* functions, and :func:`Jacobian_re_im` accept
+an output array (out=) and a :class:`sip_models.workspace.workspace` for
+their intermediate terms. Reusing both avoids all allocations of
+frequency-sized arrays in repeated evaluations.
+"""
+import sys
+
+import numpy as np
+
+import sip_models.cc_common as cc_common
+import sip_models.instrumentation as instrumentation
+import sip_models.kernel_helpers as kernel_helpers
+import sip_models.workspace as sip_workspace
+
+_formulation = sys.modules[__name__]
+
+# name of the first parameter
+P0_NAME = 'sigmai'
+# the per-term function T = K is the Cole-Cole kernel itself
+SIGN = -1
+
+
+def _complex_term(jotc):
+    r"""Transform :math:`(j \omega \tau)^c`, in place, into
+    :math:`\frac{1}{1 + (j \omega \tau)^c}`"""
+    jotc += 1
+    np.reciprocal(jotc, out=jotc)
+    return jotc
+
+
+def _re_term(otc, cos_ang, denom, out):
+    r"""Write :math:`\frac{1 + (\omega \tau)^c cos(\frac{c \pi}{2})}{D}`
+    into out"""
+    np.multiply(otc, cos_ang, out=out)
+    out += 1
+    out /= denom
+    return out
+
+
+def _im_term(otc, sin_ang, denom, out):
+    r"""Write :math:`- \frac{(\omega \tau)^c sin(\frac{c \pi}{2})}{D}`
+    into out"""
+    kernel_helpers.im_term(otc, sin_ang, denom, out)
+    np.negative(out, out=out)
+    return out
+
+
+def sort_parameters(parameters):
+    """Sort out the various possible parameter inputs, see
+    :func:`sip_models.cc_common.sort_parameters`
+
+    Returns
+    -------
+    sigmai: float
+    m, tau, c: :class:`numpy.ndarray`
+        parameters of the P terms
+    """
+    return cc_common.sort_parameters(_formulation, parameters)
+
+
+def sort_parameters_batch(parameters):
+    """Sort a batch of S parameter sets into arrays, see
+    :func:`sip_models.cc_common.sort_parameters_batch`
+
+    Returns
+    -------
+    sigmai: :class:`numpy.ndarray`
+        size S
+    m, tau, c: :class:`numpy.ndarray`
+        shape (S, P)
+    """
+    return cc_common.sort_parameters_batch(_formulation, parameters)
+
+
+def _intermediates(omega, m, tau, c, log_omega=None, cached=None,
+                   workspace=None):
+    """See :func:`sip_models.cc_common.intermediates`"""
+    return cc_common.intermediates(
+        omega, m, tau, c, log_omega, cached, workspace)
+
+
+def response(omega, pars, log_omega=None, intermediates=None, out=None,
+             workspace=None):
+    """Complex conductivities of the Cole-Cole model (size N), see
+    :func:`sip_models.cc_common.response`
+    """
+    return cc_common.response(
+        _formulation, omega, pars, log_omega, intermediates, out, workspace)
+
+
+def terms(omega, tau, c, log_omega=None, out=None, workspace=None):
+    r"""Complex (N x P) per-term functions :math:`K_k`, see
+    :func:`sip_models.cc_common.terms`
+    """
+    return cc_common.terms(
+        _formulation, omega, tau, c, log_omega, out, workspace)
+
+
+def response_batch(omega, parameters, log_omega=None):
+    """Complex conductivities of S spectra (S x N), see
+    :func:`sip_models.cc_common.response_batch`
+    """
+    return cc_common.response_batch(
+        _formulation, omega, parameters, log_omega)
+
+
+def _fill_jacobian(J_re, J_im, omega, sigmai, m, tau, c, log_omega=None,
+                   log10=False, intermediates=None, workspace=None):
+    """See :func:`sip_models.cc_common.fill_jacobian`"""
+    cc_common.fill_jacobian(
+        _formulation, J_re, J_im, omega, sigmai, m, tau, c, log_omega, log10,
+        intermediates, workspace)
+
+
+def Jacobian_re_im(omega, pars, stacked=False, out=None, log10=False,
+                   log_omega=None, intermediates=None, workspace=None):
+    """Jacobian of real and imaginary parts with respect to the linear
+    parameters, see :func:`sip_models.cc_common.Jacobian_re_im`
+    """
+    return cc_common.Jacobian_re_im(
+        _formulation, omega, pars, stacked, out, log10, log_omega,
+        intermediates, workspace)
+
+
+def Jacobian_log10_re_im(omega, pars, stacked=False, out=None,
+                         log_omega=None, intermediates=None, workspace=None):
+    """Jacobian of real and imaginary parts with respect to the log10 of all
+    parameters, see :func:`sip_models.cc_common.Jacobian_log10_re_im`
+    """
+    return cc_common.Jacobian_log10_re_im(
+        _formulation, omega, pars, stacked, out, log_omega, intermediates,
+        workspace)
+
+
+def Jacobian_complex(omega, pars, out=None, log10=False, log_omega=None,
+                     intermediates=None):
+    """Jacobian of the complex response with respect to the parameters, see
+    :func:`sip_models.cc_common.Jacobian_complex`
+    """
+    return cc_common.Jacobian_complex(
+        _formulation, omega, pars, out, log10, log_omega, intermediates)
+
+
+def Jacobian_logmag_pha(omega, pars, stacked=False, out=None, log10=False,
+                        log_omega=None, intermediates=None):
+    """Jacobian of the natural logarithm of the magnitude and of the phase
+    [mrad], see :func:`sip_models.cc_common.Jacobian_logmag_pha`
+    """
+    return cc_common.Jacobian_logmag_pha(
+        _formulation, omega, pars, stacked, out, log10, log_omega,
+        intermediates)
+
+
+def Jacobian_re_im_batch(omega, parameters, stacked=False, out=None,
+                         log10=False, log_omega=None):
+    """Jacobians of real and imaginary parts of S spectra, see
+    :func:`sip_models.cc_common.Jacobian_re_im_batch`
+    """
+    return cc_common.Jacobian_re_im_batch(
+        _formulation, omega, parameters, stacked, out, log10, log_omega)
+
+
+def dre_dsigmai(omega, pars, log_omega=None, intermediates=None, out=None,
+                workspace=None):
+    r"""
+    :math:`\frac{\partial \hat{\sigma}'(\omega)}{\partial \sigma_\infty}
+    = 1 - \sum_i m_i \frac{1 + (\omega \tau)^c cos(\frac{c \pi}{2})}{1 + 2
+    (\omega \tau)^c cos(\frac{c \pi}{2}) + (\omega \tau)^{2 c}}`
+    """
+    sigmai, m, tau, c = sort_parameters(pars)
+    w, log_wtau, otc, otc2, ang, denom = _intermediates(
+        omega, m, tau, c, log_omega, intermediates, workspace)
+    term = _re_term(otc, np.cos(ang), denom, sip_workspace.buffer(
+        workspace, 'term', otc.shape))
+    term *= m
+    result = sip_workspace.output(out, otc.shape[:-1])
+    np.sum(term, axis=-1, out=result)
+    np.subtract(1, result, out=result)
+    return result
+
+
+def dre_dlog10sigmai(omega, pars, log_omega=None, intermediates=None, out=None,
+                     workspace=None):
+    sigmai, m, tau, c = sort_parameters(pars)
+    result = dre_dsigmai(
+        omega, pars, log_omega, intermediates, out, workspace)
+    result *= np.log(10) * sigmai
+    return result
+
+
+def dre_dm(omega, pars, log_omega=None, intermediates=None, out=None,
+           workspace=None):
+    r"""
+    :math:`\frac{\partial \hat{\sigma}'(\omega)}{\partial m} = -
+    \sigma_\infty \frac{1 + (\omega \tau)^c cos(\frac{c \pi}{2})}{1 + 2
+    (\omega \tau)^c cos(\frac{c \pi}{2}) + (\omega \tau)^{2 c}}`
+    """
+    sigmai, m, tau, c = sort_parameters(pars)
+    w, log_wtau, otc, otc2, ang, denom = _intermediates(
+        omega, m, tau, c, log_omega, intermediates, workspace)
+    result = _re_term(
+        otc, np.cos(ang), denom, sip_workspace.output(out, otc.shape))
+    result *= -sigmai
+    return result
+
+
+def dre_dlog10m(omega, pars, log_omega=None, intermediates=None, out=None,
+                workspace=None):
+    sigmai, m, tau, c = sort_parameters(pars)
+    result = dre_dm(
+        omega, pars, log_omega, intermediates, out, workspace)
+    result *= np.log(10) * m
+    return result
+
+
+def dre_dtau(omega, pars, log_omega=None, intermediates=None, out=None,
+             workspace=None):
+    r"""
+    :math:`\frac{\partial \hat{\sigma}'(\omega)}{\partial \tau} =
+    \sigma_\infty m \frac{c}{\tau} (\omega \tau)^c \frac{cos(\frac{c
+    \pi}{2}) (1 + (\omega \tau)^{2 c}) + 2 (\omega \tau)^c}{\left[1 + 2
+    (\omega \tau)^c cos(\frac{c \pi}{2}) + (\omega \tau)^{2 c}\right]^2}`
+    """
+    sigmai, m, tau, c = sort_parameters(pars)
+    w, log_wtau, otc, otc2, ang, denom = _intermediates(
+        omega, m, tau, c, log_omega, intermediates, workspace)
+    # sigmai m c / tau P
+    result = kernel_helpers.P_term(
+        otc, otc2, np.cos(ang), denom,
+        sip_workspace.output(out, otc.shape))
+    result *= sigmai * m * c / tau
+    return result
+
+
+def dre_dlog10tau(omega, pars, log_omega=None, intermediates=None, out=None,
+                  workspace=None):
+    sigmai, m, tau, c = sort_parameters(pars)
+    result = dre_dtau(
+        omega, pars, log_omega, intermediates, out, workspace)
+    result *= np.log(10) * tau
+    return result
+
+
+def dre_dc(omega, pars, log_omega=None, intermediates=None, out=None,
+           workspace=None):
+    r"""
+    :math:`\frac{\partial \hat{\sigma}'(\omega)}{\partial c} =
+    \sigma_\infty m (\omega \tau)^c \frac{ln(\omega \tau) \left[
+    cos(\frac{c \pi}{2}) (1 + (\omega \tau)^{2 c}) + 2 (\omega \tau)^c
+    \right] - \frac{\pi}{2} sin(\frac{c \pi}{2}) (1 - (\omega \tau)^{2
+    c})}{\left[1 + 2 (\omega \tau)^c cos(\frac{c \pi}{2}) + (\omega
+    \tau)^{2 c}\right]^2}`
+    """
+    sigmai, m, tau, c = sort_parameters(pars)
+    w, log_wtau, otc, otc2, ang, denom = _intermediates(
+        omega, m, tau, c, log_omega, intermediates, workspace)
+    # sigmai m (ln(omega tau) P - pi / 2 Q)
+    result = kernel_helpers.P_term(
+        otc, otc2, np.cos(ang), denom,
+        sip_workspace.output(out, otc.shape))
+    result *= log_wtau
+    Q = kernel_helpers.Q_term(
+        otc, otc2, np.sin(ang), denom,
+        sip_workspace.buffer(workspace, 'term', otc.shape))
+    Q *= np.pi / 2.0
+    result -= Q
+    result *= sigmai * m
+    return result
+
+
+def dim_dsigmai(omega, pars, log_omega=None, intermediates=None, out=None,
+                workspace=None):
+    r"""
+    :math:`\frac{\partial \hat{\sigma}''(\omega)}{\partial \sigma_\infty}
+    = \sum_i m_i \frac{(\omega \tau)^c sin(\frac{c \pi}{2})}{1 + 2 (\omega
+    \tau)^c cos(\frac{c \pi}{2}) + (\omega \tau)^{2 c}}`
+    """
+    sigmai, m, tau, c = sort_parameters(pars)
+    w, log_wtau, otc, otc2, ang, denom = _intermediates(
+        omega, m, tau, c, log_omega, intermediates, workspace)
+    term = kernel_helpers.im_term(
+        otc, np.sin(ang), denom,
+        sip_workspace.buffer(workspace, 'term', otc.shape))
+    term *= m
+    result = sip_workspace.output(out, otc.shape[:-1])
+    np.sum(term, axis=-1, out=result)
+    return result
+
+
+def dim_dlog10sigmai(omega, pars, log_omega=None, intermediates=None, out=None,
+                     workspace=None):
+    sigmai, m, tau, c = sort_parameters(pars)
+    result = dim_dsigmai(
+        omega, pars, log_omega, intermediates, out, workspace)
+    result *= np.log(10) * sigmai
+    return result
+
+
+def dim_dm(omega, pars, log_omega=None, intermediates=None, out=None,
+           workspace=None):
+    r"""
+    :math:`\frac{\partial \hat{\sigma}''(\omega)}{\partial m} =
+    \sigma_\infty \frac{(\omega \tau)^c sin(\frac{c \pi}{2})}{1 + 2
+    (\omega \tau)^c cos(\frac{c \pi}{2}) + (\omega \tau)^{2 c}}`
+    """
+    sigmai, m, tau, c = sort_parameters(pars)
+    w, log_wtau, otc, otc2, ang, denom = _intermediates(
+        omega, m, tau, c, log_omega, intermediates, workspace)
+    result = kernel_helpers.im_term(
+        otc, np.sin(ang), denom, sip_workspace.output(out, otc.shape))
+    result *= sigmai
+    return result
+
+
+def dim_dlog10m(omega, pars, log_omega=None, intermediates=None, out=None,
+                workspace=None):
+    sigmai, m, tau, c = sort_parameters(pars)
+    result = dim_dm(
+        omega, pars, log_omega, intermediates, out, workspace)
+    result *= np.log(10) * m
+    return result
+
+
+def dim_dtau(omega, pars, log_omega=None, intermediates=None, out=None,
+             workspace=None):
+    r"""
+    :math:`\frac{\partial \hat{\sigma}''(\omega)}{\partial \tau} =
+    \sigma_\infty m \frac{c}{\tau} (\omega \tau)^c \frac{sin(\frac{c
+    \pi}{2}) (1 - (\omega \tau)^{2 c})}{\left[1 + 2 (\omega \tau)^c
+    cos(\frac{c \pi}{2}) + (\omega \tau)^{2 c}\right]^2}`
+    """
+    sigmai, m, tau, c = sort_parameters(pars)
+    w, log_wtau, otc, otc2, ang, denom = _intermediates(
+        omega, m, tau, c, log_omega, intermediates, workspace)
+    # sigmai m c / tau Q
+    result = kernel_helpers.Q_term(
+        otc, otc2, np.sin(ang), denom,
+        sip_workspace.output(out, otc.shape))
+    result *= sigmai * m * c / tau
+    return result
+
+
+def dim_dlog10tau(omega, pars, log_omega=None, intermediates=None, out=None,
+                  workspace=None):
+    sigmai, m, tau, c = sort_parameters(pars)
+    result = dim_dtau(
+        omega, pars, log_omega, intermediates, out, workspace)
+    result *= np.log(10) * tau
+    return result
+
+
+def dim_dc(omega, pars, log_omega=None, intermediates=None, out=None,
+           workspace=None):
+    r"""
+    :math:`\frac{\partial \hat{\sigma}''(\omega)}{\partial c} =
+    \sigma_\infty m (\omega \tau)^c \frac{ln(\omega \tau) sin(\frac{c
+    \pi}{2}) (1 - (\omega \tau)^{2 c}) + \frac{\pi}{2} \left[
+    cos(\frac{c \pi}{2}) (1 + (\omega \tau)^{2 c}) + 2 (\omega \tau)^c
+    \right]}{\left[1 + 2 (\omega \tau)^c cos(\frac{c \pi}{2}) + (\omega
+    \tau)^{2 c}\right]^2}`
+    """
+    sigmai, m, tau, c = sort_parameters(pars)
+    w, log_wtau, otc, otc2, ang, denom = _intermediates(
+        omega, m, tau, c, log_omega, intermediates, workspace)
+    # sigmai m (ln(omega tau) Q + pi / 2 P)
+    result = kernel_helpers.Q_term(
+        otc, otc2, np.sin(ang), denom,
+        sip_workspace.output(out, otc.shape))
+    result *= log_wtau
+    P = kernel_helpers.P_term(
+        otc, otc2, np.cos(ang), denom,
+        sip_workspace.buffer(workspace, 'term', otc.shape))
+    P *= np.pi / 2.0
+    result += P
+    result *= sigmai * m
+    return result
+
+
+instrumentation.register(
+    sys.modules[__name__],
+    instrumentation.public_functions(sys.modules[__name__]) +
+    ['_intermediates', '_fill_jacobian'],
+    'cond.cc_kernels')
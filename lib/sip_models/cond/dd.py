@@ -0,0 +1,59 @@
+# *-* coding: utf-8 *-*
+r""" Debye and Warburg decomposition (conductivity formulation)
+
+The conductivity spectrum is decomposed into Cole-Cole terms (Tarasov and
+Titov, 2013) with relaxation times fixed on a grid, and a common c value:
+
+:math:`\hat{\sigma}(\omega) = \sigma_\infty \left(1 - \sum_k \frac{m_k}{1 +
+(j \omega \tau_k)^c}\right)`
+
+Example:
+
+    import numpy as np
+    import sip_models.cond.dd as dd
+
+    frequencies = np.logspace(-3, 3, 20)
+    obj = dd.dd(frequencies)
+    result = obj.fit(data, lam=1e-6)
+    result['m_tot']
+"""
+import sip_models.sip_response as sip_response
+import sip_models.dd_base as dd_base
+import sip_models.instrumentation as instrumentation
+
+
+class dd(dd_base.dd_base):
+    parameter_name = 'sigmai'
+
+    def _terms(self, omega, tau, c):
+        return 1 / (1 + (1j * omega * tau) ** c)
+
+    def response(self, parameters):
+        r"""Complex response of the decomposition, computed as one
+        matrix-vector product with the cached kernel matrix
+
+        Parameters
+        ----------
+        parameters: list or numpy.ndarray or dict
+            sigmai, m1, ..., mM (linear), or a dict with the entries "sigmai"
+            and "m"
+
+        Returns
+        -------
+        response: :class:`sip_models.sip_response.sip_response`
+            model response object
+        """
+        ccomplex = self._complex_response(parameters)
+        response = sip_response.sip_response(self.f, ccomplex=ccomplex)
+        return response
+
+
+class warburg(dd):
+    """Warburg decomposition, i.e., a decomposition with c = 0.5
+    """
+    def __init__(self, frequencies, tau=None, taus_per_decade=20):
+        super(warburg, self).__init__(
+            frequencies, tau=tau, c=0.5, taus_per_decade=taus_per_decade)
+
+
+instrumentation.register(dd, ['response'], 'cond.dd')
@@ -0,0 +1,180 @@
+# *-* coding: utf-8 *-*
+r""" Vectorized conversions between the representations of SIP spectra
+
+All functions work on arrays of any leading shape, i.e., one spectrum (N),
+many spectra (S x N), or a grid of spectra, and accept caller-provided
+output arrays (out=) to avoid allocations in repeated conversions. The paired
+representations (magnitude and phase, real and imaginary parts) are
+returned as arrays with a trailing axis of size 2, e.g., (S, N, 2).
+
+Phases are given in mrad. The resistance/resistivity and the
+conductance/conductivity are reciprocal:
+
+.. math::
+
+    \sigma^* = 1 / \rho^*, \quad |\sigma| = 1 / |\rho|, \quad
+    \phi_\sigma = -\phi_\rho
+
+>>> import numpy as np
+>>> import sip_models.conversions as conversions
+>>> rcomplex = np.array([[100 - 10j, 50 - 1j], [10 - 1j, 1 - 0.1j]])
+>>> conversions.mag_pha(rcomplex).shape
+(2, 2, 2)
+>>> np.allclose(conversions.reciprocal(rcomplex), 1 / rcomplex)
+True
+"""
+import numpy as np
+
+import sip_models.workspace as sip_workspace
+
+
+def reciprocal(data, out=None):
+    """Convert complex resistivities to conductivities and vice versa
+
+    Parameters
+    ----------
+    data: :class:`numpy.ndarray`
+        complex values, any shape
+    out: :class:`numpy.ndarray`, optional
+        complex output array of the same shape, may be data itself
+
+    Returns
+    -------
+    reciprocal: :class:`numpy.ndarray`
+        1 / data
+    """
+    data = np.asarray(data)
+    out = sip_workspace.output(out, data.shape, complex)
+    return np.divide(1.0, data, out=out)
+
+
+def magnitude(data, out=None):
+    """Magnitudes of complex values
+
+    Parameters
+    ----------
+    data: :class:`numpy.ndarray`
+        complex values, any shape
+    out: :class:`numpy.ndarray`, optional
+        float output array of the same shape
+    """
+    data = np.asarray(data)
+    out = sip_workspace.output(out, data.shape)
+    return np.abs(data, out=out)
+
+
+def phase(data, out=None):
+    """Phases [mrad] of complex values
+
+    Parameters
+    ----------
+    data: :class:`numpy.ndarray`
+        complex values, any shape
+    out: :class:`numpy.ndarray`, optional
+        float output array of the same shape
+    """
+    data = np.asarray(data)
+    out = sip_workspace.output(out, data.shape)
+    np.arctan2(data.imag, data.real, out=out)
+    out *= 1000
+    return out
+
+
+def mag_pha(data, out=None):
+    """Magnitudes and phases [mrad] of complex values
+
+    Parameters
+    ----------
+    data: :class:`numpy.ndarray`
+        complex values, shape (..., N)
+    out: :class:`numpy.ndarray`, optional
+        float output array of shape (..., N, 2)
+
+    Returns
+    -------
+    mag_pha: :class:`numpy.ndarray`
+        (..., N, 2) array with the magnitudes in [..., 0] and the phases in
+        [..., 1]
+    """
+    data = np.asarray(data)
+    out = sip_workspace.output(out, data.shape + (2, ))
+    magnitude(data, out=out[..., 0])
+    phase(data, out=out[..., 1])
+    return out
+
+
+def re_im(data, out=None):
+    """Real and imaginary parts of complex values
+
+    Parameters
+    ----------
+    data: :class:`numpy.ndarray`
+        complex values, shape (..., N)
+    out: :class:`numpy.ndarray`, optional
+        float output array of shape (..., N, 2)
+
+    Returns
+    -------
+    re_im: :class:`numpy.ndarray`
+        (..., N, 2) array with the real parts in [..., 0] and the imaginary
+        parts in [..., 1]
+    """
+    data = np.asarray(data)
+    out = sip_workspace.output(out, data.shape + (2, ))
+    out[..., 0] = data.real
+    out[..., 1] = data.imag
+    return out
+
+
+def reciprocal_mag_pha(mag_pha, out=None):
+    """Convert magnitudes and phases of resistivities to those of
+    conductivities and vice versa, without complex arithmetic
+
+    Parameters
+    ----------
+    mag_pha: :class:`numpy.ndarray`
+        (..., N, 2) array of magnitudes and phases [mrad]
+    out: :class:`numpy.ndarray`, optional
+        float output array of the same shape, may be mag_pha itself
+    """
+    mag_pha = np.asarray(mag_pha)
+    out = sip_workspace.output(out, mag_pha.shape)
+    np.divide(1.0, mag_pha[..., 0], out=out[..., 0])
+    np.negative(mag_pha[..., 1], out=out[..., 1])
+    return out
+
+
+def from_mag_pha(mag_pha, out=None):
+    """Complex values from magnitudes and phases [mrad]
+
+    Parameters
+    ----------
+    mag_pha: :class:`numpy.ndarray`
+        (..., N, 2) array of magnitudes and phases [mrad]
+    out: :class:`numpy.ndarray`, optional
+        complex output array of shape (..., N)
+    """
+    mag_pha = np.asarray(mag_pha)
+    out = sip_workspace.output(out, mag_pha.shape[:-1], complex)
+    pha = mag_pha[..., 1] / 1000
+    np.cos(pha, out=out.real)
+    np.sin(pha, out=out.imag)
+    out *= mag_pha[..., 0]
+    return out
+
+
+def from_re_im(re_im, out=None):
+    """Complex values from real and imaginary parts
+
+    Parameters
+    ----------
+    re_im: :class:`numpy.ndarray`
+        (..., N, 2) array of real and imaginary parts
+    out: :class:`numpy.ndarray`, optional
+        complex output array of shape (..., N)
+    """
+    re_im = np.asarray(re_im)
+    out = sip_workspace.output(out, re_im.shape[:-1], complex)
+    out.real = re_im[..., 0]
+    out.imag = re_im[..., 1]
+    return out
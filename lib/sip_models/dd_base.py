@@ -0,0 +1,470 @@
+# *-* coding: utf-8 *-*
+""" Base class for Debye and Warburg decompositions (both resistivity and
+conductivity)
+
+The spectrum is described by many Cole-Cole terms whose relaxation times are
+fixed on a grid, and which all share the same c value (c = 1: Debye
+decomposition, c = 0.5: Warburg decomposition). Only the chargeabilities
+(and the DC/high-frequency value) are unknown, and the model is linear in the
+products of these two. The complex kernel matrix therefore only depends on
+the frequencies and the fixed relaxation times, and is computed once and
+cached.
+
+Nordsiek, S. and Weller, A. (2008). A new approach to fitting
+induced-polarization spectra. Geophysics, 73(6):F235-F245.
+
+Weigand, M. and Kemna, A. (2016). Debye decomposition of time-lapse spectral
+induced polarisation data. Computers & Geosciences, 86:34-45.
+"""
+import collections
+
+import numpy as np
+
+import sip_models.instrumentation as instrumentation
+
+
+# cached kernel matrices, see dd_base._get_kernel
+_kernel_cache = collections.OrderedDict()
+_kernel_cache_size = 16
+
+
+def tau_grid(frequencies, taus_per_decade=20, extend=1):
+    r"""Return a logarithmically spaced relaxation time grid that covers the
+    frequency range, extended by a number of decades on each side
+
+    Parameters
+    ----------
+    frequencies: :class:`numpy.ndarray`
+        frequencies [Hz]
+    taus_per_decade: int, optional
+        number of relaxation times per decade
+    extend: float, optional
+        number of decades the grid is extended below and above the relaxation
+        times :math:`1 / (2 \pi f)` corresponding to the frequencies
+
+    Returns
+    -------
+    tau: :class:`numpy.ndarray`
+        relaxation times [s] in ascending order
+    """
+    tau_min = np.log10(1 / (2 * np.pi * np.max(frequencies))) - extend
+    tau_max = np.log10(1 / (2 * np.pi * np.min(frequencies))) + extend
+    nr_tau = int(np.ceil((tau_max - tau_min) * taus_per_decade)) + 1
+    tau = np.logspace(tau_min, tau_max, nr_tau)
+    return tau
+
+
+def regularization_matrix(nr_tau, kind='smoothing'):
+    """Return a square, invertible regularization matrix for the
+    chargeabilities
+
+    Parameters
+    ----------
+    nr_tau: int
+        number of relaxation times
+    kind: string, optional
+        'smoothing': first-order differences of neighboring chargeabilities.
+        The first row constrains the first chargeability, which makes the
+        matrix invertible.
+        'identity': constrain the size of the chargeabilities
+
+    Returns
+    -------
+    L: :class:`numpy.ndarray`
+        nr_tau x nr_tau regularization matrix
+    """
+    if kind == 'identity':
+        return np.identity(nr_tau)
+    elif kind == 'smoothing':
+        L = np.identity(nr_tau)
+        L[1:, :] -= np.identity(nr_tau)[:-1, :]
+        return L
+    else:
+        raise Exception('regularization type not known: {}'.format(kind))
+
+
+class dd_base(object):
+    r""" Base class for decompositions into Cole-Cole terms with fixed
+    relaxation times and c values
+
+    Derived classes implement _terms(), which returns the frequency
+    dependence of each term, so that the complex response is
+
+    :math:`\hat{x}(\omega) = x_0 \left(1 - \sum_k m_k T_k(\omega)\right)`
+
+    with :math:`x_0` denoting :math:`\rho_0` or :math:`\sigma_\infty`.
+    """
+    # name of the first parameter: rho0 or sigmai
+    parameter_name = None
+
+    def __init__(self, frequencies, tau=None, c=1.0, taus_per_decade=20):
+        """
+
+        Parameters
+        ----------
+        frequencies: :class:`numpy.ndarray`
+            Array of size N containing N frequencies
+        tau: :class:`numpy.ndarray`, optional
+            relaxation times (size M). By default a grid is generated using
+            :func:`tau_grid`.
+        c: float, optional
+            c value of all terms. 1: Debye decomposition, 0.5: Warburg
+            decomposition
+        taus_per_decade: int, optional
+            number of relaxation times per decade if tau is not provided
+        """
+        self.f = np.atleast_1d(np.asarray(frequencies, dtype=float))
+        if tau is None:
+            tau = tau_grid(self.f, taus_per_decade)
+        self.tau = np.atleast_1d(np.asarray(tau, dtype=float))
+        self.c = float(c)
+        # cached factorizations, see _get_factorization
+        self._factorizations = collections.OrderedDict()
+
+    def _terms(self, omega, tau, c):
+        """Return the complex frequency dependence of the terms (N x M)"""
+        raise NotImplementedError
+
+    @property
+    def kernel(self):
+        r"""Complex N x M kernel matrix :math:`T_k(\omega_i)`, computed once
+        per frequencies/relaxation times/c value and cached
+        """
+        return self._get_kernel()['complex']
+
+    def _get_kernel(self):
+        """Return the cached kernel matrices: the complex kernel, and the
+        real (2N x (1 + M)) design matrix of the linear least-squares problem
+        for the unknowns :math:`x_0, x_0 m_k`
+        """
+        key = (
+            type(self), self.f.tobytes(), self.tau.tobytes(), self.c
+        )
+        if key in _kernel_cache:
+            _kernel_cache.move_to_end(key)
+            return _kernel_cache[key]
+
+        omega = 2 * np.pi * self.f
+        terms = self._terms(
+            omega[:, np.newaxis], self.tau[np.newaxis, :], self.c
+        )
+        nr_f = self.f.size
+        design = np.zeros((2 * nr_f, 1 + self.tau.size))
+        design[0:nr_f, 0] = 1
+        design[0:nr_f, 1:] = -terms.real
+        design[nr_f:, 1:] = -terms.imag
+        terms.flags.writeable = False
+        design.flags.writeable = False
+
+        kernel = {
+            'complex': terms,
+            'design': design,
+        }
+        _kernel_cache[key] = kernel
+        while len(_kernel_cache) > _kernel_cache_size:
+            _kernel_cache.popitem(last=False)
+        return kernel
+
+    def _sort_parameters(self, parameters):
+        """Return the first parameter (rho0/sigmai) and the chargeabilities
+
+        Parameters can be provided as a list or numpy.ndarray containing
+        rho0/sigmai, m1, ..., mM, or as a dict with the entries "rho0" (or
+        "sigmai") and "m".
+        """
+        if isinstance(parameters, dict):
+            x0 = parameters[self.parameter_name]
+            m = np.asarray(parameters['m'], dtype=float)
+        elif isinstance(parameters, (list, tuple, np.ndarray)):
+            pars = np.asarray(parameters, dtype=float)
+            x0 = pars[0]
+            m = pars[1:]
+        else:
+            print(parameters)
+            raise Exception('Input format not recognized')
+        if m.size != self.tau.size:
+            raise Exception(
+                'number of chargeabilities does not match the number of ' +
+                'relaxation times: {} != {}'.format(m.size, self.tau.size)
+            )
+        return x0, m
+
+    def _complex_response(self, parameters):
+        """Return the complex response as a single matrix-vector product"""
+        x0, m = self._sort_parameters(parameters)
+        return x0 * (1 - self.kernel.dot(m))
+
+    def _get_factorization(self, weights, regularization):
+        r"""Return the singular value decomposition of the (weighted) problem,
+        cached per weights and regularization type
+
+        The unregularized first parameter :math:`x_0` is eliminated by
+        projecting the data onto the orthogonal complement of its column
+        :math:`a_0` of the design matrix,
+        :math:`P = I - a_0 a_0^T / \|a_0\|^2`.
+        With the invertible regularization matrix :math:`L`, the problem is
+        transformed to standard form :math:`y = L g`, and the SVD :math:`P B
+        L^{-1} = U S V^T` is computed once. Solutions for any regularization
+        parameter then only require products with the factors.
+        """
+        if weights is not None:
+            weights = np.asarray(weights, dtype=float)
+            if weights.shape != (2 * self.f.size, ):
+                raise Exception(
+                    'weights must be of size 2N: {}'.format(2 * self.f.size))
+            key = (weights.tobytes(), regularization)
+        else:
+            key = (None, regularization)
+
+        if key in self._factorizations:
+            self._factorizations.move_to_end(key)
+            return self._factorizations[key]
+
+        A = self._get_kernel()['design']
+        if weights is not None:
+            A = A * weights[:, np.newaxis]
+        a0 = A[:, 0]
+        B = A[:, 1:]
+        a0_norm2 = np.dot(a0, a0)
+        L_inv = np.linalg.inv(regularization_matrix(self.tau.size,
+                                                    regularization))
+
+        B_projected = B - np.outer(a0, np.dot(a0, B) / a0_norm2)
+        U, s, Vt = np.linalg.svd(np.dot(B_projected, L_inv),
+                                 full_matrices=False)
+
+        factorization = {
+            'A': A,
+            'a0': a0,
+            'a0_norm2': a0_norm2,
+            'B_a0': np.dot(B.T, a0),
+            # maps solutions in standard form to chargeability terms g
+            'L_inv_V': np.dot(L_inv, Vt.T),
+            'U': U,
+            's': s,
+        }
+        self._factorizations[key] = factorization
+        while len(self._factorizations) > _kernel_cache_size:
+            self._factorizations.popitem(last=False)
+        return factorization
+
+    def _data_vector(self, data, weights):
+        """Return the (weighted) real data vector"""
+        data = np.atleast_1d(np.asarray(data, dtype=complex))
+        if data.size != self.f.size:
+            raise Exception('data must be of size N: {}'.format(self.f.size))
+        d = np.hstack((data.real, data.imag))
+        if weights is not None:
+            d = d * np.asarray(weights, dtype=float)
+        return d
+
+    def _solve(self, factorization, d, lambdas):
+        r"""Solve the regularized problem for all regularization parameters
+        using the cached factorization
+
+        Returns
+        -------
+        x: :class:`numpy.ndarray`
+            solutions (x0, g), one row per regularization parameter
+        residual_norms: :class:`numpy.ndarray`
+            norms of the (weighted) data residuals
+        solution_norms: :class:`numpy.ndarray`
+            norms of the regularization terms :math:`\|L g\|`
+        dof: :class:`numpy.ndarray`
+            effective number of parameters (trace of the influence matrix)
+        """
+        lambdas = np.atleast_1d(np.asarray(lambdas, dtype=float))
+        a0 = factorization['a0']
+        s = factorization['s']
+        s2 = s ** 2
+
+        a0_d = np.dot(a0, d) / factorization['a0_norm2']
+        d_projected = d - a0 * a0_d
+        beta = np.dot(factorization['U'].T, d_projected)
+
+        # filter factors, one row per regularization parameter
+        denominator = s2[np.newaxis, :] + lambdas[:, np.newaxis]
+        y = beta * s / denominator
+        g = np.dot(y, factorization['L_inv_V'].T)
+        x0 = a0_d - np.dot(g, factorization['B_a0']) / \
+            factorization['a0_norm2']
+        x = np.hstack((x0[:, np.newaxis], g))
+
+        # the part of the data outside of the range of the kernel
+        outside = max(np.dot(d_projected, d_projected) - np.dot(beta, beta),
+                      0)
+        residual_norms = np.sqrt(np.sum(
+            (lambdas[:, np.newaxis] / denominator * beta) ** 2, axis=1
+        ) + outside)
+        solution_norms = np.sqrt(np.sum(y ** 2, axis=1))
+        dof = 1 + np.sum(s2 / denominator, axis=1)
+        return x, residual_norms, solution_norms, dof
+
+    def fit(self, data, lam=1.0, weights=None, regularization='smoothing'):
+        r"""Determine the chargeabilities with a regularized linear
+        least-squares fit
+
+        Minimize :math:`\|W (A x - d)\|^2 + \lambda \|L g\|^2` for
+        :math:`x = (x_0, g)` with :math:`g_k = x_0 m_k`. Real and imaginary
+        parts are fitted jointly. Note that no positivity constraints are
+        enforced.
+
+        The problem is solved using a singular value decomposition that is
+        computed once per weights and regularization type (see
+        :meth:`_get_factorization`).
+
+        Parameters
+        ----------
+        data: :class:`numpy.ndarray`
+            Complex data of size N (resistivities for the resistivity
+            formulation, conductivities for the conductivity formulation)
+        lam: float, optional
+            regularization parameter
+        weights: :class:`numpy.ndarray`, optional
+            weights (usually 1 / standard deviation) of size 2N for the
+            stacked real and imaginary parts
+        regularization: string, optional
+            see :func:`regularization_matrix`
+
+        Returns
+        -------
+        result: dict
+            rho0/sigmai: fitted DC resistivity/high-frequency conductivity;
+            m: chargeabilities (size M);
+            tau: relaxation times (size M);
+            m_tot: total chargeability;
+            tau_mean: chargeability-weighted logarithmic mean relaxation time;
+            parameters: fitted parameters (rho0/sigmai, m1, ..., mM);
+            rms: root-mean-square of the (weighted) data residuals
+        """
+        factorization = self._get_factorization(weights, regularization)
+        d = self._data_vector(data, weights)
+        x = self._solve(factorization, d, lam)[0][0]
+
+        return self._fit_result(x, factorization['A'], d)
+
+    def lcurve(self, data, lambdas=None, weights=None,
+               regularization='smoothing', criterion='gcv'):
+        r"""Evaluate the fit for many regularization parameters and select
+        one, using the L-curve criterion or generalized cross-validation
+
+        The problem is factorized only once (see
+        :meth:`_get_factorization`), so that the whole sweep costs about as
+        much as one fit.
+
+        The L-curve corner is the point of maximum curvature of
+        :math:`(\log \|W(Ax - d)\|, \log \|L g\|)`. The GCV function is
+
+        :math:`G(\lambda) = \frac{\|W(Ax - d)\|^2}{(2N - p_\lambda)^2}`
+
+        with the effective number of parameters :math:`p_\lambda = 1 +
+        \sum_i \frac{s_i^2}{s_i^2 + \lambda}`.
+
+        Parameters
+        ----------
+        data: :class:`numpy.ndarray`
+            Complex data of size N
+        lambdas: :class:`numpy.ndarray`, optional
+            regularization parameters to evaluate. By default, 50 values are
+            distributed logarithmically over the range of the squared
+            singular values.
+        weights: :class:`numpy.ndarray`, optional
+            see :meth:`fit`
+        regularization: string, optional
+            see :func:`regularization_matrix`
+        criterion: string, optional
+            'gcv' or 'lcurve': criterion used to select the regularization
+            parameter that is returned as 'lam'
+
+        Returns
+        -------
+        result: dict
+            lambdas: evaluated regularization parameters (ascending);
+            residual_norms: data misfit norms;
+            solution_norms: regularization term norms;
+            curvature: curvature of the L-curve;
+            gcv: values of the GCV function;
+            lam_lcurve: regularization parameter at the L-curve corner;
+            lam_gcv: regularization parameter minimizing the GCV function;
+            lam: selected regularization parameter;
+            fit: fit result (see :meth:`fit`) for the selected parameter
+        """
+        if criterion not in ('gcv', 'lcurve'):
+            raise Exception('criterion not known: {}'.format(criterion))
+
+        factorization = self._get_factorization(weights, regularization)
+        d = self._data_vector(data, weights)
+
+        if lambdas is None:
+            s2 = factorization['s'] ** 2
+            lam_min = max(s2[-1], s2[0] * 1e-12)
+            lambdas = np.logspace(np.log10(lam_min), np.log10(s2[0]), 50)
+        lambdas = np.sort(np.atleast_1d(np.asarray(lambdas, dtype=float)))
+
+        x, residual_norms, solution_norms, dof = self._solve(
+            factorization, d, lambdas)
+
+        gcv = residual_norms ** 2 / (d.size - dof) ** 2
+
+        # curvature of the L-curve, parameterized by log(lambda)
+        t = np.log(lambdas)
+        rho = np.log(residual_norms)
+        eta = np.log(solution_norms)
+        if lambdas.size >= 3:
+            drho = np.gradient(rho, t)
+            deta = np.gradient(eta, t)
+            ddrho = np.gradient(drho, t)
+            ddeta = np.gradient(deta, t)
+            curvature = (drho * ddeta - ddrho * deta) / \
+                (drho ** 2 + deta ** 2) ** 1.5
+            lam_lcurve = lambdas[np.nanargmax(curvature)]
+        else:
+            curvature = np.full(lambdas.size, np.nan)
+            lam_lcurve = np.nan
+
+        index_gcv = np.argmin(gcv)
+        lam_gcv = lambdas[index_gcv]
+        if criterion == 'gcv':
+            index = index_gcv
+        else:
+            index = np.nanargmax(curvature)
+
+        result = {
+            'lambdas': lambdas,
+            'residual_norms': residual_norms,
+            'solution_norms': solution_norms,
+            'curvature': curvature,
+            'gcv': gcv,
+            'lam_lcurve': lam_lcurve,
+            'lam_gcv': lam_gcv,
+            'lam': lambdas[index],
+            'fit': self._fit_result(x[index], factorization['A'], d),
+        }
+        return result
+
+    def _fit_result(self, x, A, d):
+        """Convert the solution x = (x0, x0 * m) to the result dict"""
+        x0 = x[0]
+        m = x[1:] / x0
+        m_tot = np.sum(m)
+        if m_tot != 0:
+            tau_mean = 10 ** (np.sum(m * np.log10(self.tau)) / m_tot)
+        else:
+            tau_mean = np.nan
+        residuals = A.dot(x) - d
+        result = {
+            self.parameter_name: x0,
+            'm': m,
+            'tau': self.tau,
+            'm_tot': m_tot,
+            'tau_mean': tau_mean,
+            'parameters': np.hstack((x0, m)),
+            'rms': np.sqrt(np.mean(residuals ** 2)),
+        }
+        return result
+
+
+instrumentation.register(
+    dd_base,
+    ['_get_kernel', '_get_factorization', '_solve', 'fit', 'lcurve'],
+    'dd_base')
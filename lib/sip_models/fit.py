@@ -0,0 +1,504 @@
+# *-* coding: utf-8 *-*
+""" Fit Cole-Cole models to one SIP spectrum using a damped Gauss-Newton
+(Levenberg-Marquardt) scheme with the analytic Jacobians of the models
+
+Example:
+
+    import numpy as np
+    import sip_models.res.cc as cc
+    import sip_models.fit as fit
+
+    frequencies = np.logspace(-3, 3, 20)
+    obj = cc.cc(frequencies)
+    data = obj.response([100, 0.1, 0.04, 0.6]).rcomplex
+
+    result = fit.fit_lm(
+        obj, data, [80, 0.2, 0.01, 0.5], log10=[True, True, True, False]
+    )
+    result['parameters']
+
+The data are always provided in the domain of the model: complex
+resistivities for :class:`sip_models.res.cc.cc`, complex conductivities for
+:class:`sip_models.cond.cc.cc`. Real and imaginary parts are fitted jointly.
+
+Many spectra measured at the same frequencies can be fitted in parallel with
+:func:`fit_batch`:
+
+    results = fit.fit_batch(
+        cc.cc, frequencies, data_2d, [80, 0.2, 0.01, 0.5], processes=4
+    )
+    results['parameters']
+
+Covariances, standard errors and correlations of many fitted spectra are
+computed in one vectorized pass with :func:`uncertainties_batch`:
+
+    uncertainties = fit.uncertainties_batch(
+        obj, results['parameters'], data_2d, log10=[True, True, True, False]
+    )
+    uncertainties['std']
+"""
+import multiprocessing
+import sys
+
+import numpy as np
+
+import sip_models.instrumentation as instrumentation
+
+
+def _to_inversion(parameters, log10):
+    """Convert linear parameters to inversion parameters"""
+    x = np.array(parameters, dtype=float)
+    x[log10] = np.log10(x[log10])
+    return x
+
+
+def _to_linear(x, log10):
+    """Convert inversion parameters to linear parameters"""
+    parameters = np.array(x, dtype=float)
+    parameters[log10] = 10 ** parameters[log10]
+    return parameters
+
+
+def _compute_residuals(model, parameters, data, weights, out, forward,
+                       workspace):
+    """Compute the weighted residuals (model - data), stacked as real and
+    imaginary parts, into the array out (size 2N). The forward response is
+    computed into the complex buffer forward (size N), using the scratch
+    buffers of the workspace."""
+    nr_f = data.size
+    model.response(parameters, out=forward, workspace=workspace)
+    np.subtract(forward.real, data.real, out=out[0:nr_f])
+    np.subtract(forward.imag, data.imag, out=out[nr_f:])
+    if weights is not None:
+        out *= weights
+    return out
+
+
+def _compute_jacobian(model, parameters, log10, weights, out, workspace):
+    """Compute the weighted Jacobian with respect to the inversion parameters
+    into the array out (2N x K), using the scratch buffers of the
+    workspace"""
+    model.Jacobian_re_im(
+        parameters, stacked=True, out=out, log10=log10, workspace=workspace)
+    if weights is not None:
+        out *= weights[:, np.newaxis]
+    return out
+
+
+def fit_lm(model, data, parameters, log10=False, weights=None,
+           lam=1e-2, max_iterations=100, tolerance=1e-10):
+    """Fit a Cole-Cole model to one spectrum
+
+    Starting from the initial parameters, damped Gauss-Newton updates are
+    computed with the analytic Jacobian of the model. The damping parameter
+    is decreased after successful updates, and increased if the misfit would
+    increase (Levenberg-Marquardt). Residuals and Jacobian are computed into
+    buffers which are allocated only once.
+
+    Parameters
+    ----------
+    model: :class:`sip_models.res.cc.cc` or :class:`sip_models.cond.cc.cc`
+        Model object, initialized with the frequencies of the data
+    data: :class:`numpy.ndarray`
+        Complex data of size N, in the domain of the model
+    parameters: list or tuple or numpy.ndarray
+        Initial linear parameters, ordered: rho0/sigmai, m1, m2, ..., tau1,
+        tau2, ..., c1, c2, ...
+    log10: bool or array-like of bools, optional
+        Invert for the log10 of all parameters (True), or of those parameters
+        selected by a boolean array of size 1 + 3P
+    weights: :class:`numpy.ndarray`, optional
+        Weights (usually 1 / standard deviation) of size 2N that are applied
+        to the stacked real and imaginary residuals
+    lam: float, optional
+        Initial damping parameter
+    max_iterations: int, optional
+        Maximum number of accepted updates
+    tolerance: float, optional
+        Stop if the relative decrease of the misfit falls below this value
+
+    Returns
+    -------
+    result: dict
+        'parameters': fitted linear parameters (size 1 + 3P);
+        'covariance': (1 + 3P) x (1 + 3P) covariance matrix of the inversion
+        parameters (i.e., of log10 values for log10-parameters), scaled by
+        the reduced chi-square of the fit;
+        'rms': root-mean-square of the (weighted) residuals;
+        'iterations': number of accepted updates;
+        'converged': True if the relative decrease of the misfit fell below
+        the tolerance before max_iterations. False if the initial misfit is
+        not finite, or if no update decreased the misfit for any damping.
+    """
+    data = np.atleast_1d(np.asarray(data, dtype=complex))
+    pars = np.array(parameters, dtype=float)
+    nr_data = 2 * data.size
+    nr_pars = pars.size
+    log10 = np.broadcast_to(np.asarray(log10, dtype=bool), (nr_pars, ))
+    if weights is not None:
+        weights = np.asarray(weights, dtype=float)
+        if weights.shape != (nr_data, ):
+            raise Exception(
+                'weights must be of size 2N: {}'.format(nr_data))
+
+    # buffers
+    residuals = np.empty(nr_data)
+    residuals_trial = np.empty(nr_data)
+    forward = np.empty(data.size, dtype=complex)
+    workspace = model.create_workspace()
+    J = np.empty((nr_data, nr_pars))
+
+    x = _to_inversion(pars, log10)
+    _compute_residuals(
+        model, pars, data, weights, residuals, forward, workspace)
+    misfit = np.dot(residuals, residuals)
+    _compute_jacobian(model, pars, log10, weights, J, workspace)
+
+    # the initial parameters may already fit the data exactly
+    converged = misfit == 0
+    iteration = 0
+    # the initial parameters must yield a finite misfit, otherwise no
+    # update can be accepted
+    while not converged and np.isfinite(misfit) and \
+            iteration < max_iterations:
+        JTJ = np.dot(J.T, J)
+        gradient = np.dot(J.T, residuals)
+        # Marquardt scaling of the damping term
+        damping = np.diag(JTJ).copy()
+        damping[damping == 0] = 1
+
+        accepted = False
+        while lam < 1e12:
+            A = JTJ + lam * np.diag(damping)
+            try:
+                update = np.linalg.solve(A, -gradient)
+            except np.linalg.LinAlgError:
+                lam *= 10
+                continue
+            x_trial = x + update
+            pars_trial = _to_linear(x_trial, log10)
+            _compute_residuals(
+                model, pars_trial, data, weights, residuals_trial, forward,
+                workspace)
+            misfit_trial = np.dot(residuals_trial, residuals_trial)
+            if np.isfinite(misfit_trial) and misfit_trial <= misfit:
+                accepted = True
+                lam = max(lam / 10, 1e-12)
+                break
+            lam *= 10
+
+        if not accepted:
+            # the damping saturated without any decrease of the misfit
+            break
+
+        iteration += 1
+        decrease = misfit - misfit_trial
+        x = x_trial
+        pars = pars_trial
+        residuals, residuals_trial = residuals_trial, residuals
+        misfit = misfit_trial
+        _compute_jacobian(model, pars, log10, weights, J, workspace)
+
+        if decrease <= tolerance * misfit or misfit == 0:
+            converged = True
+            break
+
+    # covariance of the inversion parameters
+    dof = max(nr_data - nr_pars, 1)
+    try:
+        covariance = np.linalg.inv(np.dot(J.T, J)) * misfit / dof
+    except np.linalg.LinAlgError:
+        covariance = np.full((nr_pars, nr_pars), np.nan)
+
+    result = {
+        'parameters': pars,
+        'covariance': covariance,
+        'rms': np.sqrt(misfit / nr_data),
+        'iterations': iteration,
+        'converged': converged,
+    }
+    return result
+
+
+def _invert_batch(matrices):
+    """Invert a stack of square matrices. Singular matrices are replaced by
+    matrices of NaNs."""
+    try:
+        return np.linalg.inv(matrices)
+    except np.linalg.LinAlgError:
+        inverse = np.full(matrices.shape, np.nan)
+        for index, matrix in enumerate(matrices):
+            try:
+                inverse[index] = np.linalg.inv(matrix)
+            except np.linalg.LinAlgError:
+                pass
+        return inverse
+
+
+def uncertainties_batch(model, parameters, data=None, log10=False,
+                        weights=None):
+    r"""Gauss-Newton Hessians, covariances, standard errors and correlation
+    matrices of many spectra with common frequencies
+
+    The weighted Jacobians of all spectra are computed in one vectorized
+    pass, and :math:`J^T W J` as well as its inverse are computed with
+    stacked linear algebra. :math:`W` is the diagonal matrix of the squared
+    weights.
+
+    Parameters
+    ----------
+    model: :class:`sip_models.res.cc.cc` or :class:`sip_models.cond.cc.cc`
+        Model object, initialized with the frequencies of the data
+    parameters: :class:`numpy.ndarray`
+        Linear parameters of shape (S, 1 + 3P), e.g., the fitted parameters
+        returned by :func:`fit_batch`
+    data: :class:`numpy.ndarray`, optional
+        Complex data of shape (S, N), in the domain of the model. If
+        provided, the covariances are scaled by the reduced chi-square of
+        each spectrum, as in :func:`fit_lm`.
+    log10: bool or array-like of bools, optional
+        Compute the uncertainties of the log10 of all parameters (True), or
+        of those parameters selected by a boolean array of size 1 + 3P
+    weights: :class:`numpy.ndarray`, optional
+        Weights of size 2N for all spectra, or of shape (S, 2N)
+
+    Returns
+    -------
+    result: dict
+        'JTWJ': (S, 1 + 3P, 1 + 3P) Gauss-Newton approximations of the
+        Hessians of half the weighted misfits;
+        'covariance': (S, 1 + 3P, 1 + 3P) covariance matrices of the
+        inversion parameters (NaN for singular :math:`J^T W J`);
+        'std': (S, 1 + 3P) standard errors;
+        'correlation': (S, 1 + 3P, 1 + 3P) correlation matrices
+    """
+    parameters = np.atleast_2d(np.asarray(parameters, dtype=float))
+    nr_spectra, nr_pars = parameters.shape
+    log10 = np.broadcast_to(np.asarray(log10, dtype=bool), (nr_pars, ))
+
+    J = model.Jacobian_re_im_batch(parameters, stacked=True, log10=log10)
+    nr_data = J.shape[1]
+    if weights is not None:
+        weights = np.atleast_2d(np.asarray(weights, dtype=float))
+        if weights.shape[1] != nr_data:
+            raise Exception(
+                'weights must be of size 2N: {}'.format(nr_data))
+        weights = np.broadcast_to(weights, (nr_spectra, nr_data))
+        J *= weights[..., np.newaxis]
+
+    JTWJ = np.matmul(np.swapaxes(J, 1, 2), J)
+    covariance = _invert_batch(JTWJ)
+
+    if data is not None:
+        data = np.atleast_2d(np.asarray(data, dtype=complex))
+        forward = model.response_batch(parameters)
+        residuals = np.concatenate(
+            ((forward - data).real, (forward - data).imag), axis=1)
+        if weights is not None:
+            residuals *= weights
+        dof = max(nr_data - nr_pars, 1)
+        chi2 = np.einsum('ij,ij->i', residuals, residuals) / dof
+        covariance *= chi2[:, np.newaxis, np.newaxis]
+
+    std = np.sqrt(np.diagonal(covariance, axis1=1, axis2=2))
+    correlation = covariance / (
+        std[:, :, np.newaxis] * std[:, np.newaxis, :])
+
+    result = {
+        'JTWJ': JTWJ,
+        'covariance': covariance,
+        'std': std,
+        'correlation': correlation,
+    }
+    return result
+
+
+def _result_dtype(nr_pars):
+    """Return the dtype of the structured array returned by fit_batch"""
+    return np.dtype([
+        ('parameters', float, (nr_pars, )),
+        ('covariance', float, (nr_pars, nr_pars)),
+        ('rms', float),
+        ('iterations', int),
+        ('converged', bool),
+    ])
+
+
+# state of a worker process of the pool, set once by _init_worker
+_worker_state = {}
+
+
+def _fit_state(model_class, frequencies, settings):
+    """Return the model object and the settings shared by all chunks"""
+    return {'model': model_class(frequencies), 'settings': settings}
+
+
+def _init_worker(model_class, frequencies, settings):
+    """Initialize a worker process: the frequencies and the model object are
+    only transferred once per process, not once per task"""
+    _worker_state.update(_fit_state(model_class, frequencies, settings))
+
+
+def _fit_chunk(task, state=None):
+    """Fit one chunk of spectra, in a worker process or, with an explicit
+    state, in the calling process
+
+    Parameters
+    ----------
+    task: tuple
+        (index of first spectrum, data (S_chunk x N), initial parameters
+        (S_chunk x K), weights (S_chunk x 2N) or None)
+    state: dict, optional
+        model and settings, see :func:`_fit_state`. Defaults to the state of
+        the worker process.
+
+    Returns
+    -------
+    index: int
+        index of the first spectrum of this chunk
+    results: :class:`numpy.ndarray`
+        structured array with the results of this chunk
+    """
+    start, data, parameters, weights = task
+    if state is None:
+        state = _worker_state
+    model = state['model']
+    settings = dict(state['settings'])
+    warm_start = settings.pop('warm_start')
+
+    results = np.zeros(data.shape[0], dtype=_result_dtype(
+        parameters.shape[1]))
+    previous = None
+    for index in range(data.shape[0]):
+        initial = parameters[index]
+        if warm_start and previous is not None:
+            initial = previous
+        spec_weights = None if weights is None else weights[index]
+        result = fit_lm(
+            model, data[index], initial, weights=spec_weights, **settings
+        )
+        if warm_start and previous is not None and not result['converged']:
+            # the warm start did not work out, use the initial parameters
+            result = fit_lm(
+                model, data[index], parameters[index],
+                weights=spec_weights, **settings
+            )
+        for key in results.dtype.names:
+            results[index][key] = result[key]
+        if result['converged']:
+            previous = result['parameters']
+        else:
+            previous = None
+
+    return start, results
+
+
+def fit_batch(model_class, frequencies, data, parameters, log10=False,
+              weights=None, processes=None, chunksize=64, warm_start=False,
+              progress=None, **kwargs):
+    """Fit many spectra with common frequencies using a pool of processes
+
+    The spectra are divided into chunks which are fitted with
+    :func:`fit_lm` by the worker processes. The model object and the
+    frequencies are set up once per worker process.
+
+    Parameters
+    ----------
+    model_class: class
+        Model class, e.g., :class:`sip_models.res.cc.cc` or
+        :class:`sip_models.cond.cc.cc`
+    frequencies: :class:`numpy.ndarray`
+        Frequencies of size N common to all spectra
+    data: :class:`numpy.ndarray`
+        Complex data of shape (S, N), in the domain of the model
+    parameters: :class:`numpy.ndarray`
+        Initial linear parameters, either of size 1 + 3P for all spectra, or
+        of shape (S, 1 + 3P), e.g., the results of a previous fit
+    log10: bool or array-like of bools, optional
+        See :func:`fit_lm`
+    weights: :class:`numpy.ndarray`, optional
+        Weights of size 2N for all spectra, or of shape (S, 2N)
+    processes: int, optional
+        Number of worker processes. Defaults to the number of CPUs. If 1,
+        the spectra are fitted in the calling process.
+    chunksize: int, optional
+        Number of spectra per task
+    warm_start: bool, optional
+        If True, the fitted parameters of a spectrum are used as initial
+        parameters for the next spectrum of the same chunk. If this fit does
+        not converge, the spectrum is refitted with its initial parameters.
+        Useful for ordered spectra, e.g., neighboring cells or time-lapse
+        data.
+    progress: callable, optional
+        Called as progress(nr_finished, nr_spectra) after each finished
+        chunk
+    **kwargs: optional
+        Passed to :func:`fit_lm` (e.g., lam, max_iterations, tolerance)
+
+    Returns
+    -------
+    results: :class:`numpy.ndarray`
+        Structured array of size S with the fields 'parameters',
+        'covariance', 'rms', 'iterations', 'converged' (see
+        :func:`fit_lm`)
+    """
+    data = np.atleast_2d(np.asarray(data, dtype=complex))
+    nr_spectra = data.shape[0]
+    parameters = np.atleast_2d(np.asarray(parameters, dtype=float))
+    parameters = np.broadcast_to(
+        parameters, (nr_spectra, parameters.shape[1]))
+    if weights is not None:
+        weights = np.atleast_2d(np.asarray(weights, dtype=float))
+        weights = np.broadcast_to(weights, (nr_spectra, weights.shape[1]))
+
+    settings = dict(kwargs)
+    settings['log10'] = log10
+    settings['warm_start'] = warm_start
+
+    tasks = []
+    for start in range(0, nr_spectra, chunksize):
+        chunk = slice(start, start + chunksize)
+        tasks.append((
+            start,
+            data[chunk],
+            np.ascontiguousarray(parameters[chunk]),
+            None if weights is None else np.ascontiguousarray(weights[chunk]),
+        ))
+
+    results = np.zeros(nr_spectra, dtype=_result_dtype(parameters.shape[1]))
+    initargs = (model_class, np.asarray(frequencies), settings)
+
+    def _store(start, chunk_results):
+        results[start:start + chunk_results.size] = chunk_results
+
+    nr_finished = 0
+    if processes == 1:
+        # the state is passed explicitly, so that the calling process keeps
+        # no reference to the model and the settings
+        state = _fit_state(*initargs)
+        for task in tasks:
+            start, chunk_results = _fit_chunk(task, state)
+            _store(start, chunk_results)
+            nr_finished += chunk_results.size
+            if progress is not None:
+                progress(nr_finished, nr_spectra)
+    else:
+        pool = multiprocessing.Pool(
+            processes, initializer=_init_worker, initargs=initargs)
+        try:
+            for start, chunk_results in pool.imap_unordered(
+                    _fit_chunk, tasks):
+                _store(start, chunk_results)
+                nr_finished += chunk_results.size
+                if progress is not None:
+                    progress(nr_finished, nr_spectra)
+        finally:
+            pool.close()
+            pool.join()
+
+    return results
+
+
+instrumentation.register(
+    sys.modules[__name__],
+    ['fit_lm', 'uncertainties_batch', 'fit_batch'], 'fit')
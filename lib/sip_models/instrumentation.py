@@ -0,0 +1,395 @@
+# *-* coding: utf-8 *-*
+""" Opt-in instrumentation of the model methods and hot paths
+
+The modules of sip_models register their methods and hot-path functions
+(e.g., the intermediate terms of the Cole-Cole kernels, the format
+conversions of :class:`sip_models.sip_response.sip_response`, and plotting)
+with :func:`register`. While the instrumentation is enabled, the registered
+functions are replaced by wrappers which record the number of calls, the
+cumulative and internal wall time, and optionally the memory allocated
+during the calls. When disabled, the original functions are restored, so
+the instrumentation costs nothing.
+
+Enable the instrumentation with a context manager:
+
+    import sip_models.instrumentation as instrumentation
+
+    with instrumentation.enabled(memory=True):
+        result = fit.fit_lm(obj, data, initial_parameters)
+    print(instrumentation.report())
+    instrumentation.dump_stats('fit.prof')
+
+or for a whole program with the environment variable SIP_MODELS_INSTRUMENT
+(1: timing, memory: timing and memory). The report is then printed to
+stderr at exit, and the statistics are written to the file given by
+SIP_MODELS_INSTRUMENT_DUMP, if set:
+
+    SIP_MODELS_INSTRUMENT=1 SIP_MODELS_INSTRUMENT_DUMP=fit.prof python fit.py
+    python -m pstats fit.prof
+
+The dumped statistics use the format of :mod:`cProfile`, and can be loaded
+with :class:`pstats.Stats` or other profile viewers.
+
+Memory is measured with :mod:`tracemalloc`, which traces the data buffers
+of NumPy arrays. For each call, the peak of the traced memory above its
+level at the start of the call is recorded. Tracing memory slows down all
+allocations considerably, and the recorded times should be interpreted
+accordingly. Calls from multiple threads are counted correctly, but the
+memory measurements are only reliable for single-threaded use.
+"""
+import atexit
+import collections
+import contextlib
+import functools
+import marshal
+import os
+import sys
+import threading
+import time
+import tracemalloc
+
+# registered targets: label -> (owner, attribute name, original function,
+# True if the function is inherited by the owner class)
+_targets = collections.OrderedDict()
+_lock = threading.Lock()
+_local = threading.local()
+
+_state = {
+    'enabled': False,
+    'memory': False,
+    # True if tracemalloc was started by enable()
+    'tracemalloc_started': False,
+}
+
+
+class _entry(object):
+    """Statistics of one instrumented function"""
+    __slots__ = ('calls', 'cumulative', 'internal', 'memory', 'callers')
+
+    def __init__(self):
+        self.calls = 0
+        self.cumulative = 0.0
+        self.internal = 0.0
+        self.memory = 0
+        # caller label -> [calls, cumulative, internal]
+        self.callers = collections.defaultdict(lambda: [0, 0.0, 0.0])
+
+
+_stats = collections.defaultdict(_entry)
+
+
+class _frame(object):
+    """One active call of an instrumented function"""
+    __slots__ = ('label', 'start', 'children', 'memory_start', 'child_peak')
+
+    def __init__(self, label, memory_start):
+        self.label = label
+        self.start = time.perf_counter()
+        # cumulative time of instrumented calls made by this call
+        self.children = 0.0
+        self.memory_start = memory_start
+        self.child_peak = 0
+
+
+def _stack():
+    stack = getattr(_local, 'stack', None)
+    if stack is None:
+        stack = []
+        _local.stack = stack
+    return stack
+
+
+def _enter(label):
+    stack = _stack()
+    memory_start = 0
+    if _state['memory'] and tracemalloc.is_tracing():
+        memory_start, peak = tracemalloc.get_traced_memory()
+        # the peak reached so far by the caller is stored, as the peak is
+        # reset for this call
+        if stack:
+            stack[-1].child_peak = max(stack[-1].child_peak, peak)
+        tracemalloc.reset_peak()
+    frame = _frame(label, memory_start)
+    stack.append(frame)
+    return frame
+
+
+def _exit(frame):
+    end = time.perf_counter()
+    stack = _stack()
+    stack.pop()
+    cumulative = end - frame.start
+    internal = cumulative - frame.children
+
+    memory = 0
+    if _state['memory'] and tracemalloc.is_tracing():
+        peak = max(tracemalloc.get_traced_memory()[1], frame.child_peak)
+        memory = max(peak - frame.memory_start, 0)
+        if stack:
+            stack[-1].child_peak = max(stack[-1].child_peak, peak)
+
+    caller = None
+    if stack:
+        stack[-1].children += cumulative
+        caller = stack[-1].label
+
+    with _lock:
+        entry = _stats[frame.label]
+        entry.calls += 1
+        entry.cumulative += cumulative
+        entry.internal += internal
+        entry.memory += memory
+        if caller is not None:
+            caller_entry = entry.callers[caller]
+            caller_entry[0] += 1
+            caller_entry[1] += cumulative
+            caller_entry[2] += internal
+
+
+def _wrap(function, label):
+    """Return a wrapper of function which records its calls"""
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+        frame = _enter(label)
+        try:
+            return function(*args, **kwargs)
+        finally:
+            _exit(frame)
+    wrapper._instrumented_original = function
+    return wrapper
+
+
+def _patch(label):
+    owner, name, function, inherited = _targets[label]
+    setattr(owner, name, _wrap(function, label))
+
+
+def _restore(label):
+    owner, name, function, inherited = _targets[label]
+    if inherited:
+        # the owner class inherits the function again
+        delattr(owner, name)
+    else:
+        setattr(owner, name, function)
+
+
+def _lookup(owner, name):
+    """Return the function stored under name in owner or, for classes, in
+    the first base class holding it, and whether it is inherited"""
+    for holder in getattr(owner, '__mro__', (owner, )):
+        if name in vars(holder):
+            return vars(holder)[name], holder is not owner
+    raise Exception('{0} has no attribute {1}'.format(owner, name))
+
+
+def register(owner, names, prefix, labels=None):
+    """Register functions or methods for instrumentation
+
+    Parameters
+    ----------
+    owner: object
+        module, class, or other object holding the functions as attributes.
+        Inherited methods are patched in the class itself, so that the
+        calls of each subclass are recorded under its own labels.
+    names: list of str
+        attribute names of the functions
+    prefix: str
+        prefix of the labels; the label of a function is prefix.name
+    labels: list of str, optional
+        labels of the functions, replacing prefix.name
+    """
+    if labels is None:
+        labels = ['{0}.{1}'.format(prefix, name) for name in names]
+    with _lock:
+        for name, label in zip(names, labels):
+            function, inherited = _lookup(owner, name)
+            if hasattr(function, '_instrumented_original'):
+                # registered again while patched
+                inherited = _targets.get(label, (owner, name, function,
+                                                 inherited))[3]
+            function = getattr(
+                function, '_instrumented_original', function)
+            _targets[label] = (owner, name, function, inherited)
+            if _state['enabled']:
+                _patch(label)
+
+
+def public_functions(owner):
+    """Return the names of the public functions defined in a module or
+    class, in their order of definition"""
+    return [
+        name for name, item in vars(owner).items()
+        if not name.startswith('_') and callable(item) and
+        getattr(item, '__module__', None) == getattr(
+            owner, '__module__', getattr(owner, '__name__', None))
+    ]
+
+
+def is_enabled():
+    """Return True if the instrumentation is enabled"""
+    return _state['enabled']
+
+
+def enable(memory=False):
+    """Enable the instrumentation of all registered functions
+
+    Parameters
+    ----------
+    memory: bool, optional
+        Also record the memory allocated during the calls. Starts
+        :mod:`tracemalloc` if it is not tracing yet.
+    """
+    with _lock:
+        if memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            _state['tracemalloc_started'] = True
+        _state['memory'] = memory
+        if not _state['enabled']:
+            for label in _targets:
+                _patch(label)
+            _state['enabled'] = True
+
+
+def disable():
+    """Disable the instrumentation and restore the original functions. The
+    recorded statistics are kept until :func:`reset` is called."""
+    with _lock:
+        if _state['enabled']:
+            for label in _targets:
+                _restore(label)
+            _state['enabled'] = False
+        if _state['tracemalloc_started']:
+            tracemalloc.stop()
+            _state['tracemalloc_started'] = False
+        _state['memory'] = False
+
+
+def reset():
+    """Remove all recorded statistics"""
+    with _lock:
+        _stats.clear()
+
+
+@contextlib.contextmanager
+def enabled(memory=False, reset_stats=True):
+    """Context manager which enables the instrumentation
+
+    Parameters
+    ----------
+    memory: bool, optional
+        Also record the allocated memory, see :func:`enable`
+    reset_stats: bool, optional
+        Remove previously recorded statistics on entry
+    """
+    was_enabled = is_enabled()
+    if reset_stats:
+        reset()
+    enable(memory=memory)
+    try:
+        yield
+    finally:
+        if not was_enabled:
+            disable()
+
+
+def summary():
+    """Return the recorded statistics
+
+    Returns
+    -------
+    rows: list of dicts
+        one dict per called function with the keys 'label', 'calls',
+        'cumulative' and 'internal' (wall time [s]), and 'memory' (summed
+        peak allocations [bytes]), sorted by decreasing internal time
+    """
+    with _lock:
+        rows = [
+            {
+                'label': label,
+                'calls': entry.calls,
+                'cumulative': entry.cumulative,
+                'internal': entry.internal,
+                'memory': entry.memory,
+            }
+            for label, entry in _stats.items()
+        ]
+    rows.sort(key=lambda row: row['internal'], reverse=True)
+    return rows
+
+
+def report(sort='internal'):
+    """Return the recorded statistics as a table
+
+    Parameters
+    ----------
+    sort: str, optional
+        column to sort by (decreasing): 'internal', 'cumulative', 'calls',
+        or 'memory'
+    """
+    rows = sorted(summary(), key=lambda row: row[sort], reverse=True)
+    width = max([len(row['label']) for row in rows] + [8])
+    lines = ['{0:<{w}} {1:>8} {2:>12} {3:>12} {4:>12} {5:>12}'.format(
+        'function', 'calls', 'cumtime [s]', 'tottime [s]', 'percall [us]',
+        'memory [kB]', w=width)]
+    for row in rows:
+        lines.append(
+            '{0:<{w}} {1:>8d} {2:>12.6f} {3:>12.6f} {4:>12.1f} '
+            '{5:>12.1f}'.format(
+                row['label'], row['calls'], row['cumulative'],
+                row['internal'], row['cumulative'] / row['calls'] * 1e6,
+                row['memory'] / 1024.0, w=width)
+        )
+    return '\n'.join(lines)
+
+
+def _profile_key(label):
+    """Return the (filename, line number, function name) key of a label in
+    the statistics format of cProfile"""
+    target = _targets.get(label)
+    if target is None:
+        return ('~', 0, label)
+    code = getattr(target[2], '__code__', None)
+    if code is None:
+        return ('~', 0, label)
+    return (code.co_filename, code.co_firstlineno, label)
+
+
+def dump_stats(filename):
+    """Write the recorded statistics in the format of :mod:`cProfile`
+
+    The file can be loaded with :class:`pstats.Stats`, e.g., ``python -m
+    pstats filename``, or with other viewers of cProfile output. Only
+    instrumented functions are contained.
+    """
+    with _lock:
+        stats = {}
+        for label, entry in _stats.items():
+            callers = {
+                _profile_key(caller): (
+                    values[0], values[0], values[2], values[1])
+                for caller, values in entry.callers.items()
+            }
+            stats[_profile_key(label)] = (
+                entry.calls, entry.calls, entry.internal, entry.cumulative,
+                callers)
+    with open(filename, 'wb') as fid:
+        marshal.dump(stats, fid)
+
+
+def _from_environment():
+    """Enable the instrumentation if requested by SIP_MODELS_INSTRUMENT"""
+    setting = os.environ.get('SIP_MODELS_INSTRUMENT', '').strip().lower()
+    if setting in ('', '0', 'false', 'no', 'off'):
+        return
+    enable(memory=(setting == 'memory'))
+
+    def _at_exit():
+        if _stats:
+            sys.stderr.write(report() + '\n')
+        filename = os.environ.get('SIP_MODELS_INSTRUMENT_DUMP')
+        if filename:
+            dump_stats(filename)
+    atexit.register(_at_exit)
+
+
+_from_environment()
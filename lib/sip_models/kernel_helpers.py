@@ -0,0 +1,151 @@
+# *-* coding: utf-8 *-*
+""" Helper functions shared by the Cole-Cole kernels of the resistivity
+(:mod:`sip_models.res.cc_kernels`) and the conductivity
+(:mod:`sip_models.cond.cc_kernels`) formulations
+"""
+import numpy as np
+
+
+def jacobian_output(leading_shape, nr_f, nr_terms, stacked, out):
+    """Allocate (or check) the Jacobian array and return it together with
+    views on the derivatives of the real and imaginary parts
+
+    Parameters
+    ----------
+    leading_shape: tuple
+        () for one spectrum, (S, ) for S spectra
+    nr_f: int
+        number of frequencies N
+    nr_terms: int
+        number of polarization terms P
+    stacked: bool
+        If True, the derivatives of the real and imaginary parts are stacked
+        along the frequency axis, otherwise along the parameter axis
+    out: :class:`numpy.ndarray` or None
+        optional output array
+
+    Returns
+    -------
+    J: :class:`numpy.ndarray`
+        The Jacobian array
+    J_re: :class:`numpy.ndarray`
+        (..., N, 1 + 3P) view on the derivatives of the real parts
+    J_im: :class:`numpy.ndarray`
+        (..., N, 1 + 3P) view on the derivatives of the imaginary parts
+    """
+    nr_pars = 1 + 3 * nr_terms
+    leading_shape = tuple(leading_shape)
+    if stacked:
+        shape = leading_shape + (2 * nr_f, nr_pars)
+    else:
+        shape = leading_shape + (nr_f, 2 * nr_pars)
+
+    if out is None:
+        J = np.empty(shape)
+    else:
+        if out.shape != shape or not out.flags['C_CONTIGUOUS']:
+            raise Exception(
+                'out must be a C-contiguous array of shape {}'.format(
+                    shape)
+            )
+        J = out
+
+    # real and imaginary parts are written through views
+    if stacked:
+        J_parts = J.reshape(leading_shape + (2, nr_f, nr_pars))
+        J_re = J_parts[..., 0, :, :]
+        J_im = J_parts[..., 1, :, :]
+    else:
+        J_parts = J.reshape(leading_shape + (nr_f, 2, nr_pars))
+        J_re = J_parts[..., :, 0, :]
+        J_im = J_parts[..., :, 1, :]
+    return J, J_re, J_im
+
+
+def log10_scaling(log10, p0, m, tau, c):
+    """Return the chain-rule factors of the parameter blocks for derivatives
+    with respect to log10 parameters, d/dlog10(p) = ln(10) p d/dp
+
+    Parameters
+    ----------
+    log10: :class:`numpy.ndarray`
+        boolean array of size 1 + 3P, True for log10 parameters
+    p0: :class:`numpy.ndarray`
+        (..., 1, 1) rho0 or sigmai
+    m, tau, c: :class:`numpy.ndarray`
+        (..., 1, P)
+
+    Returns
+    -------
+    scaling: list of :class:`numpy.ndarray`
+        factors for p0, m, tau, c, of the same shapes as the parameters.
+        The factors of linear parameters are 1.
+    """
+    nr_terms = m.shape[-1]
+    blocks = (
+        slice(0, 1),
+        slice(1, nr_terms + 1),
+        slice(nr_terms + 1, 2 * nr_terms + 1),
+        slice(2 * nr_terms + 1, 1 + 3 * nr_terms),
+    )
+    return [
+        np.where(log10[block], np.log(10) * x, 1.0)
+        for block, x in zip(blocks, (p0, m, tau, c))
+    ]
+
+
+def to_logmag_pha(response_complex, J_re, J_im):
+    """Transform the derivatives of the real and imaginary parts, in place,
+    into those of the natural logarithm of the magnitude and of the phase
+    [mrad]
+
+    Parameters
+    ----------
+    response_complex: :class:`numpy.ndarray`
+        (..., N) complex responses
+    J_re, J_im: :class:`numpy.ndarray`
+        (..., N, K) derivatives of the real and imaginary parts
+    """
+    a = response_complex.real[..., np.newaxis]
+    b = response_complex.imag[..., np.newaxis]
+    abs2 = a ** 2 + b ** 2
+
+    dlogmag = a * J_re
+    dlogmag += b * J_im
+    dlogmag /= abs2
+
+    J_im *= a
+    J_im -= b * J_re
+    J_im *= 1000 / abs2
+    J_re[...] = dlogmag
+
+
+def im_term(otc, sin_ang, denom, out):
+    r"""Write :math:`\frac{(\omega \tau)^c sin(\frac{c \pi}{2})}{D}` into
+    out"""
+    np.multiply(otc, sin_ang, out=out)
+    out /= denom
+    return out
+
+
+def P_term(otc, otc2, cos_ang, denom, out):
+    r"""Write :math:`P = r \frac{cos(\theta) (1 + r^2) + 2 r}{D^2}` into
+    out"""
+    np.add(1, otc2, out=out)
+    out *= cos_ang
+    out += otc
+    out += otc
+    out *= otc
+    out /= denom
+    out /= denom
+    return out
+
+
+def Q_term(otc, otc2, sin_ang, denom, out):
+    r"""Write :math:`Q = r \frac{sin(\theta) (1 - r^2)}{D^2}` into out"""
+    np.subtract(1, otc2, out=out)
+    out *= sin_ang
+    out *= otc
+    out /= denom
+    out /= denom
+    return out
@@ -0,0 +1,506 @@
+# *-* coding: utf-8 *-*
+r""" Stateless kernel functions of the Cole-Cole model
+(resistivity/resistance formulation) after Pelton et al. 1978
+
+:math:`\hat{\rho}(\omega) = \rho_0 \left(1 - \sum_i m_i (1 - \frac{1}{1 + (j
+\omega \tau_i)^c_i})\right)`
+
+All functions compute the response or its partial derivatives from the
+angular frequencies :math:`\omega = 2 \pi f` and the parameters only, and do
+not store any state. They can therefore be called concurrently, e.g., from a
+thread pool. The methods of :class:`sip_models.res.cc.cc` delegate to these
+functions.
+
+Parameters can be provided in the formats described in
+:func:`sort_parameters`.
+
+This module defines the per-term function of the formulation, its sign, and
+the dre_*/dim_* derivatives. The parameter sorting, the responses, and the
+Jacobians are shared with the conductivity formulation and implemented in
+:mod:`sip_models.cc_common`.
+
+The response, the dre_*/dim_* functions, and :func:`Jacobian_re_im` accept
+an output array (out=) and a :class:`sip_models.workspace.workspace` for
+their intermediate terms. Reusing both avoids all allocations of
+frequency-sized arrays in repeated evaluations.
+"""
+import sys
+
+import numpy as np
+
+import sip_models.cc_common as cc_common
+import sip_models.instrumentation as instrumentation
+import sip_models.kernel_helpers as kernel_helpers
+import sip_models.workspace as sip_workspace
+
+_formulation = sys.modules[__name__]
+
+# name of the first parameter
+P0_NAME = 'rho0'
+# the per-term function T = 1 - K decreases with the Cole-Cole kernel K
+SIGN = 1
+
+
+def _complex_term(jotc):
+    r"""Transform :math:`(j \omega \tau)^c`, in place, into :math:`1 -
+    \frac{1}{1 + (j \omega \tau)^c}`"""
+    jotc += 1
+    np.reciprocal(jotc, out=jotc)
+    np.subtract(1, jotc, out=jotc)
+    return jotc
+
+
+def _re_term(otc, cos_ang, denom, out):
+    r"""Write :math:`\frac{(\omega \tau)^c (cos(\frac{c \pi}{2}) +
+    (\omega \tau)^c)}{D}` into out"""
+    np.add(otc, cos_ang, out=out)
+    out *= otc
+    out /= denom
+    return out
+
+
+def _im_term(otc, sin_ang, denom, out):
+    r"""Write :math:`\frac{(\omega \tau)^c sin(\frac{c \pi}{2})}{D}` into
+    out"""
+    return kernel_helpers.im_term(otc, sin_ang, denom, out)
+
+
+def sort_parameters(parameters):
+    """Sort out the various possible parameter inputs, see
+    :func:`sip_models.cc_common.sort_parameters`
+
+    Returns
+    -------
+    rho0: float
+    m, tau, c: :class:`numpy.ndarray`
+        parameters of the P terms
+    """
+    return cc_common.sort_parameters(_formulation, parameters)
+
+
+def sort_parameters_batch(parameters):
+    """Sort a batch of S parameter sets into arrays, see
+    :func:`sip_models.cc_common.sort_parameters_batch`
+
+    Returns
+    -------
+    rho0: :class:`numpy.ndarray`
+        size S
+    m, tau, c: :class:`numpy.ndarray`
+        shape (S, P)
+    """
+    return cc_common.sort_parameters_batch(_formulation, parameters)
+
+
+def _intermediates(omega, m, tau, c, log_omega=None, cached=None,
+                   workspace=None):
+    """See :func:`sip_models.cc_common.intermediates`"""
+    return cc_common.intermediates(
+        omega, m, tau, c, log_omega, cached, workspace)
+
+
+def response(omega, pars, log_omega=None, intermediates=None, out=None,
+             workspace=None):
+    """Complex resistivities of the Cole-Cole model (size N), see
+    :func:`sip_models.cc_common.response`
+    """
+    return cc_common.response(
+        _formulation, omega, pars, log_omega, intermediates, out, workspace)
+
+
+def terms(omega, tau, c, log_omega=None, out=None, workspace=None):
+    r"""Complex (N x P) per-term functions :math:`1 - K_k`, see
+    :func:`sip_models.cc_common.terms`
+    """
+    return cc_common.terms(
+        _formulation, omega, tau, c, log_omega, out, workspace)
+
+
+def response_batch(omega, parameters, log_omega=None):
+    """Complex resistivities of S spectra (S x N), see
+    :func:`sip_models.cc_common.response_batch`
+    """
+    return cc_common.response_batch(
+        _formulation, omega, parameters, log_omega)
+
+
+def _fill_jacobian(J_re, J_im, omega, rho0, m, tau, c, log_omega=None,
+                   log10=False, intermediates=None, workspace=None):
+    """See :func:`sip_models.cc_common.fill_jacobian`"""
+    cc_common.fill_jacobian(
+        _formulation, J_re, J_im, omega, rho0, m, tau, c, log_omega, log10,
+        intermediates, workspace)
+
+
+def Jacobian_re_im(omega, pars, stacked=False, out=None, log10=False,
+                   log_omega=None, intermediates=None, workspace=None):
+    """Jacobian of real and imaginary parts with respect to the linear
+    parameters, see :func:`sip_models.cc_common.Jacobian_re_im`
+    """
+    return cc_common.Jacobian_re_im(
+        _formulation, omega, pars, stacked, out, log10, log_omega,
+        intermediates, workspace)
+
+
+def Jacobian_log10_re_im(omega, pars, stacked=False, out=None,
+                         log_omega=None, intermediates=None, workspace=None):
+    """Jacobian of real and imaginary parts with respect to the log10 of all
+    parameters, see :func:`sip_models.cc_common.Jacobian_log10_re_im`
+    """
+    return cc_common.Jacobian_log10_re_im(
+        _formulation, omega, pars, stacked, out, log_omega, intermediates,
+        workspace)
+
+
+def Jacobian_complex(omega, pars, out=None, log10=False, log_omega=None,
+                     intermediates=None):
+    """Jacobian of the complex response with respect to the parameters, see
+    :func:`sip_models.cc_common.Jacobian_complex`
+    """
+    return cc_common.Jacobian_complex(
+        _formulation, omega, pars, out, log10, log_omega, intermediates)
+
+
+def Jacobian_logmag_pha(omega, pars, stacked=False, out=None, log10=False,
+                        log_omega=None, intermediates=None):
+    """Jacobian of the natural logarithm of the magnitude and of the phase
+    [mrad], see :func:`sip_models.cc_common.Jacobian_logmag_pha`
+    """
+    return cc_common.Jacobian_logmag_pha(
+        _formulation, omega, pars, stacked, out, log10, log_omega,
+        intermediates)
+
+
+def Jacobian_re_im_batch(omega, parameters, stacked=False, out=None,
+                         log10=False, log_omega=None):
+    """Jacobians of real and imaginary parts of S spectra, see
+    :func:`sip_models.cc_common.Jacobian_re_im_batch`
+    """
+    return cc_common.Jacobian_re_im_batch(
+        _formulation, omega, parameters, stacked, out, log10, log_omega)
+
+
+def dre_drho0(omega, pars, log_omega=None, intermediates=None, out=None,
+              workspace=None):
+    r""" Compute partial derivative of real parts with respect to
+    :math:`\rho_0`
+
+    :math:`\frac{\partial \hat{\rho'}(\omega)}{\partial \rho_0} = 1 -
+    \frac{m (\omega \tau)^c cos(\frac{c \pi}{2}) + (\omega \tau)^c}{1 + 2
+    (\omega \tau)^c cos(\frac{c \pi}{2}) + (\omega \tau)^{2 c}}`
+
+    Note that partial derivatives towards :math:`\rho_0` are 1D, in
+    contrast to the other parameter derivatives, which usually return 2D
+    arrays!
+
+    Returns
+    -------
+    dre_drho0: :class:`numpy.ndarray`
+        Size N (nr of frequencies) array with the derivatives
+
+    """
+    rho0, m, tau, c = sort_parameters(pars)
+    w, log_wtau, otc, otc2, ang, denom = _intermediates(
+        omega, m, tau, c, log_omega, intermediates, workspace)
+    term = _re_term(otc, np.cos(ang), denom, sip_workspace.buffer(
+        workspace, 'term', otc.shape))
+    term *= m
+    result = sip_workspace.output(out, otc.shape[:-1])
+    np.sum(term, axis=-1, out=result)
+    np.subtract(1, result, out=result)
+    return result
+
+
+def dre_dlog10rho0(omega, pars, log_omega=None, intermediates=None, out=None,
+                   workspace=None):
+    """Compute partial derivative of real parts to log10(rho0)
+    """
+    rho0, m, tau, c = sort_parameters(pars)
+    result = dre_drho0(
+        omega, pars, log_omega, intermediates, out, workspace)
+    result *= np.log(10) * rho0
+    return result
+
+
+def dre_dm(omega, pars, log_omega=None, intermediates=None, out=None,
+           workspace=None):
+    r"""
+    :math:`\frac{\partial \hat{\rho'}(\omega)}{\partial m} = - \rho_0 m
+    (\omega \tau)^c \frac{(cos(\frac{c \pi}{2}) + (\omega \tau)^c)}{1 + 2
+    (\omega \tau)^c cos(\frac{c \pi}{2}) + (\omega \tau)^{2 c}}`
+    """
+    rho0, m, tau, c = sort_parameters(pars)
+    w, log_wtau, otc, otc2, ang, denom = _intermediates(
+        omega, m, tau, c, log_omega, intermediates, workspace)
+    result = _re_term(
+        otc, np.cos(ang), denom, sip_workspace.output(out, otc.shape))
+    result *= -rho0
+    return result
+
+
+def dre_dlog10m(omega, pars, log_omega=None, intermediates=None, out=None,
+                workspace=None):
+    rho0, m, tau, c = sort_parameters(pars)
+    result = dre_dm(
+        omega, pars, log_omega, intermediates, out, workspace)
+    result *= np.log(10) * m
+    return result
+
+
+def dre_dtau(omega, pars, log_omega=None, intermediates=None, out=None,
+             workspace=None):
+    r"""
+    :math:`\frac{\partial \hat{\rho'}(\omega)}{\partial \tau} = \rho_0
+    \frac{-m \omega^c c \tau^{c-1} cos(\frac{c \pi}{2} - m \omega^{2 c} 2 c
+    \tau^{2c - 1}}{1 + 2 (\omega \tau)^c cos(\frac{c \pi}{2}) + (\omega
+    \tau)^{2 c}} +
+    \rho_0 \frac{\left[m (\omega \tau)^c (cos(\frac{c \pi}{2}) + (\omega
+    \tau)^c) \right] \cdot \left[ 2 \omega^c c \tau^{c-1} cos(\frac{c
+    \pi}{2}) + 2 c \omega^{2 c} \tau^{2 c - 1}\right]}{\left[1 + 2 (\omega
+    \tau)^c cos(\frac{c \pi}{2}) + (\omega \tau)^{2 c}\right]^2}`
+    """
+    rho0, m, tau, c = sort_parameters(pars)
+    w, log_wtau, otc, otc2, ang, denom = _intermediates(
+        omega, m, tau, c, log_omega, intermediates, workspace)
+    # - rho0 m c / tau P
+    result = kernel_helpers.P_term(
+        otc, otc2, np.cos(ang), denom,
+        sip_workspace.output(out, otc.shape))
+    result *= -rho0 * m * c / tau
+    return result
+
+
+def dre_dlog10tau(omega, pars, log_omega=None, intermediates=None, out=None,
+                  workspace=None):
+    rho0, m, tau, c = sort_parameters(pars)
+    result = dre_dtau(
+        omega, pars, log_omega, intermediates, out, workspace)
+    result *= np.log(10) * tau
+    return result
+
+
+def dre_dc(omega, pars, log_omega=None, intermediates=None, out=None,
+           workspace=None):
+    r"""
+    :math:`\frac{\partial \hat{\rho'}(\omega)}{\partial c} = \rho_0
+    \frac{-m ln(\omega \tau) (\omega \tau)^c cos(\frac{c \pi}{2}) + m
+    (\omega\tau)^c \frac{\pi}{2} sin(\frac{c \pi}{2}) + ln(\omega
+    \tau)(\omega \tau)^c}{1 + 2 (\omega \tau)^c cos(\frac{c \pi}{2}) +
+    (\omega \tau)^{2 c}} +
+    \rho_0 \frac{\left[-m (\omega \tau)^c (cos(\frac{c \pi}{2}) + (\omega
+    \tau)^c) \right] \cdot \left[ -2 ln(\omega \tau) (\omega \tau)^c
+    cos(\frac{c \pi}{2}) + 2 (\omega \tau)^c \frac{\pi}{2} cos(\frac{c
+    \pi}{2} + 2 ln(\omega \tau) (\omega \tau)^{2 c}\right]}{\left[1 + 2
+    (\omega \tau)^c cos(\frac{c \pi}{2}) + (\omega \tau)^{2 c}\right]^2}`
+    """
+    rho0, m, tau, c = sort_parameters(pars)
+    w, log_wtau, otc, otc2, ang, denom = _intermediates(
+        omega, m, tau, c, log_omega, intermediates, workspace)
+    # - rho0 m (ln(omega tau) P - pi / 2 Q)
+    result = kernel_helpers.P_term(
+        otc, otc2, np.cos(ang), denom,
+        sip_workspace.output(out, otc.shape))
+    result *= log_wtau
+    Q = kernel_helpers.Q_term(
+        otc, otc2, np.sin(ang), denom,
+        sip_workspace.buffer(workspace, 'term', otc.shape))
+    Q *= np.pi / 2.0
+    result -= Q
+    result *= -rho0 * m
+    return result
+
+
+def dim_drho0(omega, pars, log_omega=None, intermediates=None, out=None,
+              workspace=None):
+    r"""
+    :math:`\frac{\partial \hat{\rho}''(\omega)}{\partial \rho_0} = -
+    \frac{m (\omega \tau)^c sin(\frac{c \pi}{2})}{1 + 2
+    (\omega \tau)^c cos(\frac{c \pi}{2}) + (\omega \tau)^{2 c}}`
+    """
+    rho0, m, tau, c = sort_parameters(pars)
+    w, log_wtau, otc, otc2, ang, denom = _intermediates(
+        omega, m, tau, c, log_omega, intermediates, workspace)
+    term = kernel_helpers.im_term(
+        otc, np.sin(ang), denom,
+        sip_workspace.buffer(workspace, 'term', otc.shape))
+    term *= m
+    result = sip_workspace.output(out, otc.shape[:-1])
+    np.sum(term, axis=-1, out=result)
+    np.negative(result, out=result)
+    return result
+
+
+def dim_dlog10rho0(omega, pars, log_omega=None, intermediates=None, out=None,
+                   workspace=None):
+    rho0, m, tau, c = sort_parameters(pars)
+    result = dim_drho0(
+        omega, pars, log_omega, intermediates, out, workspace)
+    result *= np.log(10) * rho0
+    return result
+
+
+def dim_dm(omega, pars, log_omega=None, intermediates=None, out=None,
+           workspace=None):
+    r"""
+    :math:`\frac{\partial \hat{\rho''}(\omega)}{\partial m} = - \rho_0 m
+    (\omega \tau)^c \frac{sin(\frac{c \pi}{2})}{1 + 2 (\omega \tau)^c
+    cos(\frac{c \pi}{2}) + (\omega \tau)^{2 c}}`
+    """
+    rho0, m, tau, c = sort_parameters(pars)
+    w, log_wtau, otc, otc2, ang, denom = _intermediates(
+        omega, m, tau, c, log_omega, intermediates, workspace)
+    result = kernel_helpers.im_term(
+        otc, np.sin(ang), denom, sip_workspace.output(out, otc.shape))
+    result *= -rho0
+    return result
+
+
+def dim_dlog10m(omega, pars, log_omega=None, intermediates=None, out=None,
+                workspace=None):
+    rho0, m, tau, c = sort_parameters(pars)
+    result = dim_dm(
+        omega, pars, log_omega, intermediates, out, workspace)
+    result *= np.log(10) * m
+    return result
+
+
+def dim_dtau(omega, pars, log_omega=None, intermediates=None, out=None,
+             workspace=None):
+    r"""
+    :math:`\frac{\partial \hat{\rho''}(\omega)}{\partial \tau} = \rho_0
+    \frac{-m \omega^c c \tau^{c-1} sin(\frac{c \pi}{2} }{1 + 2 (\omega
+    \tau)^c cos(\frac{c \pi}{2}) + (\omega \tau)^{2 c}} +
+    \rho_0 \frac{\left[-m (\omega \tau)^c sin(\frac{c \pi}{2}
+    \right] \cdot \left[ 2 \omega^c c \tau^{c-1} cos(\frac{c
+    \pi}{2}) + 2 c \omega^{2 c} \tau^{2 c - 1}\right]}{\left[1 + 2 (\omega
+    \tau)^c cos(\frac{c \pi}{2}) + (\omega \tau)^{2 c}\right]^2}`
+    """
+    rho0, m, tau, c = sort_parameters(pars)
+    w, log_wtau, otc, otc2, ang, denom = _intermediates(
+        omega, m, tau, c, log_omega, intermediates, workspace)
+    # - rho0 m c / tau Q
+    result = kernel_helpers.Q_term(
+        otc, otc2, np.sin(ang), denom,
+        sip_workspace.output(out, otc.shape))
+    result *= -rho0 * m * c / tau
+    return result
+
+
+def dim_dlog10tau(omega, pars, log_omega=None, intermediates=None, out=None,
+                  workspace=None):
+    rho0, m, tau, c = sort_parameters(pars)
+    result = dim_dtau(
+        omega, pars, log_omega, intermediates, out, workspace)
+    result *= np.log(10) * tau
+    return result
+
+
+def dim_dc(omega, pars, log_omega=None, intermediates=None, out=None,
+           workspace=None):
+    r"""
+    :math:`\frac{\partial \hat{\rho''}(\omega)}{\partial c} = \rho_0
+    \frac{-m sin(\frac{c \pi}{2}) ln(\omega \tau)(\omega \tau)^c - m
+    (\omega \tau)^c \frac{\pi}{2} cos(\frac{\pi}{2}}{1 + 2 (\omega \tau)^c
+    cos(\frac{c \pi}{2}) + (\omega \tau)^{2 c}} + \rho_0 \frac{\left[-m
+    (\omega \tau)^c cos(\frac{c \pi}{2}) \right] \cdot \left[ -2 ln(\omega
+    \tau) (\omega \tau)^c cos(\frac{c \pi}{2}) + 2 (\omega \tau)^c
+    \frac{\pi}{2} cos(\frac{c \pi}{2}) \right] + \left[2 ln(\omega \tau)
+    (\omega \tau)^{2 c}\right]}{\left[1 + 2 (\omega \tau)^c cos(\frac{c
+    \pi}{2}) + (\omega \tau)^{2 c}\right]^2}`
+    """
+    rho0, m, tau, c = sort_parameters(pars)
+    w, log_wtau, otc, otc2, ang, denom = _intermediates(
+        omega, m, tau, c, log_omega, intermediates, workspace)
+    # - rho0 m (ln(omega tau) Q + pi / 2 P)
+    result = kernel_helpers.Q_term(
+        otc, otc2, np.sin(ang), denom,
+        sip_workspace.output(out, otc.shape))
+    result *= log_wtau
+    P = kernel_helpers.P_term(
+        otc, otc2, np.cos(ang), denom,
+        sip_workspace.buffer(workspace, 'term', otc.shape))
+    P *= np.pi / 2.0
+    result += P
+    result *= -rho0 * m
+    return result
+
+
+def response_and_Jacobian_cre_cim(omega, pars, stacked=False, out=None,
+                                  log10=False, log_omega=None,
+                                  intermediates=None):
+    r"""Complex conductivity response and Jacobian of its real and imaginary
+    parts with respect to the resistivity parameters, computed together in
+    one pass
+
+    The fused real/imaginary Jacobian of the resistivity is transformed in
+    place by the chain rule of :math:`\hat{\sigma} = 1 / \hat{\rho}`:
+
+    :math:`\frac{\partial \hat{\sigma}}{\partial p} = - \hat{\sigma}^2
+    \frac{\partial \hat{\rho}}{\partial p}`
+
+    >>> import sip_models.res.cc_kernels as cc_kernels
+    >>> import numpy as np
+    >>> omega = 2 * np.pi * np.logspace(-3, 3, 20)
+    >>> pars = [100, 0.1, 0.04, 0.8]
+    >>> ccomplex, J = cc_kernels.response_and_Jacobian_cre_cim(omega, pars)
+    >>> ccomplex.shape, J.shape
+    ((20,), (20, 8))
+
+    Parameters
+    ----------
+    omega: :class:`numpy.ndarray`
+        angular frequencies (size N)
+    pars: list or tuple or numpy.ndarray or dict
+        Cole-Cole model parameters: rho0, m, tau, c (all linear)
+    stacked, out, log10, log_omega, intermediates: optional
+        See :func:`Jacobian_re_im`. The derivatives of the real and
+        imaginary parts of the conductivity take the place of those of the
+        resistivity.
+
+    Returns
+    -------
+    ccomplex: :class:`numpy.ndarray`
+        complex conductivities (size N)
+    J: :class:`numpy.ndarray`
+        The Jacobian, ordered rho0, m1, m2, ..., tau1, tau2, ..., c1, c2,
+        ...
+    """
+    rho0, m, tau, c = sort_parameters(pars)
+    J, J_re, J_im = kernel_helpers.jacobian_output(
+        (), omega.size, m.size, stacked, out)
+    _fill_jacobian(
+        J_re, J_im, omega, rho0, m, tau, c, log_omega, log10=log10,
+        intermediates=intermediates)
+    ccomplex = 1 / response(omega, pars, log_omega, intermediates)
+    _to_conductivity(ccomplex, J_re, J_im)
+    return ccomplex, J
+
+
+def _to_conductivity(ccomplex, J_re, J_im):
+    """Transform the derivatives of the real and imaginary parts of the
+    resistivity, in place, into those of the conductivity
+
+    Parameters
+    ----------
+    ccomplex: :class:`numpy.ndarray`
+        (..., N) complex conductivities
+    J_re, J_im: :class:`numpy.ndarray`
+        (..., N, K) derivatives of the real and imaginary parts
+    """
+    factor = -ccomplex ** 2
+    u = factor.real[..., np.newaxis]
+    v = factor.imag[..., np.newaxis]
+
+    dre = u * J_re
+    dre -= v * J_im
+
+    J_im *= u
+    J_im += v * J_re
+    J_re[...] = dre
+
+
+instrumentation.register(
+    sys.modules[__name__],
+    instrumentation.public_functions(sys.modules[__name__]) +
+    ['_intermediates', '_fill_jacobian'],
+    'res.cc_kernels')
@@ -1,16 +1,150 @@
 # *-* coding: utf-8 *-*
-""" Define a container for one SIP spectrum. Include converters and plot
-functions
+""" Define containers for one SIP spectrum and for many spectra at the same
+frequencies. Include converters and plot functions
 
 """
-import sip_formats.convert as SC
 import numpy as np
+import sip_models.conversions as conversions
 import sip_models.plot_helper
-plt, mpl = sip_models.plot_helper.setup()
+import sip_models.instrumentation as instrumentation
 
+# matplotlib is only imported when the first plot is created, see
+# _setup_plotting()
+plt = None
+mpl = None
 
-class sip_response():
+
+def _setup_plotting():
+    """Import and set up matplotlib on first use
+
+    Returns
+    -------
+    plt: pylab
+        imported pylab module
+    mpl: matplotlib module
+        imported matplotlib module
+    """
+    global plt, mpl
+    if plt is None:
+        plt, mpl = sip_models.plot_helper.setup()
+    return plt, mpl
+
+
+class _cached_property(object):
+    """Decorator for properties that are computed on first access and then
+    stored in the instance, replacing the property
+
+    Compatible with Python versions without functools.cached_property
+    """
+    def __init__(self, func):
+        self.func = func
+        self.__name__ = func.__name__
+        self.__doc__ = func.__doc__
+
+    def __get__(self, obj, cls):
+        if obj is None:
+            return self
+        value = self.func(obj)
+        obj.__dict__[self.__name__] = value
+        return value
+
+
+class _representations(object):
+    """ Representations of one spectrum (arrays of size N) or of many
+    spectra (arrays of shape (S, N)), computed from the stored complex
+    representation on first access and cached
+
+    The conversions are done with :mod:`sip_models.conversions`. Magnitudes
+    and phases, as well as real and imaginary parts, are computed together
+    in one pass, and the single representations are views of the paired
+    arrays. The magnitudes and phases of the conductivities are computed
+    from those of the resistivities (and vice versa) without complex
+    arithmetic.
+    """
+    @_cached_property
+    def rcomplex(self):
+        """Complex resistance/resistivity values"""
+        return conversions.reciprocal(self.ccomplex)
+
+    @_cached_property
+    def ccomplex(self):
+        """Complex conductance/conductivity values"""
+        return conversions.reciprocal(self.rcomplex)
+
+    @_cached_property
+    def rmag(self):
+        """Resistance/resistivity magnitude"""
+        return self.rmag_rpha[..., 0]
+
+    @_cached_property
+    def rpha(self):
+        """Resistance/resistivity phase [mrad]"""
+        return self.rmag_rpha[..., 1]
+
+    @_cached_property
+    def cmag(self):
+        """Conductance/conductivity magnitude"""
+        return self.cmag_cpha[..., 0]
+
+    @_cached_property
+    def cpha(self):
+        """Conductance/conductivity phase [mrad]"""
+        return self.cmag_cpha[..., 1]
+
+    @_cached_property
+    def rmag_rpha(self):
+        """Nx2 (SxNx2) array: resistance/resistivity magnitude and phase
+        [mrad]"""
+        if 'rcomplex' not in vars(self):
+            return conversions.reciprocal_mag_pha(self.cmag_cpha)
+        return conversions.mag_pha(self.rcomplex)
+
+    @_cached_property
+    def cmag_cpha(self):
+        """Nx2 (SxNx2) array: conductance/conductivity magnitude and phase
+        [mrad]"""
+        if 'ccomplex' not in vars(self):
+            return conversions.reciprocal_mag_pha(self.rmag_rpha)
+        return conversions.mag_pha(self.ccomplex)
+
+    @_cached_property
+    def rre(self):
+        """Real part of the resistance/resistivity"""
+        return np.real(self.rcomplex)
+
+    @_cached_property
+    def rim(self):
+        """Imaginary part of the resistance/resistivity"""
+        return np.imag(self.rcomplex)
+
+    @_cached_property
+    def cre(self):
+        """Real part of the conductance/conductivity"""
+        return np.real(self.ccomplex)
+
+    @_cached_property
+    def cim(self):
+        """Imaginary part of the conductance/conductivity"""
+        return np.imag(self.ccomplex)
+
+    @_cached_property
+    def rre_rim(self):
+        """Nx2 (SxNx2) array: real and imaginary parts of the
+        resistance/resistivity"""
+        return conversions.re_im(self.rcomplex)
+
+    @_cached_property
+    def cre_cim(self):
+        """Nx2 (SxNx2) array: real and imaginary parts of the
+        conductance/conductivity"""
+        return conversions.re_im(self.ccomplex)
+
+
+class sip_response(_representations):
     """ Hold one SIP spectrum and return it in various formats
+
+    Only the complex representation used for initialization is stored. All
+    other representations are computed on first access and cached.
     """
     def __init__(self, frequencies, rcomplex=None, ccomplex=None):
         """
@@ -32,34 +166,11 @@ class sip_response():
 
         self.frequencies = frequencies
 
+        # the other complex representation is computed on first access
         if rcomplex is not None:
             self.rcomplex = rcomplex
-            self.ccomplex = SC.convert('rcomplex', 'ccomplex', rcomplex)
         elif ccomplex is not None:
             self.ccomplex = ccomplex
-            self.rcomplex = SC.convert('ccomplex', 'rcomplex', ccomplex)
-
-        self.rmag = np.abs(self.rcomplex)
-        self.rpha = np.arctan2(
-            np.imag(self.rcomplex),
-            np.real(self.rcomplex)
-        ) * 1000
-        self.cmag = np.abs(self.ccomplex)
-        self.cpha = np.arctan2(
-            np.imag(self.ccomplex),
-            np.real(self.ccomplex)
-        ) * 1000
-
-        self.rmag_rpha = np.vstack((self.rmag, self.rpha)).T
-        self.cmag_cpha = np.vstack((self.cmag, self.cpha)).T
-
-        self.rre = np.real(self.rcomplex)
-        self.rim = np.imag(self.rcomplex)
-        self.cre = np.real(self.ccomplex)
-        self.cim = np.imag(self.ccomplex)
-
-        self.rre_rim = np.vstack((self.rre, self.rim)).T
-        self.cre_cim = np.vstack((self.cre, self.cim)).T
 
     def to_one_line(self, array):
         """flatten the array to one dimension using the 'F' (Fortran) style and
@@ -122,6 +233,7 @@ class sip_response():
         axes: list
             matplotlib axes objects
         """
+        plt, mpl = _setup_plotting()
         if limits is None:
             limits = {}
 
@@ -238,6 +350,7 @@ class sip_response():
              dtype='rho'):
         """Standard plot of spectrum
         """
+        plt, mpl = _setup_plotting()
         fig, axes = self._plot(
             reciprocal=reciprocal,
             limits=limits,
@@ -246,3 +359,129 @@ class sip_response():
         )
         fig.savefig(filename, dpi=300)
         plt.close(fig)
+
+
+class sip_response_collection(_representations):
+    """ Hold S SIP spectra measured at the same N frequencies, stored as
+    contiguous (S, N) arrays
+
+    The representations of :class:`sip_response` are available for all
+    spectra at once, computed vectorized on first access and cached. Indexing
+    with an integer returns a :class:`sip_response` object of one spectrum,
+    indexing with a slice returns a collection. Both share the memory of the
+    arrays computed so far, i.e., no data is copied.
+
+    >>> import numpy as np
+    >>> import sip_models.res.cc as cc
+    >>> import sip_models.sip_response as sip_response
+    >>> f = np.logspace(-3, 3, 20)
+    >>> obj = cc.cc(f)
+    >>> pars = [[100, 0.1, 0.04, 0.8], [1000, 0.1, 0.1, 0.2]]
+    >>> spectra = sip_response.sip_response_collection(
+    ...     f, rcomplex=obj.response_batch(pars))
+    >>> len(spectra), spectra.rmag.shape, spectra.rmag_rpha.shape
+    (2, (2, 20), (2, 20, 2))
+    >>> spectra[1].rmag.shape
+    (20,)
+    """
+    def __init__(self, frequencies, rcomplex=None, ccomplex=None):
+        """
+
+        Parameters
+        ----------
+        frequencies: :class:`numpy.ndarray`
+            Array of size N containing N frequencies in ascending order
+        rcomplex: :class:`numpy.ndarray`, optional
+            Complex resistance/resistivity values (S x N)
+        ccomplex: :class:`numpy.ndarray`, optional
+            Complex conductance/conductivity values (S x N)
+
+        """
+        if rcomplex is None and ccomplex is None:
+            raise Exception('One initialization array is allowed!')
+        if rcomplex is not None and ccomplex is not None:
+            raise Exception('Only one initialization array is allowed!')
+
+        self.frequencies = frequencies
+
+        key = 'rcomplex' if rcomplex is not None else 'ccomplex'
+        data = rcomplex if rcomplex is not None else ccomplex
+        data = np.asarray(data, dtype=complex)
+        if data.ndim != 2 or data.shape[1] != np.size(frequencies):
+            raise Exception(
+                '{0} must be an array of shape (S, {1})'.format(
+                    key, np.size(frequencies))
+            )
+        # the other representations are computed on first access
+        self.__dict__[key] = data
+
+    @classmethod
+    def from_responses(cls, frequencies, responses):
+        """Stack a list of :class:`sip_response` objects into a collection
+
+        Parameters
+        ----------
+        frequencies: :class:`numpy.ndarray`
+            Array of size N containing the common frequencies
+        responses: list of :class:`sip_response`
+            The spectra
+        """
+        return cls(
+            frequencies,
+            rcomplex=np.vstack([response.rcomplex for response in responses])
+        )
+
+    def __len__(self):
+        return self.shape[0]
+
+    @property
+    def shape(self):
+        """(S, N): number of spectra and of frequencies"""
+        if 'rcomplex' in vars(self):
+            return self.rcomplex.shape
+        return self.ccomplex.shape
+
+    def _computed(self):
+        """Return the representations computed so far, by name"""
+        return {
+            name: value for name, value in vars(self).items()
+            if name != 'frequencies'
+        }
+
+    def __getitem__(self, index):
+        """Return one spectrum as a :class:`sip_response` object (integer
+        index), or a subset as a collection (slices, 1D integer or boolean
+        index arrays). Slices share the memory of this collection, index
+        arrays copy. Only spectra can be selected, frequencies cannot."""
+        if isinstance(index, (int, np.integer)):
+            new = sip_response.__new__(sip_response)
+        elif isinstance(index, slice):
+            new = sip_response_collection.__new__(sip_response_collection)
+        else:
+            index = np.asarray(index)
+            if index.ndim != 1 or not (
+                    index.dtype == bool or
+                    np.issubdtype(index.dtype, np.integer)):
+                raise IndexError(
+                    'only spectra can be selected, with an integer, a '
+                    'slice, or a 1D integer or boolean array')
+            if index.dtype == bool and index.size != len(self):
+                raise IndexError(
+                    'boolean index must be of size {}'.format(len(self)))
+            new = sip_response_collection.__new__(sip_response_collection)
+        new.frequencies = self.frequencies
+        for name, value in self._computed().items():
+            new.__dict__[name] = value[index]
+        return new
+
+    def __iter__(self):
+        for index in range(len(self)):
+            yield self[index]
+
+
+instrumentation.register(
+    sip_response, ['__init__', '_plot', 'plot'], 'sip_response')
+for _name, _item in list(vars(_representations).items()):
+    if isinstance(_item, _cached_property):
+        instrumentation.register(
+            _item, ['func'], None, labels=['sip_response.' + _name])
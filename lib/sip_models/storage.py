@@ -0,0 +1,367 @@
+# *-* coding: utf-8 *-*
+""" Memory-mapped on-disk storage of spectra, fitted parameters, and Jacobian
+stacks
+
+A store is a directory holding a JSON header (header.json) and one .npy file
+per array. The header records the format version, the kind, shape, and type
+of each array, and user-defined attributes. The payloads are plain .npy
+files, which can also be read without this module, e.g., with
+:func:`numpy.load`. All arrays are opened as :class:`numpy.memmap`, so data
+larger than the main memory can be processed block by block, and several
+worker processes can read blocks and write their results in place without
+copying.
+
+Example: compute the Jacobians of many cells into one stack on disk
+
+    import sip_models.res.cc as cc
+    import sip_models.storage as storage
+
+    obj = cc.cc(frequencies)
+    st = storage.store('inversion.sip', mode='w')
+    st.save_parameters('parameters', parameters, model='res.cc')
+    J = st.create_jacobians(
+        'J', parameters.shape[0], frequencies.size, parameters.shape[1])
+    for index, pars in enumerate(parameters):
+        obj.Jacobian_re_im(pars, stacked=True, out=J[index])
+    J.flush()
+
+    # later, possibly in another process
+    st = storage.store('inversion.sip')
+    for start, stop, block in st.blocks('J', 1000):
+        ...
+"""
+import json
+import os
+
+import numpy as np
+
+import sip_models.sip_response as sip_response
+
+FORMAT = 'sip_models.store'
+VERSION = 1
+HEADER = 'header.json'
+
+
+class store(object):
+    """A directory of memory-mapped .npy arrays described by a JSON header
+
+    The header is rewritten whenever an array is added, so one process
+    should create the arrays, while several processes may then open the
+    store with mode='r+' to write into existing arrays.
+    """
+    def __init__(self, path, mode='r', overwrite=False):
+        """
+
+        Parameters
+        ----------
+        path: str
+            directory of the store
+        mode: str, optional
+            'r': read-only, 'r+': read and write existing arrays and add new
+            ones, 'w': create a new, empty store
+        overwrite: bool, optional
+            With mode='w', replace an existing store at path, deleting its
+            arrays. Without it, mode='w' refuses to use a directory that is
+            not empty. Directories that are not empty and do not hold a
+            store are never used.
+        """
+        if mode not in ('r', 'r+', 'w'):
+            raise Exception('mode must be one of r, r+, w: {}'.format(mode))
+        self.path = path
+        self.mode = mode
+
+        if mode == 'w':
+            if os.path.isdir(path) and os.listdir(path):
+                if not overwrite:
+                    raise Exception(
+                        'directory is not empty, use overwrite=True to '
+                        'replace an existing store: {}'.format(path))
+                self._remove_existing()
+            if not os.path.isdir(path):
+                os.makedirs(path)
+            self.header = {
+                'format': FORMAT,
+                'version': VERSION,
+                'arrays': {},
+                'attributes': {},
+            }
+            self._write_header()
+        else:
+            self.header = self._read_header()
+
+    def _read_header(self):
+        filename = os.path.join(self.path, HEADER)
+        if not os.path.isfile(filename):
+            raise Exception('no store found at {}'.format(self.path))
+        with open(filename, 'r') as fid:
+            header = json.load(fid)
+        if header.get('format') != FORMAT:
+            raise Exception('not a store: {}'.format(self.path))
+        if header['version'] > VERSION:
+            raise Exception(
+                'unsupported store version: {}'.format(header['version']))
+        return header
+
+    def _remove_existing(self):
+        """Delete the header and the arrays of the existing store at path"""
+        header = self._read_header()
+        filenames = [self._filename(name) for name in header['arrays']]
+        filenames.append(os.path.join(self.path, HEADER))
+        known = set(os.path.basename(filename) for filename in filenames)
+        if not set(os.listdir(self.path)) <= known:
+            raise Exception(
+                'directory contains files that do not belong to the store: '
+                '{}'.format(self.path))
+        for filename in filenames:
+            if os.path.isfile(filename):
+                os.remove(filename)
+
+    def _write_header(self):
+        """Replace the header atomically, so readers never see a partially
+        written file"""
+        filename = os.path.join(self.path, HEADER)
+        with open(filename + '.tmp', 'w') as fid:
+            json.dump(self.header, fid, indent=2, sort_keys=True)
+        os.replace(filename + '.tmp', filename)
+
+    def _check_writable(self):
+        if self.mode == 'r':
+            raise Exception('store is opened read-only')
+
+    def _filename(self, name):
+        if not name or os.sep in name or name.startswith('.'):
+            raise Exception('invalid array name: {}'.format(name))
+        return os.path.join(self.path, name + '.npy')
+
+    @property
+    def names(self):
+        """Names of all arrays in the store"""
+        return sorted(self.header['arrays'].keys())
+
+    @property
+    def attributes(self):
+        """User-defined attributes of the store (dict, JSON-serializable).
+        Call :meth:`flush_header` after modifying them."""
+        return self.header['attributes']
+
+    def flush_header(self):
+        """Write the header, e.g., after changing :attr:`attributes`"""
+        self._check_writable()
+        self._write_header()
+
+    def __contains__(self, name):
+        return name in self.header['arrays']
+
+    def info(self, name):
+        """Return the header entry of an array
+
+        Returns
+        -------
+        info: dict
+            'kind', 'shape', 'dtype', and 'attributes' of the array
+        """
+        if name not in self:
+            raise Exception('array not found in store: {}'.format(name))
+        return self.header['arrays'][name]
+
+    def create(self, name, shape, dtype=float, kind='array', attributes=None):
+        """Create a new array, or replace an existing one
+
+        Parameters
+        ----------
+        name: str
+            name of the array
+        shape: tuple
+            shape of the array
+        dtype: numpy.dtype, optional
+            data type of the array
+        kind: str, optional
+            kind of the data, e.g., 'spectra', 'parameters', 'jacobian'
+        attributes: dict, optional
+            JSON-serializable attributes stored in the header
+
+        Returns
+        -------
+        array: :class:`numpy.memmap`
+            writable, zero-initialized array mapped to the file
+        """
+        self._check_writable()
+        array = np.lib.format.open_memmap(
+            self._filename(name), mode='w+', dtype=dtype, shape=tuple(shape))
+        self.header['arrays'][name] = {
+            'kind': kind,
+            'shape': list(array.shape),
+            'dtype': array.dtype.str,
+            'attributes': attributes or {},
+        }
+        self._write_header()
+        return array
+
+    def save(self, name, data, kind='array', attributes=None):
+        """Store a copy of an array
+
+        Parameters
+        ----------
+        name: str
+            name of the array
+        data: :class:`numpy.ndarray`
+            the data
+        kind, attributes: optional
+            see :meth:`create`
+        """
+        data = np.asarray(data)
+        array = self.create(name, data.shape, data.dtype, kind, attributes)
+        array[...] = data
+        array.flush()
+
+    def load(self, name, mmap_mode=None):
+        """Open an array without reading it into memory
+
+        Parameters
+        ----------
+        name: str
+            name of the array
+        mmap_mode: str, optional
+            'r' (read-only), 'r+' (write in place), or 'c' (copy-on-write).
+            Defaults to 'r' for read-only stores and to 'r+' otherwise.
+
+        Returns
+        -------
+        array: :class:`numpy.memmap`
+            the array mapped to its file
+        """
+        info = self.info(name)
+        if mmap_mode is None:
+            mmap_mode = 'r' if self.mode == 'r' else 'r+'
+        if mmap_mode == 'r+':
+            self._check_writable()
+        array = np.load(self._filename(name), mmap_mode=mmap_mode)
+        if list(array.shape) != info['shape']:
+            raise Exception(
+                'shape of {} does not match the header'.format(name))
+        return array
+
+    def blocks(self, name, block_size, mmap_mode=None):
+        """Iterate over blocks of rows of an array
+
+        Parameters
+        ----------
+        name: str
+            name of the array
+        block_size: int
+            number of rows (along the first axis) per block
+        mmap_mode: str, optional
+            see :meth:`load`
+
+        Yields
+        ------
+        start, stop: int
+            rows of the block
+        block: :class:`numpy.memmap`
+            view of the rows start:stop, written to the file in place if the
+            array was opened writable
+        """
+        array = self.load(name, mmap_mode)
+        for start in range(0, array.shape[0], block_size):
+            stop = min(start + block_size, array.shape[0])
+            yield start, stop, array[start:stop]
+
+    def save_spectra(self, name, spectra, attributes=None):
+        """Store one spectrum or a collection of spectra
+
+        The frequencies and the complex resistivities are stored in the
+        arrays name.frequencies and name.rcomplex.
+
+        Parameters
+        ----------
+        name: str
+            name of the spectra
+        spectra: :class:`sip_models.sip_response.sip_response` or
+                 :class:`sip_models.sip_response.sip_response_collection`
+            the spectra
+        attributes: dict, optional
+            JSON-serializable attributes stored in the header
+        """
+        self.save(
+            name + '.frequencies', spectra.frequencies, kind='frequencies')
+        self.save(
+            name + '.rcomplex', spectra.rcomplex, kind='spectra',
+            attributes=attributes)
+
+    def load_spectra(self, name, mmap_mode=None):
+        """Open spectra stored with :meth:`save_spectra`
+
+        The complex resistivities are not read into memory, but mapped.
+
+        Returns
+        -------
+        spectra: :class:`sip_models.sip_response.sip_response` or
+                 :class:`sip_models.sip_response.sip_response_collection`
+            one spectrum or a collection, depending on the stored data
+        """
+        frequencies = np.array(self.load(name + '.frequencies', 'r'))
+        rcomplex = self.load(name + '.rcomplex', mmap_mode)
+        if rcomplex.ndim == 1:
+            return sip_response.sip_response(frequencies, rcomplex=rcomplex)
+        return sip_response.sip_response_collection(
+            frequencies, rcomplex=rcomplex)
+
+    def save_parameters(self, name, parameters, model=None, log10=False):
+        """Store fitted parameters of S spectra
+
+        Parameters
+        ----------
+        name: str
+            name of the array
+        parameters: :class:`numpy.ndarray`
+            (S, 1 + 3P) array of parameters, either linear or log10 values
+            (see log10). The values are stored as given, without conversion.
+        model: str, optional
+            name of the model, e.g., 'res.cc', stored in the header
+        log10: bool or array-like of bools, optional
+            Recorded in the header: True if the parameters are log10 values,
+            False (default) if they are linear. A boolean array of size
+            1 + 3P marks the log10 columns, and is recorded as a list of
+            bools.
+        """
+        parameters = np.asarray(parameters, dtype=float)
+        log10 = np.asarray(log10, dtype=bool)
+        if log10.ndim == 0:
+            log10 = bool(log10)
+        elif log10.shape == parameters.shape[-1:]:
+            log10 = log10.tolist()
+        else:
+            raise Exception(
+                'log10 must be a bool or hold one bool per column of the '
+                'parameters')
+        self.save(name, parameters, kind='parameters',
+                  attributes={'model': model, 'log10': log10})
+
+    def create_jacobians(self, name, nr_cells, nr_f, nr_pars,
+                         attributes=None):
+        """Create a stack of stacked Jacobians on disk
+
+        The Jacobian of cell i is written in place with, e.g.,
+        ``obj.Jacobian_re_im(pars, stacked=True, out=J[i])``.
+
+        Parameters
+        ----------
+        name: str
+            name of the array
+        nr_cells: int
+            number of Jacobians (e.g., cells of a tomographic model)
+        nr_f: int
+            number of frequencies N
+        nr_pars: int
+            number of parameters (1 + 3P)
+        attributes: dict, optional
+            JSON-serializable attributes stored in the header
+
+        Returns
+        -------
+        J: :class:`numpy.memmap`
+            (nr_cells, 2N, nr_pars) array, initialized with zeros
+        """
+        return self.create(
+            name, (nr_cells, 2 * nr_f, nr_pars), kind='jacobian',
+            attributes=attributes)
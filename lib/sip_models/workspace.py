@@ -0,0 +1,89 @@
+# *-* coding: utf-8 *-*
+""" Reusable scratch buffers for the Cole-Cole kernels (both resistivity and
+conductivity)
+
+The kernel functions in :mod:`sip_models.res.cc_kernels` and
+:mod:`sip_models.cond.cc_kernels` accept an optional workspace. All
+intermediate arrays are then written into buffers of the workspace, which
+are allocated on first use and reused as long as the shapes do not change.
+Together with caller-provided output arrays (out=), repeated evaluations,
+e.g., the iterations of a fit, do not allocate any frequency-sized arrays.
+Only NumPy's internal iteration buffers of bounded size remain.
+
+Example:
+
+    import sip_models.res.cc as cc
+    obj = cc.cc(frequencies)
+    ws = obj.create_workspace()
+    rcomplex = np.empty(frequencies.size, dtype=complex)
+    J = np.empty((2 * frequencies.size, 4))
+    for pars in parameter_sets:
+        obj.response(pars, out=rcomplex, workspace=ws)
+        obj.Jacobian_re_im(pars, stacked=True, out=J, workspace=ws)
+
+The content of the buffers is overwritten by each call, so one workspace
+must not be shared between threads.
+"""
+import numpy as np
+
+
+class workspace(object):
+    """Named scratch buffers, reallocated only if their shape or dtype
+    changes
+    """
+    def __init__(self):
+        self._buffers = {}
+
+    def get(self, name, shape, dtype=float):
+        """Return the (uninitialized) buffer of the given name
+
+        Parameters
+        ----------
+        name: str
+            name of the buffer
+        shape: tuple
+            shape of the buffer
+        dtype: numpy.dtype, optional
+            data type of the buffer
+
+        Returns
+        -------
+        buffer: :class:`numpy.ndarray`
+            array of the requested shape and type
+        """
+        buffer = self._buffers.get(name)
+        if buffer is None or buffer.shape != shape or \
+                buffer.dtype != dtype:
+            buffer = np.empty(shape, dtype=dtype)
+            self._buffers[name] = buffer
+        return buffer
+
+    @property
+    def nbytes(self):
+        """Total size of all buffers [bytes]"""
+        return sum(buffer.nbytes for buffer in self._buffers.values())
+
+    def clear(self):
+        """Release all buffers"""
+        self._buffers.clear()
+
+
+def buffer(ws, name, shape, dtype=float):
+    """Return a scratch array, taken from the workspace ws if provided, or
+    newly allocated otherwise"""
+    if ws is None:
+        return np.empty(shape, dtype=dtype)
+    return ws.get(name, shape, dtype)
+
+
+def output(out, shape, dtype=float):
+    """Return the caller-provided output array out after checking its shape
+    and type, or allocate a new one"""
+    if out is None:
+        return np.empty(shape, dtype=dtype)
+    if out.shape != tuple(shape) or out.dtype != dtype:
+        raise Exception(
+            'out must be an array of shape {} and type {}'.format(
+                tuple(shape), np.dtype(dtype))
+        )
+    return out
@@ -0,0 +1,25 @@
+# *-* coding: utf-8 *-*
+# shared test helpers
+import pytest
+
+import numpy as np
+
+
+def _central_differences(func, pars, rel_step=1e-6):
+    """Jacobian of func by central differences with relative steps"""
+    pars = np.array(pars, dtype=float)
+    columns = []
+    for index in range(pars.size):
+        step = np.zeros_like(pars)
+        step[index] = rel_step * pars[index]
+        columns.append(
+            (func(pars + step) - func(pars - step)) / (2 * step[index])
+        )
+    return np.array(columns).T
+
+
+@pytest.fixture
+def central_differences():
+    """Numerical Jacobian of a function of the parameters, see
+    _central_differences"""
+    return _central_differences
@@ -0,0 +1,345 @@
+# test conductivity model
+# *-* coding: utf-8 *-*
+import pytest
+from concurrent.futures import ThreadPoolExecutor
+import tracemalloc
+
+import numpy as np
+import numdifftools as nd
+
+import sip_models.cond.cc as cc
+import sip_models.cond.cc_kernels as cc_kernels
+
+
+@pytest.fixture
+def setup():
+    s = {}
+    s['f'] = np.logspace(-3, 3, 20)
+    pars = [0.01, 0.1, 0.04, 0.8]
+    pars2 = [0.001, 0.1, 0.1, 0.2]
+    s['p'] = [pars, pars2]
+    s['obj'] = cc.cc(s['f'])
+    return s
+
+
+def test_dict_array_parameters(setup):
+    """dicts with array values give the same results as lists"""
+    obj = setup['obj']
+    for pars in ([0.01, 0.1, 0.04, 0.8],
+                 [0.01, 0.1, 0.2, 0.04, 0.004, 0.6, 0.8]):
+        nr_terms = (len(pars) - 1) // 3
+        pars_dict = {
+            'sigmai': pars[0],
+            'm': np.array(pars[1:nr_terms + 1]),
+            'tau': np.array(pars[nr_terms + 1:2 * nr_terms + 1]),
+            'c': np.array(pars[2 * nr_terms + 1:]),
+        }
+        assert np.allclose(
+            obj.response(pars_dict).ccomplex, obj.response(pars).ccomplex)
+        J = obj.Jacobian_re_im(pars_dict)
+        assert J.shape == (setup['f'].size, 2 * len(pars))
+        assert np.allclose(J, obj.Jacobian_re_im(pars))
+
+    with pytest.raises(Exception):
+        obj.Jacobian_re_im({
+            'sigmai': 0.01, 'm': [[0.1]], 'tau': [[0.04]], 'c': [[0.8]]})
+
+
+def test_response_batch(setup):
+    obj = setup['obj']
+    pars = np.array(setup['p'])
+    ccomplex = obj.response_batch(pars)
+    assert ccomplex.shape == (2, setup['f'].size)
+    for nr, pars_single in enumerate(setup['p']):
+        assert np.allclose(
+            ccomplex[nr], obj.response(pars_single).ccomplex
+        )
+
+    # dict input with array-valued entries
+    ccomplex_dict = obj.response_batch({
+        'sigmai': pars[:, 0],
+        'm': pars[:, 1],
+        'tau': pars[:, 2],
+        'c': pars[:, 3],
+    })
+    assert np.allclose(ccomplex_dict, ccomplex)
+
+    # two-term models
+    pars_2t = np.array([
+        [0.01, 0.1, 0.2, 0.04, 0.0001, 0.4, 0.8],
+        [0.02, 0.05, 0.1, 1, 0.001, 0.6, 0.5],
+    ])
+    ccomplex_2t = obj.response_batch(pars_2t)
+    for nr, pars_single in enumerate(pars_2t):
+        assert np.allclose(
+            ccomplex_2t[nr], obj.response(pars_single).ccomplex
+        )
+
+
+def _numerical_jacobian(obj, pars):
+    def ffunc_re(pars):
+        return obj.response(pars).cre
+
+    def ffunc_im(pars):
+        return obj.response(pars).cim
+
+    Jfunc_re = nd.Jacobian(ffunc_re, order=4)
+    Jfunc_im = nd.Jacobian(ffunc_im, order=4)
+    return Jfunc_re(pars), Jfunc_im(pars)
+
+
+def test_derivatives(setup):
+    obj = setup['obj']
+    for pars in setup['p']:
+        J_re, J_im = _numerical_jacobian(obj, pars)
+
+        # sigmai
+        assert np.allclose(J_re[:, 0], obj.dre_dsigmai(pars).squeeze())
+        assert np.allclose(J_im[:, 0], obj.dim_dsigmai(pars).squeeze())
+
+        # m
+        assert np.allclose(J_re[:, 1], obj.dre_dm(pars).squeeze())
+        assert np.allclose(J_im[:, 1], obj.dim_dm(pars).squeeze())
+
+        # tau
+        assert np.allclose(J_re[:, 2], obj.dre_dtau(pars).squeeze())
+        assert np.allclose(J_im[:, 2], obj.dim_dtau(pars).squeeze())
+
+        # c
+        assert np.allclose(J_re[:, 3], obj.dre_dc(pars).squeeze())
+        assert np.allclose(J_im[:, 3], obj.dim_dc(pars).squeeze())
+
+
+def test_jacobian(setup):
+    obj = setup['obj']
+    nr_f = setup['f'].size
+    pars_2t = [0.01, 0.1, 0.2, 0.04, 0.4, 0.5, 0.8]
+    for pars in setup['p'] + [pars_2t]:
+        nr_pars = len(pars)
+        J_re, J_im = _numerical_jacobian(obj, pars)
+
+        J = obj.Jacobian_re_im(pars)
+        assert J.shape == (nr_f, 2 * nr_pars)
+        assert np.allclose(J[:, 0:nr_pars], J_re)
+        assert np.allclose(J[:, nr_pars:], J_im)
+
+        J_stacked = obj.Jacobian_re_im(pars, stacked=True)
+        assert J_stacked.shape == (2 * nr_f, nr_pars)
+        assert np.allclose(J_stacked, np.vstack((J_re, J_im)))
+
+        out = np.empty((2 * nr_f, nr_pars))
+        J_out = obj.Jacobian_re_im(pars, stacked=True, out=out)
+        assert J_out is out
+        assert np.allclose(out, J_stacked)
+
+
+def test_jacobian_log10(setup):
+    obj = setup['obj']
+    for pars in setup['p']:
+        pars = np.array(pars)
+        log10 = np.array([True, True, True, False])
+
+        def ffunc(pars_log):
+            """reparameterize the response for log10(sigmai, m, tau)"""
+            pars_lin = pars_log.copy()
+            pars_lin[log10] = 10 ** pars_lin[log10]
+            response = obj.response(pars_lin)
+            return np.hstack((response.cre, response.cim))
+
+        pars_log = pars.copy()
+        pars_log[log10] = np.log10(pars_log[log10])
+        J_num = nd.Jacobian(ffunc, order=4)(pars_log)
+
+        J = obj.Jacobian_re_im(pars, stacked=True, log10=log10)
+        assert np.allclose(J, J_num)
+
+        # compare with the individual log10 derivatives
+        J_all = obj.Jacobian_re_im(pars, stacked=True, log10=True)
+        nr_f = setup['f'].size
+        assert np.allclose(J_all[0:nr_f, 0], obj.dre_dlog10sigmai(pars))
+        assert np.allclose(J_all[nr_f:, 0], obj.dim_dlog10sigmai(pars))
+        assert np.allclose(J_all[0:nr_f, 2], obj.dre_dlog10tau(pars)[:, 0])
+        assert np.allclose(J_all[nr_f:, 2], obj.dim_dlog10tau(pars)[:, 0])
+
+
+def test_thread_safety(setup):
+    """One model object is shared by many threads, each evaluating parameter
+    sets with different numbers of terms"""
+    obj = setup['obj']
+    pars_2t = [0.01, 0.1, 0.2, 0.04, 0.4, 0.5, 0.8]
+    parameter_sets = (setup['p'] + [pars_2t]) * 20
+
+    def evaluate(pars):
+        return (
+            obj.response(pars).ccomplex,
+            obj.Jacobian_re_im(pars),
+        )
+
+    serial = [evaluate(pars) for pars in parameter_sets]
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        threaded = list(executor.map(evaluate, parameter_sets))
+
+    for (response_s, J_s), (response_t, J_t) in zip(serial, threaded):
+        assert np.array_equal(response_s, response_t)
+        assert np.array_equal(J_s, J_t)
+
+
+def test_jacobian_batch(setup):
+    obj = setup['obj']
+    parameters = [
+        [0.01, 0.1, 0.2, 0.04, 0.4, 0.5, 0.8],
+        [0.001, 0.3, 0.1, 0.4, 0.01, 0.6, 0.5],
+    ]
+    log10 = [True, False, False, True, True, False, False]
+    for stacked in (False, True):
+        J = obj.Jacobian_re_im_batch(
+            parameters, stacked=stacked, log10=log10)
+        for index, pars in enumerate(parameters):
+            assert np.allclose(
+                J[index],
+                obj.Jacobian_re_im(pars, stacked=stacked, log10=log10)
+            )
+
+
+def test_intermediates_cache(setup):
+    obj = setup['obj']
+    obj_cached = cc.cc(setup['f'], cache_size=4)
+    pars = [0.01, 0.1, 0.2, 0.04, 0.4, 0.5, 0.8]
+    for repeat in range(2):
+        assert np.allclose(
+            obj_cached.response(pars).ccomplex, obj.response(pars).ccomplex
+        )
+        assert np.allclose(
+            obj_cached.Jacobian_re_im(pars, log10=True),
+            obj.Jacobian_re_im(pars, log10=True)
+        )
+        assert np.allclose(obj_cached.dim_dc(pars), obj.dim_dc(pars))
+    assert obj_cached.cache_misses == 1
+    assert obj_cached.cache_hits == 5
+
+
+def test_jacobian_complex(setup):
+    """The complex derivatives agree with the per-component methods"""
+    obj = setup['obj']
+    pars_2t = [0.01, 0.1, 0.2, 0.04, 0.4, 0.5, 0.8]
+    for pars in setup['p'] + [pars_2t]:
+        J = obj.Jacobian_complex(pars)
+        assert np.allclose(J[:, 0].real, obj.dre_dsigmai(pars))
+        assert np.allclose(J[:, 0].imag, obj.dim_dsigmai(pars))
+        blocks = np.split(J[:, 1:], 3, axis=1)
+        for block, name in zip(blocks, ('m', 'tau', 'c')):
+            assert np.allclose(block.real, getattr(obj, 'dre_d' + name)(pars))
+            assert np.allclose(block.imag, getattr(obj, 'dim_d' + name)(pars))
+
+        J_log10 = obj.Jacobian_complex(pars, log10=True)
+        assert np.allclose(J_log10, J * np.log(10) * np.array(pars))
+
+
+def test_jacobian_logmag_pha(setup, central_differences):
+    obj = setup['obj']
+    pars_2t = [0.01, 0.1, 0.2, 0.04, 0.4, 0.5, 0.8]
+    for pars in setup['p'] + [pars_2t]:
+        nr_pars = len(pars)
+        J_logmag = central_differences(
+            lambda x: np.log(obj.response(x).cmag), pars)
+        J_pha = central_differences(lambda x: obj.response(x).cpha, pars)
+
+        J = obj.Jacobian_logmag_pha(pars)
+        assert np.allclose(J[:, 0:nr_pars], J_logmag, rtol=1e-4, atol=1e-5)
+        assert np.allclose(J[:, nr_pars:], J_pha, rtol=1e-4, atol=1e-5)
+
+        J_log10 = obj.Jacobian_logmag_pha(pars, stacked=True, log10=True)
+        scaling = np.log(10) * np.array(pars)
+        assert np.allclose(
+            J_log10, obj.Jacobian_logmag_pha(pars, stacked=True) * scaling
+        )
+
+
+def test_incremental(setup):
+    obj = setup['obj']
+    inc = obj.incremental()
+    pars = np.array([0.01, 0.1, 0.2, 0.3, 0.04, 0.001, 10, 0.4, 0.8, 0.6])
+    log10 = [True, True, True, True, True, True, True, False, False, False]
+
+    def check(pars):
+        assert np.allclose(
+            inc.response(pars).ccomplex, obj.response(pars).ccomplex)
+        for stacked in (False, True):
+            assert np.allclose(
+                inc.Jacobian_re_im(pars, stacked=stacked),
+                obj.Jacobian_re_im(pars, stacked=stacked))
+        assert np.allclose(
+            inc.Jacobian_re_im(pars, log10=log10),
+            obj.Jacobian_re_im(pars, log10=log10))
+
+    check(pars)
+    assert inc.term_updates == 3
+
+    # change the second term only
+    pars[2] *= 1.1
+    pars[5] *= 2
+    check(pars)
+    assert inc.term_updates == 4
+
+    # the first parameter does not require term updates
+    pars[0] *= 2
+    check(pars)
+    assert inc.term_updates == 4
+
+    inc.reset()
+    check(pars)
+    assert inc.term_updates == 7
+
+    # the per-term functions yield the response
+    terms = cc_kernels.terms(obj.omega, pars[4:7], pars[7:10])
+    assert terms.shape == (obj.omega.size, 3)
+    assert np.allclose(
+        pars[0] * (1 - np.dot(terms, pars[1:4])),
+        obj.response(pars).ccomplex)
+
+
+def test_workspace(setup):
+    """With output arrays and a workspace, repeated evaluations do not
+    allocate any frequency-sized arrays. NumPy's iteration buffers are
+    bounded independently of the number of frequencies."""
+    f = np.logspace(-3, 4, 50000)
+    obj = cc.cc(f)
+    pars = np.array([0.01, 0.1, 0.2, 0.04, 0.001, 0.5, 0.8])
+    ws = obj.create_workspace()
+    ccomplex = np.empty(f.size, dtype=complex)
+    J = np.empty((2 * f.size, pars.size))
+    dre_dc = np.empty((f.size, 2))
+    dim_dsigmai = np.empty(f.size)
+
+    def iteration(workspace=None):
+        obj.response(pars, out=ccomplex, workspace=workspace)
+        obj.Jacobian_re_im(
+            pars, stacked=True, out=J, log10=True, workspace=workspace)
+        obj.dre_dc(pars, out=dre_dc, workspace=workspace)
+        obj.dim_dsigmai(pars, out=dim_dsigmai, workspace=workspace)
+
+    iteration(ws)
+    assert np.allclose(ccomplex, obj.response(pars).ccomplex)
+    assert np.allclose(J, obj.Jacobian_log10_re_im(pars, stacked=True))
+    assert np.allclose(dre_dc, obj.dre_dc(pars))
+    assert np.allclose(dim_dsigmai, obj.dim_dsigmai(pars))
+    buffers = dict(ws._buffers)
+
+    tracemalloc.start()
+    iteration(ws)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    assert peak < f.size * 8
+    # the buffers of the workspace are reused
+    assert len(ws._buffers) == len(buffers)
+    assert all(ws._buffers[key] is buffers[key] for key in buffers)
+
+    # without workspace, the intermediate terms are allocated
+    tracemalloc.start()
+    iteration()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    assert peak > 4 * f.size * 8
+
+    with pytest.raises(Exception):
+        obj.dre_dc(pars, out=np.empty(f.size))
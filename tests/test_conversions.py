@@ -0,0 +1,57 @@
+# test the vectorized format conversions
+# *-* coding: utf-8 *-*
+import pytest
+
+import numpy as np
+
+import sip_models.conversions as conversions
+
+
+@pytest.fixture
+def setup():
+    s = {}
+    rng = np.random.RandomState(0)
+    shape = (3, 4, 20)
+    s['rcomplex'] = rng.uniform(1, 100, shape) - 1j * rng.uniform(
+        0, 10, shape)
+    return s
+
+
+def test_conversions(setup):
+    rcomplex = setup['rcomplex']
+    ccomplex = conversions.reciprocal(rcomplex)
+    assert np.allclose(ccomplex, 1 / rcomplex)
+
+    mag_pha = conversions.mag_pha(rcomplex)
+    assert mag_pha.shape == rcomplex.shape + (2, )
+    assert np.allclose(mag_pha[..., 0], np.abs(rcomplex))
+    assert np.allclose(mag_pha[..., 1], np.angle(rcomplex) * 1000)
+    assert np.allclose(
+        conversions.reciprocal_mag_pha(mag_pha),
+        conversions.mag_pha(ccomplex))
+    assert np.allclose(conversions.from_mag_pha(mag_pha), rcomplex)
+
+    re_im = conversions.re_im(rcomplex)
+    assert np.allclose(re_im[..., 0], rcomplex.real)
+    assert np.allclose(re_im[..., 1], rcomplex.imag)
+    assert np.allclose(conversions.from_re_im(re_im), rcomplex)
+
+    # one spectrum and lists
+    assert np.allclose(
+        conversions.mag_pha(list(rcomplex[0, 0]))[:, 0],
+        np.abs(rcomplex[0, 0]))
+
+
+def test_conversions_out(setup):
+    rcomplex = setup['rcomplex']
+    out = np.empty(rcomplex.shape + (2, ))
+    assert conversions.mag_pha(rcomplex, out=out) is out
+    assert conversions.reciprocal_mag_pha(out, out=out) is out
+    assert np.allclose(out, conversions.mag_pha(1 / rcomplex))
+
+    data = rcomplex.copy()
+    assert conversions.reciprocal(data, out=data) is data
+    assert np.allclose(data, 1 / rcomplex)
+
+    with pytest.raises(Exception):
+        conversions.re_im(rcomplex, out=np.empty(rcomplex.shape))
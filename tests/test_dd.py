@@ -0,0 +1,104 @@
+# test Debye decomposition
+# *-* coding: utf-8 *-*
+import pytest
+
+import numpy as np
+
+import sip_models.res.cc as cc_res
+import sip_models.cond.cc as cc_cond
+import sip_models.res.dd as dd_res
+import sip_models.cond.dd as dd_cond
+
+
+@pytest.fixture
+def setup():
+    s = {}
+    s['f'] = np.logspace(-3, 3, 20)
+    return s
+
+
+def test_kernel_cache(setup):
+    obj = dd_res.dd(setup['f'])
+    obj2 = dd_res.dd(setup['f'].copy())
+    assert obj.kernel is obj2.kernel
+    assert obj.kernel.shape == (setup['f'].size, obj.tau.size)
+    assert not obj.kernel.flags.writeable
+
+    # different formulations and c values use different kernels
+    assert dd_cond.dd(setup['f']).kernel is not obj.kernel
+    assert dd_res.warburg(setup['f']).kernel is not obj.kernel
+
+
+def test_response(setup):
+    """a decomposition with only one nonzero chargeability is a Cole-Cole
+    model"""
+    tau = np.logspace(-4, 2, 7)
+    for dd, cc, x0 in ((dd_res, cc_res, 100), (dd_cond, cc_cond, 0.01)):
+        obj = dd.dd(setup['f'], tau=tau, c=0.8)
+        m = np.zeros(tau.size)
+        m[3] = 0.1
+        response = obj.response(np.hstack((x0, m)))
+        response_cc = cc.cc(setup['f']).response([x0, 0.1, tau[3], 0.8])
+        assert np.allclose(response.rcomplex, response_cc.rcomplex)
+
+    with pytest.raises(Exception):
+        obj.response([100, 0.1])
+
+
+def test_fit(setup):
+    pars = [100, 0.1, 0.04, 0.6]
+    data = cc_res.cc(setup['f']).response(pars).rcomplex
+    obj = dd_res.dd(setup['f'])
+    result = obj.fit(data, lam=1e-3)
+    assert np.isclose(result['rho0'], 100, rtol=1e-3)
+    assert np.isclose(result['m_tot'], 0.1, rtol=1e-2)
+    assert np.isclose(result['tau_mean'], 0.04, rtol=0.1)
+    assert result['m'].size == obj.tau.size
+    assert np.allclose(
+        obj.response(result['parameters']).rcomplex, data, rtol=1e-4
+    )
+
+    pars = [0.01, 0.1, 0.04, 0.6]
+    data = cc_cond.cc(setup['f']).response(pars).ccomplex
+    obj = dd_cond.dd(setup['f'])
+    weights = 1 / np.abs(np.hstack((data.real, data.imag)))
+    result = obj.fit(data, lam=1e-2, weights=weights)
+    assert np.isclose(result['sigmai'], 0.01, rtol=1e-3)
+    assert np.isclose(result['m_tot'], 0.1, rtol=1e-2)
+
+
+def test_lcurve(setup):
+    pars = [100, 0.1, 0.04, 0.6]
+    data = cc_res.cc(setup['f']).response(pars).rcomplex
+    rng = np.random.RandomState(1)
+    data += 0.05 * (rng.randn(data.size) + 1j * rng.randn(data.size))
+    obj = dd_res.dd(setup['f'])
+
+    lambdas = np.logspace(-3, 3, 13)
+    lcurve = obj.lcurve(data, lambdas=lambdas)
+    assert lcurve['lam'] == lcurve['lam_gcv']
+    assert lcurve['lam_gcv'] == lambdas[np.argmin(lcurve['gcv'])]
+    assert lcurve['lam_lcurve'] in lambdas
+    assert np.all(np.diff(lcurve['residual_norms']) >= 0)
+    assert np.all(np.diff(lcurve['solution_norms']) <= 0)
+
+    # the sweep agrees with individual fits
+    for index in (0, 6, 12):
+        result = obj.fit(data, lam=lambdas[index])
+        assert np.isclose(
+            lcurve['residual_norms'][index],
+            np.sqrt(2 * data.size) * result['rms']
+        )
+    result = obj.fit(data, lam=lcurve['lam'])
+    assert np.allclose(result['parameters'], lcurve['fit']['parameters'])
+    assert np.isclose(result['rho0'], 100, rtol=1e-3)
+
+    # the factorization is computed once
+    assert len(obj._factorizations) == 1
+
+    lcurve = obj.lcurve(data, criterion='lcurve')
+    assert lcurve['lam'] == lcurve['lam_lcurve']
+    assert lcurve['lambdas'].size == 50
+
+    with pytest.raises(Exception):
+        obj.lcurve(data, criterion='unknown')
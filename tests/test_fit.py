@@ -0,0 +1,233 @@
+# test the Levenberg-Marquardt fit
+# *-* coding: utf-8 *-*
+import tracemalloc
+
+import pytest
+
+import numpy as np
+
+import sip_models.res.cc as cc_res
+import sip_models.cond.cc as cc_cond
+import sip_models.fit as fit
+
+
+@pytest.fixture
+def setup():
+    s = {}
+    s['f'] = np.logspace(-3, 3, 20)
+    s['res'] = cc_res.cc(s['f'])
+    s['cond'] = cc_cond.cc(s['f'])
+    return s
+
+
+def test_fit_res(setup):
+    obj = setup['res']
+    pars_true = np.array([100, 0.1, 0.04, 0.6])
+    data = obj.response(pars_true).rcomplex
+
+    for log10 in (False, [True, True, True, False]):
+        result = fit.fit_lm(
+            obj, data, [80, 0.2, 0.01, 0.5], log10=log10,
+        )
+        assert result['converged']
+        assert np.allclose(result['parameters'], pars_true, rtol=1e-4)
+        assert result['rms'] < 1e-6
+        assert result['covariance'].shape == (4, 4)
+
+
+def test_fit_res_two_terms(setup):
+    obj = setup['res']
+    pars_true = np.array([100, 0.1, 0.2, 10, 0.001, 0.6, 0.8])
+    data = obj.response(pars_true).rcomplex
+    result = fit.fit_lm(
+        obj, data, [90, 0.15, 0.15, 5, 0.01, 0.5, 0.5],
+        log10=[True, True, True, True, True, False, False],
+    )
+    assert np.allclose(result['parameters'], pars_true, rtol=1e-4)
+
+
+def test_fit_cond(setup):
+    obj = setup['cond']
+    pars_true = np.array([0.01, 0.1, 0.04, 0.6])
+    data = obj.response(pars_true).ccomplex
+
+    # weight by the inverse data magnitude
+    weights = 1 / np.abs(np.hstack((data.real, data.imag)))
+    result = fit.fit_lm(
+        obj, data, [0.008, 0.2, 0.1, 0.5], weights=weights,
+        log10=[True, True, True, False],
+    )
+    assert result['converged']
+    assert np.allclose(result['parameters'], pars_true, rtol=1e-4)
+
+
+def test_fit_noise_covariance(setup):
+    obj = setup['res']
+    pars_true = np.array([100, 0.1, 0.04, 0.6])
+    data = obj.response(pars_true).rcomplex
+    rng = np.random.RandomState(42)
+    noise = 0.01 * (rng.randn(data.size) + 1j * rng.randn(data.size))
+    result = fit.fit_lm(obj, data + noise, pars_true)
+
+    assert np.isclose(result['rms'], 0.01, rtol=0.5)
+    std = np.sqrt(np.diag(result['covariance']))
+    # fitted parameters are consistent with the true ones
+    assert np.all(np.abs(result['parameters'] - pars_true) < 5 * std)
+
+
+def test_fit_exact_start(setup):
+    obj = setup['res']
+    pars_true = [100, 0.1, 0.04, 0.6]
+    data = obj.response(pars_true).rcomplex
+    result = fit.fit_lm(obj, data, pars_true)
+    assert result['converged']
+    assert result['iterations'] == 0
+    assert result['rms'] == 0
+
+
+def test_fit_invalid_start(setup):
+    obj = setup['res']
+    data = obj.response([100, 0.1, 0.04, 0.6]).rcomplex
+    # a negative tau yields a NaN misfit, no update can be accepted
+    initial = [80, 0.2, -0.01, 0.5]
+    result = fit.fit_lm(obj, data, initial)
+    assert not result['converged']
+    assert result['iterations'] == 0
+    assert np.isnan(result['rms'])
+    assert np.allclose(result['parameters'], initial)
+
+
+def test_fit_iteration_allocations():
+    """residuals and Jacobian of a fit iteration are computed into the
+    buffers of fit_lm, without allocating frequency-sized arrays"""
+    nr_f = 50000
+    obj = cc_res.cc(np.logspace(-3, 3, nr_f))
+    pars = np.array([100, 0.1, 0.04, 0.6])
+    data = obj.response(pars).rcomplex
+    log10 = np.array([True, True, True, False])
+    residuals = np.empty(2 * nr_f)
+    forward = np.empty(nr_f, dtype=complex)
+    J = np.empty((2 * nr_f, 4))
+    workspace = obj.create_workspace()
+
+    def iteration(parameters):
+        fit._compute_residuals(
+            obj, parameters, data, None, residuals, forward, workspace)
+        fit._compute_jacobian(obj, parameters, log10, None, J, workspace)
+
+    iteration(pars)
+    tracemalloc.start()
+    iteration(pars * 1.01)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    assert peak < nr_f * 8
+
+
+def test_fit_batch(setup):
+    obj = setup['res']
+    pars_true = np.array([
+        [100, 0.1, 0.04, 0.6],
+        [120, 0.12, 0.05, 0.6],
+        [140, 0.14, 0.06, 0.55],
+        [160, 0.16, 0.1, 0.5],
+        [200, 0.2, 0.2, 0.5],
+    ])
+    data = obj.response_batch(pars_true)
+    log10 = [True, True, True, False]
+
+    calls = []
+
+    def progress(nr_finished, nr_spectra):
+        calls.append((nr_finished, nr_spectra))
+
+    for processes, warm_start in ((1, False), (2, True)):
+        del calls[:]
+        results = fit.fit_batch(
+            cc_res.cc, setup['f'], data, [80, 0.2, 0.01, 0.5],
+            log10=log10, processes=processes, chunksize=2,
+            warm_start=warm_start, progress=progress,
+        )
+        assert results.shape == (5, )
+        assert results['parameters'].shape == (5, 4)
+        assert results['covariance'].shape == (5, 4, 4)
+        assert np.all(results['converged'])
+        assert np.allclose(results['parameters'], pars_true, rtol=1e-4)
+        assert len(calls) == 3
+        assert calls[-1] == (5, 5)
+        # the serial fit keeps no model or settings in the calling process
+        assert fit._worker_state == {}
+
+    # initial parameters for each spectrum
+    results = fit.fit_batch(
+        cc_cond.cc, setup['f'], setup['cond'].response_batch([
+            [0.01, 0.1, 0.04, 0.6],
+            [0.02, 0.1, 0.04, 0.6],
+        ]),
+        [[0.008, 0.2, 0.1, 0.5], [0.015, 0.2, 0.1, 0.5]],
+        log10=log10, processes=1,
+    )
+    assert np.allclose(results['parameters'][:, 0], [0.01, 0.02])
+
+
+def test_fit_batch_failed_warm_start(setup):
+    obj = setup['res']
+    pars_true = np.array([
+        [100, 0.1, 0.04, 0.6],
+        [5000, 0.8, 50, 0.2],
+        [100, 0.1, 0.04, 0.6],
+    ])
+    data = obj.response_batch(pars_true)
+    # the warm start from the first spectrum cannot fit the distant second
+    # spectrum in 3 iterations, the fallback to its (exact) initial
+    # parameters can
+    results = fit.fit_batch(
+        cc_res.cc, setup['f'], data, pars_true,
+        log10=[True, True, True, False], processes=1, warm_start=True,
+        max_iterations=3,
+    )
+    assert np.all(results['converged'])
+    assert np.allclose(results['parameters'], pars_true, rtol=1e-4)
+
+    # a failed warm start is not passed on to the next spectrum
+    data[1] = np.nan
+    results = fit.fit_batch(
+        cc_res.cc, setup['f'], data, pars_true * 1.01,
+        log10=[True, True, True, False], processes=1, warm_start=True,
+    )
+    assert list(results['converged']) == [True, False, True]
+    assert np.allclose(results['parameters'][2], pars_true[2], rtol=1e-4)
+
+
+def test_uncertainties_batch(setup):
+    obj = setup['res']
+    pars_true = np.array([
+        [100, 0.1, 0.04, 0.6],
+        [200, 0.2, 0.2, 0.5],
+    ])
+    rng = np.random.RandomState(42)
+    data = obj.response_batch(pars_true)
+    data += 0.01 * (rng.randn(*data.shape) + 1j * rng.randn(*data.shape))
+    log10 = [True, True, True, False]
+    results = fit.fit_batch(
+        cc_res.cc, setup['f'], data, pars_true, log10=log10, processes=1)
+
+    uncertainties = fit.uncertainties_batch(
+        obj, results['parameters'], data, log10=log10)
+    assert uncertainties['covariance'].shape == (2, 4, 4)
+    assert uncertainties['std'].shape == (2, 4)
+    # identical to the covariances of the single-spectrum fits
+    assert np.allclose(
+        uncertainties['covariance'], results['covariance'], rtol=1e-6)
+    correlation = uncertainties['correlation']
+    assert np.allclose(np.diagonal(correlation, axis1=1, axis2=2), 1)
+    assert np.allclose(correlation, np.swapaxes(correlation, 1, 2))
+
+    # without data: unscaled inverse of J^T W J
+    weights = np.full(2 * setup['f'].size, 2.0)
+    uncertainties = fit.uncertainties_batch(
+        obj, pars_true, log10=log10, weights=weights)
+    J = obj.Jacobian_re_im(pars_true[0], stacked=True, log10=log10)
+    JTWJ = 4 * np.dot(J.T, J)
+    assert np.allclose(uncertainties['JTWJ'][0], JTWJ)
+    assert np.allclose(
+        uncertainties['covariance'][0], np.linalg.inv(JTWJ), rtol=1e-6)
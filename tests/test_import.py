@@ -0,0 +1,69 @@
+# test the import time of the model modules
+# *-* coding: utf-8 *-*
+import os
+import subprocess
+import sys
+
+# maximum import time of the model modules [s]: the modules import in
+# about 0.05 s, importing matplotlib eagerly would add about 0.7 s
+IMPORT_BUDGET = 0.3
+
+MODULES = (
+    'sip_models.res.cc',
+    'sip_models.cond.cc',
+    'sip_models.res.dd',
+    'sip_models.cond.dd',
+    'sip_models.fit',
+    'sip_models.sip_response',
+)
+
+
+def _run_python(code):
+    """Run code in a fresh interpreter and return its output"""
+    env = dict(os.environ)
+    env['PYTHONPATH'] = os.pathsep.join(sys.path)
+    # do not depend on a LaTeX installation for the plotting test
+    env['DD_USE_LATEX'] = '0'
+    output = subprocess.check_output(
+        [sys.executable, '-c', code], env=env
+    )
+    return output.decode('utf-8').strip()
+
+
+def test_import_without_matplotlib():
+    """the model modules must not import matplotlib"""
+    code = '; '.join([
+        'import sys',
+        'import numpy',
+    ] + ['import {}'.format(module) for module in MODULES] + [
+        'print("matplotlib" in sys.modules)',
+    ])
+    assert _run_python(code) == 'False'
+
+
+def test_import_time():
+    # numpy is imported beforehand, the budget only covers our modules
+    code = '; '.join([
+        'import time',
+        'import numpy',
+        't0 = time.time()',
+    ] + ['import {}'.format(module) for module in MODULES] + [
+        'print(time.time() - t0)',
+    ])
+    duration = float(_run_python(code))
+    assert duration < IMPORT_BUDGET
+
+
+def test_plotting_is_set_up_on_first_use():
+    code = '; '.join([
+        'import sys',
+        'import numpy as np',
+        'import sip_models.res.cc as cc',
+        'import sip_models.sip_response as sip_response',
+        'assert sip_response.plt is None',
+        'obj = cc.cc(np.logspace(-3, 3, 20))',
+        'fig, axes = obj.response([100, 0.1, 0.04, 0.6])._plot(dtype="R")',
+        'assert sip_response.plt is not None',
+        'print("matplotlib" in sys.modules)',
+    ])
+    assert _run_python(code) == 'True'
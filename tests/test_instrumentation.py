@@ -0,0 +1,143 @@
+# test the opt-in instrumentation of the model methods
+# *-* coding: utf-8 *-*
+import os
+import pstats
+import subprocess
+import sys
+
+import pytest
+
+import numpy as np
+
+import sip_models.cond.cc as cc_cond
+import sip_models.res.cc as cc_res
+import sip_models.res.cc_kernels as cc_kernels
+import sip_models.sip_response as sip_response
+import sip_models.instrumentation as instrumentation
+
+
+@pytest.fixture
+def setup():
+    s = {}
+    s['f'] = np.logspace(-3, 3, 20000)
+    s['obj'] = cc_res.cc(s['f'])
+    s['pars'] = [100, 0.1, 0.04, 0.6]
+    yield s
+    instrumentation.disable()
+    instrumentation.reset()
+
+
+def _rows(label_prefix=''):
+    return {
+        row['label']: row for row in instrumentation.summary()
+        if row['label'].startswith(label_prefix)
+    }
+
+
+def test_disabled_by_default(setup):
+    assert not instrumentation.is_enabled()
+    original = cc_kernels._intermediates
+    setup['obj'].response(setup['pars'])
+    assert cc_kernels._intermediates is original
+    assert instrumentation.summary() == []
+
+
+def test_counts_and_times(setup):
+    obj = setup['obj']
+    originals = (
+        cc_kernels._intermediates,
+        cc_res.cc.Jacobian_re_im,
+        sip_response._representations.__dict__['rmag'].func,
+    )
+    with instrumentation.enabled():
+        assert cc_kernels._intermediates is not originals[0]
+        # inherited methods are patched in the class itself
+        assert 'Jacobian_re_im' in cc_res.cc.__dict__
+        for _ in range(3):
+            obj.response(setup['pars']).rmag
+        obj.Jacobian_re_im(setup['pars'])
+
+    # the original functions are restored
+    assert cc_kernels._intermediates is originals[0]
+    assert 'Jacobian_re_im' not in cc_res.cc.__dict__
+    assert cc_res.cc.Jacobian_re_im is originals[1]
+    assert sip_response._representations.__dict__['rmag'].func is originals[2]
+
+    rows = _rows()
+    assert rows['res.cc.response']['calls'] == 3
+    assert rows['res.cc_kernels.response']['calls'] == 3
+    assert rows['sip_response.rmag']['calls'] == 3
+    assert rows['res.cc.Jacobian_re_im']['calls'] == 1
+    assert rows['res.cc_kernels._fill_jacobian']['calls'] == 1
+    for row in rows.values():
+        assert 0 <= row['internal'] <= row['cumulative']
+    # the time of the kernel is contained in the time of the method
+    assert rows['res.cc.response']['cumulative'] >= \
+        rows['res.cc_kernels.response']['cumulative']
+    assert rows['res.cc.response']['internal'] < \
+        rows['res.cc.response']['cumulative']
+
+    # nothing is recorded after disabling
+    obj.response(setup['pars'])
+    assert _rows()['res.cc.response']['calls'] == 3
+
+
+def test_shared_methods(setup):
+    # both formulations inherit the method from cc_common.cc_base, but are
+    # recorded separately
+    obj_cond = cc_cond.cc(setup['f'])
+    with instrumentation.enabled():
+        setup['obj'].response(setup['pars'])
+        obj_cond.response(setup['pars'])
+        obj_cond.response(setup['pars'])
+    rows = _rows()
+    assert rows['res.cc.response']['calls'] == 1
+    assert rows['cond.cc.response']['calls'] == 2
+    assert rows['cond.cc_kernels.response']['calls'] == 2
+    assert 'response' not in cc_cond.cc.__dict__
+
+
+def test_memory(setup):
+    obj = setup['obj']
+    nr_f = setup['f'].size
+    with instrumentation.enabled(memory=True):
+        obj.Jacobian_re_im(setup['pars'])
+    rows = _rows()
+    # the Jacobian itself: N x 8 floats
+    assert rows['res.cc.Jacobian_re_im']['memory'] >= nr_f * 8 * 8
+    assert rows['res.cc.Jacobian_re_im']['memory'] >= \
+        rows['res.cc_kernels._fill_jacobian']['memory']
+
+
+def test_report_and_dump(setup, tmpdir):
+    with instrumentation.enabled():
+        setup['obj'].response(setup['pars'])
+    lines = instrumentation.report().splitlines()
+    assert lines[0].split()[0:2] == ['function', 'calls']
+    labels = [line.split()[0] for line in lines[1:]]
+    assert 'res.cc_kernels.response' in labels
+
+    filename = str(tmpdir.join('stats.prof'))
+    instrumentation.dump_stats(filename)
+    stats = pstats.Stats(filename).stats
+    functions = {key[2]: value for key, value in stats.items()}
+    assert functions['res.cc.response'][0] == 1
+    # the kernel was called by the method
+    callers = functions['res.cc_kernels.response'][4]
+    assert [key[2] for key in callers] == ['res.cc.response']
+
+
+def test_environment_variable():
+    env = dict(os.environ)
+    env['PYTHONPATH'] = os.pathsep.join(sys.path)
+    env['SIP_MODELS_INSTRUMENT'] = '1'
+    code = '; '.join([
+        'import numpy as np',
+        'import sip_models.res.cc as cc',
+        'cc.cc(np.logspace(-3, 3, 20)).response([100, 0.1, 0.04, 0.6])',
+    ])
+    output = subprocess.run(
+        [sys.executable, '-c', code], env=env, stderr=subprocess.PIPE,
+        check=True,
+    ).stderr.decode('utf-8')
+    assert 'res.cc.response' in output
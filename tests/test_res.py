@@ -1,11 +1,14 @@
 # test resistivity model
 # *-* coding: utf-8 *-*
 import pytest
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
 
 import numpy as np
 import numdifftools as nd
 
 import sip_models.res.cc as cc
+import sip_models.res.cc_kernels as cc_kernels
 
 
 @pytest.fixture
@@ -56,11 +59,6 @@ def setup():
     return s
 
 
-def test_make_list(setup):
-    assert isinstance(cc._make_list(4), list)
-    assert isinstance(cc._make_list([4, ]), list)
-
-
 def test_sort_parameters(setup):
     """this is just a simple test to make sure the different inputs don't lead
     to crashes"""
@@ -88,6 +86,29 @@ def test_sort_parameters(setup):
         obj._sort_parameters(None)
 
 
+def test_dict_array_parameters(setup):
+    """dicts with array values give the same results as lists"""
+    obj = setup['obj']
+    for pars in ([100, 0.1, 0.04, 0.8],
+                 [100, 0.1, 0.2, 0.04, 0.004, 0.6, 0.8]):
+        nr_terms = (len(pars) - 1) // 3
+        pars_dict = {
+            'rho0': pars[0],
+            'm': np.array(pars[1:nr_terms + 1]),
+            'tau': np.array(pars[nr_terms + 1:2 * nr_terms + 1]),
+            'c': np.array(pars[2 * nr_terms + 1:]),
+        }
+        assert np.allclose(
+            obj.response(pars_dict).rcomplex, obj.response(pars).rcomplex)
+        J = obj.Jacobian_re_im(pars_dict)
+        assert J.shape == (setup['f'].size, 2 * len(pars))
+        assert np.allclose(J, obj.Jacobian_re_im(pars))
+
+    with pytest.raises(Exception):
+        obj.Jacobian_re_im({
+            'rho0': 100, 'm': [[0.1]], 'tau': [[0.04]], 'c': [[0.8]]})
+
+
 def test_response(setup):
     obj = setup['obj']
     for nr, pars in enumerate(setup['p']):
@@ -241,3 +262,365 @@ def test_derivates(setup):
             Jfunc_im(pars),
             obj.Jacobian_re_im(pars)[:, 4:8]
         )
+
+
+def test_response_batch(setup):
+    obj = setup['obj']
+    pars = np.array(setup['p'])
+    rcomplex = obj.response_batch(pars)
+    assert rcomplex.shape == (2, setup['f'].size)
+    for nr, pars_single in enumerate(setup['p']):
+        assert np.allclose(
+            rcomplex[nr], obj.response(pars_single).rcomplex
+        )
+
+    # dict input with array-valued entries
+    rcomplex_dict = obj.response_batch({
+        'rho0': pars[:, 0],
+        'm': pars[:, 1],
+        'tau': pars[:, 2],
+        'c': pars[:, 3],
+    })
+    assert np.allclose(rcomplex_dict, rcomplex)
+
+    # two-term models
+    pars_2t = np.array([
+        [100, 0.1, 0.2, 0.04, 0.0001, 0.4, 0.8],
+        [50, 0.05, 0.1, 1, 0.001, 0.6, 0.5],
+    ])
+    rcomplex_2t = obj.response_batch(pars_2t)
+    for nr, pars_single in enumerate(pars_2t):
+        assert np.allclose(
+            rcomplex_2t[nr], obj.response(pars_single).rcomplex
+        )
+
+
+def test_jacobian_layouts(setup):
+    obj = setup['obj']
+    nr_f = setup['f'].size
+    pars_2t = [100, 0.1, 0.2, 0.04, 0.0001, 0.4, 0.8]
+    for pars in setup['p'] + [pars_2t]:
+        nr_pars = len(pars)
+        J = obj.Jacobian_re_im(pars)
+        J_stacked = obj.Jacobian_re_im(pars, stacked=True)
+        assert J.shape == (nr_f, 2 * nr_pars)
+        assert J_stacked.shape == (2 * nr_f, nr_pars)
+        assert np.allclose(J_stacked[0:nr_f, :], J[:, 0:nr_pars])
+        assert np.allclose(J_stacked[nr_f:, :], J[:, nr_pars:])
+
+        # compare to the individual partial derivatives
+        nr_terms = int((nr_pars - 1) / 3)
+        partials_re = np.hstack((
+            obj.dre_drho0(pars)[:, np.newaxis],
+            obj.dre_dm(pars),
+            obj.dre_dtau(pars),
+            obj.dre_dc(pars),
+        ))
+        partials_im = np.hstack((
+            obj.dim_drho0(pars)[:, np.newaxis],
+            obj.dim_dm(pars),
+            obj.dim_dtau(pars),
+            obj.dim_dc(pars),
+        ))
+        assert partials_re.shape[1] == 1 + 3 * nr_terms
+        assert np.allclose(J_stacked[0:nr_f, :], partials_re)
+        assert np.allclose(J_stacked[nr_f:, :], partials_im)
+
+        out = np.empty((2 * nr_f, nr_pars))
+        J_out = obj.Jacobian_re_im(pars, stacked=True, out=out)
+        assert J_out is out
+        assert np.allclose(out, J_stacked)
+
+    with pytest.raises(Exception):
+        obj.Jacobian_re_im(setup['p'][0], out=np.empty((3, 3)))
+
+
+def test_thread_safety(setup):
+    """One model object is shared by many threads, each evaluating parameter
+    sets with different numbers of terms"""
+    obj = setup['obj']
+    pars_2t = [100, 0.1, 0.2, 0.04, 0.0001, 0.4, 0.8]
+    parameter_sets = (setup['p'] + [pars_2t]) * 20
+
+    def evaluate(pars):
+        return (
+            obj.response(pars).rcomplex,
+            obj.Jacobian_re_im(pars),
+        )
+
+    serial = [evaluate(pars) for pars in parameter_sets]
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        threaded = list(executor.map(evaluate, parameter_sets))
+
+    for (response_s, J_s), (response_t, J_t) in zip(serial, threaded):
+        assert np.array_equal(response_s, response_t)
+        assert np.array_equal(J_s, J_t)
+
+
+def test_frequency_cache(setup):
+    obj = setup['obj']
+    assert np.allclose(obj.omega, 2 * np.pi * setup['f'])
+    assert np.allclose(obj.log_omega, np.log(2 * np.pi * setup['f']))
+    assert not obj.omega.flags.writeable
+
+    # the cached terms follow changes of the frequencies
+    obj.f = setup['f'][0:5]
+    assert obj.omega.size == 5
+    response = obj.response(setup['p'][0])
+    assert np.allclose(
+        response.rre, setup['responses'][0]['rre'][0:5]
+    )
+
+
+def test_jacobian_batch(setup):
+    obj = setup['obj']
+    nr_f = setup['f'].size
+    pars_2t = [
+        [100, 0.1, 0.2, 0.04, 0.0001, 0.4, 0.8],
+        [1000, 0.3, 0.1, 0.4, 0.01, 0.6, 0.5],
+    ]
+    for parameters in (setup['p'], pars_2t):
+        nr_pars = len(parameters[0])
+        J = obj.Jacobian_re_im_batch(parameters)
+        J_stacked = obj.Jacobian_re_im_batch(parameters, stacked=True)
+        assert J.shape == (len(parameters), nr_f, 2 * nr_pars)
+        assert J_stacked.shape == (len(parameters), 2 * nr_f, nr_pars)
+        for index, pars in enumerate(parameters):
+            assert np.allclose(J[index], obj.Jacobian_re_im(pars))
+            assert np.allclose(
+                J_stacked[index], obj.Jacobian_re_im(pars, stacked=True)
+            )
+
+    # dict input with scalar broadcasting
+    parameters = {
+        'rho0': [100, 1000],
+        'm': 0.1,
+        'tau': [0.04, 0.1],
+        'c': 0.8,
+    }
+    J = obj.Jacobian_re_im_batch(parameters)
+    assert np.allclose(J[1], obj.Jacobian_re_im([1000, 0.1, 0.1, 0.8]))
+
+
+def test_batch_memory(setup):
+    """The peak memory of the batch computations scales with the size of the
+    output, not with the number of terms"""
+    f = np.logspace(-3, 4, 50)
+    obj = cc.cc(f)
+    nr_spectra = 200
+    for nr_terms in (1, 4):
+        parameters = np.hstack((
+            np.full((nr_spectra, 1), 100.0),
+            np.full((nr_spectra, nr_terms), 0.1),
+            np.tile(np.logspace(-3, 0, nr_terms), (nr_spectra, 1)),
+            np.full((nr_spectra, nr_terms), 0.5),
+        ))
+        out = np.empty((nr_spectra, 2 * f.size, 1 + 3 * nr_terms))
+
+        tracemalloc.start()
+        obj.Jacobian_re_im_batch(parameters, stacked=True, out=out)
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        assert peak < 2 * out.nbytes
+
+        tracemalloc.start()
+        rcomplex = obj.response_batch(parameters)
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        assert peak < 4 * rcomplex.nbytes
+
+
+def test_intermediates_cache(setup):
+    obj = setup['obj']
+    obj_cached = cc.cc(setup['f'], cache_size=2)
+    pars = setup['p'][0]
+
+    response = obj_cached.response(pars)
+    assert obj_cached.cache_misses == 1
+    J = obj_cached.Jacobian_re_im(pars)
+    dre_dc = obj_cached.dre_dc(pars)
+    assert obj_cached.cache_hits == 2
+    assert np.allclose(response.rcomplex, obj.response(pars).rcomplex)
+    assert np.allclose(J, obj.Jacobian_re_im(pars))
+    assert np.allclose(dre_dc, obj.dre_dc(pars))
+
+    # only rho0 differs: the intermediates are shared
+    pars_rho0 = [50] + pars[1:]
+    assert np.allclose(
+        obj_cached.response(pars_rho0).rcomplex,
+        obj.response(pars_rho0).rcomplex
+    )
+    assert obj_cached.cache_hits == 3
+
+    # least recently used entries are evicted
+    obj_cached.response(setup['p'][1])
+    obj_cached.response([100, 0.1, 0.2, 0.04, 0.001, 0.4, 0.8])
+    assert len(obj_cached._cache) == 2
+    obj_cached.response(pars)
+    assert obj_cached.cache_misses == 4
+
+    # setting new frequencies invalidates the cache
+    obj_cached.f = setup['f'][0:5]
+    assert obj_cached.cache_hits == 0
+    assert len(obj_cached._cache) == 0
+    assert obj_cached.response(pars).rcomplex.size == 5
+
+
+def test_jacobian_log10(setup):
+    obj = setup['obj']
+    pars = np.array([100, 0.1, 0.2, 0.04, 0.0001, 0.4, 0.8])
+    J = obj.Jacobian_re_im(pars)
+    J_log10 = obj.Jacobian_log10_re_im(pars)
+    scaling = np.tile(np.log(10) * pars, 2)
+    assert np.allclose(J_log10, J * scaling)
+
+    # selected log10 parameters, compared to the individual derivatives
+    log10 = [True, True, True, True, True, False, False]
+    J_stacked = obj.Jacobian_re_im(pars, stacked=True, log10=log10)
+    nr_f = setup['f'].size
+    assert np.allclose(J_stacked[0:nr_f, 0], obj.dre_dlog10rho0(pars))
+    assert np.allclose(J_stacked[nr_f:, 1:3], obj.dim_dlog10m(pars))
+    assert np.allclose(J_stacked[0:nr_f, 3:5], obj.dre_dlog10tau(pars))
+    assert np.allclose(J_stacked[nr_f:, 5:7], obj.dim_dc(pars))
+
+    J_batch = obj.Jacobian_re_im_batch([pars, pars], log10=True)
+    assert np.allclose(J_batch[1], J_log10)
+
+
+def test_jacobian_complex(setup):
+    """The complex derivatives agree with the per-component methods"""
+    obj = setup['obj']
+    pars_2t = [100, 0.1, 0.2, 0.04, 0.0001, 0.4, 0.8]
+    for pars in setup['p'] + [pars_2t]:
+        J = obj.Jacobian_complex(pars)
+        assert np.allclose(J[:, 0].real, obj.dre_drho0(pars))
+        assert np.allclose(J[:, 0].imag, obj.dim_drho0(pars))
+        blocks = np.split(J[:, 1:], 3, axis=1)
+        for block, name in zip(blocks, ('m', 'tau', 'c')):
+            assert np.allclose(block.real, getattr(obj, 'dre_d' + name)(pars))
+            assert np.allclose(block.imag, getattr(obj, 'dim_d' + name)(pars))
+
+
+def test_jacobian_logmag_pha(setup, central_differences):
+    obj = setup['obj']
+    nr_f = setup['f'].size
+    pars_2t = [100, 0.1, 0.2, 0.04, 0.001, 0.4, 0.8]
+    for pars in setup['p'] + [pars_2t]:
+        J_logmag = central_differences(
+            lambda x: np.log(obj.response(x).rmag), pars)
+        J_pha = central_differences(lambda x: obj.response(x).rpha, pars)
+
+        J = obj.Jacobian_logmag_pha(pars, stacked=True)
+        assert np.allclose(J[0:nr_f], J_logmag, rtol=1e-4)
+        assert np.allclose(J[nr_f:], J_pha, rtol=1e-4)
+
+
+def test_response_and_jacobian_cre_cim(setup, central_differences):
+    obj = setup['obj']
+    nr_f = setup['f'].size
+    pars_2t = [100, 0.1, 0.2, 0.04, 0.001, 0.4, 0.8]
+    for pars in setup['p'] + [pars_2t]:
+        response, J = obj.response_and_Jacobian_cre_cim(pars, stacked=True)
+        assert np.allclose(response.ccomplex, 1 / obj.response(pars).rcomplex)
+
+        J_cre = central_differences(
+            lambda x: (1 / obj.response(x).rcomplex).real, pars)
+        J_cim = central_differences(
+            lambda x: (1 / obj.response(x).rcomplex).imag, pars)
+        assert np.allclose(J[0:nr_f], J_cre, rtol=1e-4, atol=1e-12)
+        assert np.allclose(J[nr_f:], J_cim, rtol=1e-4, atol=1e-12)
+
+        _, J_log10 = obj.response_and_Jacobian_cre_cim(pars, log10=True)
+        _, J_lin = obj.response_and_Jacobian_cre_cim(pars)
+        scaling = np.log(10) * np.tile(pars, 2)
+        assert np.allclose(J_log10, J_lin * scaling)
+
+
+def test_incremental(setup):
+    obj = setup['obj']
+    inc = obj.incremental()
+    pars = np.array([100, 0.1, 0.2, 0.3, 0.04, 0.001, 10, 0.4, 0.8, 0.6])
+    log10 = [True, True, True, True, True, True, True, False, False, False]
+
+    def check(pars):
+        assert np.allclose(
+            inc.response(pars).rcomplex, obj.response(pars).rcomplex)
+        for stacked in (False, True):
+            assert np.allclose(
+                inc.Jacobian_re_im(pars, stacked=stacked),
+                obj.Jacobian_re_im(pars, stacked=stacked))
+        assert np.allclose(
+            inc.Jacobian_re_im(pars, log10=log10),
+            obj.Jacobian_re_im(pars, log10=log10))
+
+    check(pars)
+    assert inc.term_updates == 3
+
+    # change the second term only
+    pars[2] *= 1.1
+    pars[5] *= 2
+    check(pars)
+    assert inc.term_updates == 4
+
+    # the first parameter does not require term updates
+    pars[0] *= 2
+    check(pars)
+    assert inc.term_updates == 4
+
+    inc.reset()
+    check(pars)
+    assert inc.term_updates == 7
+
+    # the per-term functions yield the response
+    terms = cc_kernels.terms(obj.omega, pars[4:7], pars[7:10])
+    assert terms.shape == (obj.omega.size, 3)
+    assert np.allclose(
+        pars[0] * (1 - np.dot(terms, pars[1:4])),
+        obj.response(pars).rcomplex)
+
+
+def test_workspace(setup):
+    """With output arrays and a workspace, repeated evaluations do not
+    allocate any frequency-sized arrays. NumPy's iteration buffers are
+    bounded independently of the number of frequencies."""
+    f = np.logspace(-3, 4, 50000)
+    obj = cc.cc(f)
+    pars = np.array([100, 0.1, 0.2, 0.04, 0.001, 0.5, 0.8])
+    ws = obj.create_workspace()
+    rcomplex = np.empty(f.size, dtype=complex)
+    J = np.empty((2 * f.size, pars.size))
+    dre_dc = np.empty((f.size, 2))
+    dim_drho0 = np.empty(f.size)
+
+    def iteration(workspace=None):
+        obj.response(pars, out=rcomplex, workspace=workspace)
+        obj.Jacobian_re_im(
+            pars, stacked=True, out=J, log10=True, workspace=workspace)
+        obj.dre_dc(pars, out=dre_dc, workspace=workspace)
+        obj.dim_drho0(pars, out=dim_drho0, workspace=workspace)
+
+    iteration(ws)
+    assert np.allclose(rcomplex, obj.response(pars).rcomplex)
+    assert np.allclose(J, obj.Jacobian_log10_re_im(pars, stacked=True))
+    assert np.allclose(dre_dc, obj.dre_dc(pars))
+    assert np.allclose(dim_drho0, obj.dim_drho0(pars))
+    buffers = dict(ws._buffers)
+
+    tracemalloc.start()
+    iteration(ws)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    assert peak < f.size * 8
+    # the buffers of the workspace are reused
+    assert len(ws._buffers) == len(buffers)
+    assert all(ws._buffers[key] is buffers[key] for key in buffers)
+
+    # without workspace, the intermediate terms are allocated
+    tracemalloc.start()
+    iteration()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    assert peak > 4 * f.size * 8
+
+    with pytest.raises(Exception):
+        obj.dre_dc(pars, out=np.empty(f.size))
@@ -0,0 +1,126 @@
+# test the spectrum container
+# *-* coding: utf-8 *-*
+import pytest
+
+import numpy as np
+
+import sip_models.sip_response as sip_response
+
+
+@pytest.fixture
+def setup():
+    s = {}
+    s['f'] = np.logspace(-3, 3, 5)
+    s['rcomplex'] = np.array([100 - 1j, 99 - 2j, 98 - 3j, 97 - 2j, 96 - 1j])
+    return s
+
+
+def test_representations(setup):
+    rcomplex = setup['rcomplex']
+    for response in (
+            sip_response.sip_response(setup['f'], rcomplex=rcomplex),
+            sip_response.sip_response(setup['f'], ccomplex=1 / rcomplex)):
+        assert np.allclose(response.rcomplex, rcomplex)
+        assert np.allclose(response.ccomplex, 1 / rcomplex)
+        assert np.allclose(response.rmag, np.abs(rcomplex))
+        assert np.allclose(
+            response.rpha, np.arctan2(rcomplex.imag, rcomplex.real) * 1000)
+        assert np.allclose(response.cmag, 1 / np.abs(rcomplex))
+        assert np.allclose(response.cpha, -response.rpha)
+        assert np.allclose(response.rre_rim[:, 0], rcomplex.real)
+        assert np.allclose(response.rre_rim[:, 1], rcomplex.imag)
+        assert np.allclose(response.cre_cim[:, 0], (1 / rcomplex).real)
+        assert np.allclose(response.cre_cim[:, 1], (1 / rcomplex).imag)
+        assert np.allclose(response.rmag_rpha[:, 0], response.rmag)
+        assert np.allclose(response.cmag_cpha[:, 1], response.cpha)
+
+    with pytest.raises(Exception):
+        sip_response.sip_response(setup['f'])
+    with pytest.raises(Exception):
+        sip_response.sip_response(
+            setup['f'], rcomplex=rcomplex, ccomplex=1 / rcomplex)
+
+
+def test_lazy_representations(setup):
+    response = sip_response.sip_response(
+        setup['f'], rcomplex=setup['rcomplex'])
+    assert sorted(vars(response).keys()) == ['frequencies', 'rcomplex']
+
+    rre_rim = response.rre_rim
+    assert 'ccomplex' not in vars(response)
+    assert 'rmag' not in vars(response)
+    # cached after the first access
+    assert response.rre_rim is rre_rim
+
+
+def test_collection(setup):
+    f = setup['f']
+    rcomplex = np.vstack((
+        setup['rcomplex'], 2 * setup['rcomplex'], setup['rcomplex'] - 1j))
+    for spectra in (
+            sip_response.sip_response_collection(f, rcomplex=rcomplex),
+            sip_response.sip_response_collection(f, ccomplex=1 / rcomplex)):
+        assert len(spectra) == 3
+        assert spectra.shape == (3, 5)
+        assert spectra.rmag.shape == (3, 5)
+        assert spectra.cre_cim.shape == (3, 5, 2)
+        # vectorized representations equal those of the single spectra
+        for index, row in enumerate(rcomplex):
+            single = sip_response.sip_response(f, rcomplex=row)
+            for name in ('rcomplex', 'ccomplex', 'rmag', 'rpha', 'cmag',
+                         'cpha', 'rre', 'rim', 'cre', 'cim', 'rmag_rpha',
+                         'cmag_cpha', 'rre_rim', 'cre_cim'):
+                assert np.allclose(
+                    getattr(spectra, name)[index], getattr(single, name))
+
+    with pytest.raises(Exception):
+        sip_response.sip_response_collection(f)
+    with pytest.raises(Exception):
+        sip_response.sip_response_collection(f, rcomplex=rcomplex[:, 1:])
+
+
+def test_collection_views(setup):
+    f = setup['f']
+    rcomplex = np.vstack([setup['rcomplex'] * k for k in range(1, 5)])
+    spectra = sip_response.sip_response_collection(f, rcomplex=rcomplex)
+    rmag = spectra.rmag
+
+    # one spectrum shares the memory of the computed representations
+    spectrum = spectra[2]
+    assert isinstance(spectrum, sip_response.sip_response)
+    assert np.shares_memory(spectrum.rcomplex, spectra.rcomplex)
+    assert np.shares_memory(spectrum.__dict__['rmag'], rmag)
+    assert np.allclose(spectrum.rpha, spectra.rpha[2])
+
+    subset = spectra[1:3]
+    assert isinstance(subset, sip_response.sip_response_collection)
+    assert len(subset) == 2
+    assert np.shares_memory(subset.rcomplex, spectra.rcomplex)
+    assert np.shares_memory(subset.__dict__['rmag'], rmag)
+    assert 'cmag' not in vars(subset)
+    assert np.allclose(subset.cmag, spectra.cmag[1:3])
+
+    responses = list(spectra)
+    assert len(responses) == 4
+    assert np.allclose(responses[3].rcomplex, rcomplex[3])
+    stacked = sip_response.sip_response_collection.from_responses(
+        f, responses)
+    assert np.allclose(stacked.rcomplex, rcomplex)
+
+
+def test_collection_indexing(setup):
+    rcomplex = np.vstack([setup['rcomplex'] * k for k in range(1, 5)])
+    spectra = sip_response.sip_response_collection(
+        setup['f'], rcomplex=rcomplex)
+
+    assert np.allclose(spectra[np.int64(1)].rcomplex, rcomplex[1])
+    subset = spectra[[0, 2]]
+    assert isinstance(subset, sip_response.sip_response_collection)
+    assert np.allclose(subset.rmag, np.abs(rcomplex[[0, 2]]))
+    subset = spectra[np.array([True, False, False, True])]
+    assert np.allclose(subset.rcomplex, rcomplex[[0, 3]])
+
+    for index in ((0, slice(None, 2)), (slice(None), 1), 'a', 1.5,
+                  np.zeros((2, 2), dtype=int), [True, False]):
+        with pytest.raises(IndexError):
+            spectra[index]
@@ -0,0 +1,142 @@
+# test the memory-mapped storage
+# *-* coding: utf-8 *-*
+import os
+
+import pytest
+
+import numpy as np
+
+import sip_models.res.cc as cc_res
+import sip_models.sip_response as sip_response
+import sip_models.storage as storage
+
+
+@pytest.fixture
+def setup(tmpdir):
+    s = {}
+    s['path'] = str(tmpdir.join('test.sip'))
+    s['f'] = np.logspace(-3, 3, 20)
+    s['obj'] = cc_res.cc(s['f'])
+    s['pars'] = np.column_stack((
+        np.linspace(10, 100, 7),
+        np.full(7, 0.1),
+        np.logspace(-3, 1, 7),
+        np.full(7, 0.6),
+    ))
+    return s
+
+
+def test_spectra(setup):
+    rcomplex = setup['obj'].response_batch(setup['pars'])
+    spectra = sip_response.sip_response_collection(
+        setup['f'], rcomplex=rcomplex)
+    st = storage.store(setup['path'], mode='w')
+    st.save_spectra('data', spectra, attributes={'unit': 'Ohm m'})
+    st.save_spectra('single', spectra[3])
+    st.save_parameters('parameters', setup['pars'], model='res.cc')
+
+    st = storage.store(setup['path'])
+    assert st.names == [
+        'data.frequencies', 'data.rcomplex', 'parameters',
+        'single.frequencies', 'single.rcomplex']
+    assert st.info('data.rcomplex')['attributes'] == {'unit': 'Ohm m'}
+    assert st.info('parameters')['attributes']['model'] == 'res.cc'
+
+    loaded = st.load_spectra('data')
+    assert isinstance(loaded, sip_response.sip_response_collection)
+    assert np.allclose(loaded.rcomplex, rcomplex)
+    assert np.allclose(loaded.cmag, spectra.cmag)
+    single = st.load_spectra('single')
+    assert isinstance(single, sip_response.sip_response)
+    assert np.allclose(single.rcomplex, rcomplex[3])
+    assert np.allclose(st.load('parameters'), setup['pars'])
+
+    # the payloads are plain .npy files
+    raw = np.load(st._filename('data.rcomplex'))
+    assert np.allclose(raw, rcomplex)
+
+    # read-only stores cannot be written to
+    with pytest.raises(Exception):
+        st.save('other', np.ones(3))
+    with pytest.raises(Exception):
+        st.load('data.rcomplex', mmap_mode='r+')
+    with pytest.raises(Exception):
+        st.load('missing')
+
+
+def test_parameters_log10(setup):
+    pars = setup['pars']
+    st = storage.store(setup['path'], mode='w')
+    st.save_parameters('linear', pars)
+    st.save_parameters('log10', np.log10(pars), log10=np.bool_(True))
+    mask = np.array([True, False, True, False])
+    st.save_parameters('mixed', pars, log10=mask)
+
+    # numpy bools are stored as JSON bools, masks as lists
+    st = storage.store(setup['path'])
+    assert st.info('linear')['attributes']['log10'] is False
+    assert st.info('log10')['attributes']['log10'] is True
+    assert st.info('mixed')['attributes']['log10'] == [
+        True, False, True, False]
+
+    st = storage.store(setup['path'], mode='r+')
+    with pytest.raises(Exception):
+        st.save_parameters('wrong', pars, log10=[True, False])
+    assert 'wrong' not in st
+
+
+def test_jacobians_in_place(setup):
+    obj = setup['obj']
+    pars = setup['pars']
+    nr_f = setup['f'].size
+    st = storage.store(setup['path'], mode='w')
+    st.save_parameters('parameters', pars, model='res.cc')
+    J = st.create_jacobians('J', pars.shape[0], nr_f, pars.shape[1])
+    assert isinstance(J, np.memmap)
+    assert J.shape == (pars.shape[0], 2 * nr_f, 4)
+    del J
+
+    # a worker opens the store and writes blocks in place
+    worker = storage.store(setup['path'], mode='r+')
+    parameters = worker.load('parameters', 'r')
+    for start, stop, block in worker.blocks('J', 3):
+        for index in range(stop - start):
+            obj.Jacobian_re_im(
+                parameters[start + index], stacked=True, out=block[index])
+        block.flush()
+
+    reader = storage.store(setup['path'])
+    J = reader.load('J')
+    assert isinstance(J, np.memmap)
+    for index, row in enumerate(pars):
+        assert np.allclose(J[index], obj.Jacobian_re_im(row, stacked=True))
+
+    with pytest.raises(Exception):
+        storage.store(str(setup['path']) + '.missing')
+    with pytest.raises(Exception):
+        storage.store(setup['path'], mode='a')
+
+
+def test_overwrite(setup):
+    st = storage.store(setup['path'], mode='w')
+    st.save_parameters('parameters', setup['pars'], model='res.cc')
+    st.save('old', np.arange(3))
+
+    # an existing store is only replaced on request
+    with pytest.raises(Exception):
+        storage.store(setup['path'], mode='w')
+    assert storage.store(setup['path']).names == ['old', 'parameters']
+
+    st = storage.store(setup['path'], mode='w', overwrite=True)
+    st.save_parameters('parameters', setup['pars'], model='res.cc')
+    assert st.names == ['parameters']
+    # no stale arrays of the old store remain in the directory
+    assert sorted(os.listdir(setup['path'])) == [
+        'header.json', 'parameters.npy']
+
+    # files that do not belong to the store are never deleted
+    open(os.path.join(setup['path'], 'notes.txt'), 'w').close()
+    with pytest.raises(Exception):
+        storage.store(setup['path'], mode='w', overwrite=True)
+    assert sorted(os.listdir(setup['path'])) == [
+        'header.json', 'notes.txt', 'parameters.npy']